@@ -35,6 +35,7 @@ class _DeferredTaskPatch(defer.Deferred):
     __dbSessionCreator = None
     __sqlaUrl = None
     __deferredSemaphore: DeferredSemaphore = None
+    __reservedTokenDeferreds = []
 
     @classmethod
     def setupPostGreSQLConnection(
@@ -60,6 +61,43 @@ class _DeferredTaskPatch(defer.Deferred):
 
         reactor.addSystemEventTrigger("before", "shutdown", cls.setReactorShuttingDown)
 
+    @classmethod
+    def setParallelism(cls, parallelism: int):
+        """Set Parallelism
+
+        Change the number of tasks to run in parallel at one time, while the
+        service is running. Reducing it takes effect as running tasks finish.
+
+        """
+        semaphore = _DeferredTaskPatch.__deferredSemaphore
+        if not semaphore:
+            return
+
+        reserved = _DeferredTaskPatch.__reservedTokenDeferreds
+        change = parallelism - (semaphore.limit - len(reserved))
+
+        # Reduce the parallelism by holding tokens
+        while change < 0:
+            d = semaphore.acquire()
+            d.addErrback(lambda failure: failure.trap(defer.CancelledError))
+            reserved.append(d)
+            change += 1
+
+        # Increase it by returning held tokens, then adding tokens
+        while change > 0:
+            if reserved:
+                d = reserved.pop()
+                if d.called:
+                    semaphore.release()
+                else:
+                    d.cancel()
+
+            else:
+                semaphore.limit += 1
+                semaphore.release()
+
+            change -= 1
+
     @classmethod
     def setReactorShuttingDown(cls):
         cls.__reactorShuttingDown = True
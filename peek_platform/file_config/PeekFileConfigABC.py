@@ -1,24 +1,31 @@
 """
- *
- *  Copyright Synerty Pty Ltd 2013
- *
- *  This software is proprietary, you are not free to copy
- *  or redistribute this code in any format.
- *
- *  All rights to this software are reserved by 
- *  Synerty Pty Ltd
- *
- * Website : http://www.synerty.com
- * Support : support@synerty.com
- *
+*
+*  Copyright Synerty Pty Ltd 2013
+*
+*  This software is proprietary, you are not free to copy
+*  or redistribute this code in any format.
+*
+*  All rights to this software are reserved by
+*  Synerty Pty Ltd
+*
+* Website : http://www.synerty.com
+* Support : support@synerty.com
+*
 """
 
+import atexit
+import copy
+import inspect
 import logging
 import os
 import shutil
+import tempfile
+import time
 from abc import ABCMeta
+from typing import List
 
-from jsoncfg.functions import save_config, ConfigWithWrapper
+from jsoncfg.functions import ConfigWithWrapper
+from jsoncfg.functions import config_to_json_str
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +43,106 @@ PEEK_SERVICES = (
 )
 
 
+class _BatchedConfigWithWrapper(ConfigWithWrapper):
+    """Batched Config With Wrapper
+
+    ConfigWithWrapper saves the config at the end of each `with` block that
+    changed it. This leaves the saving to PeekFileConfigABC, which batches it.
+
+    """
+
+    def __init__(self, configFilePath: str, saveLater):
+        ConfigWithWrapper.__init__(self, configFilePath)
+
+        # ConfigWithWrapper only sets attributes with this prefix on itself
+        self._ConfigWithWrapper__saveLater = saveLater
+
+    def __exit__(self, type, value, tb):
+        # ConfigWithWrapper.__enter__ stored the config to compare against
+        checkStr = self._ConfigWithWrapper__check_str
+        if checkStr != config_to_json_str(self._ConfigWithWrapper__config):
+            self._ConfigWithWrapper__saveLater()
+
+
+class _SnapshotProperty:
+    """Snapshot Property
+
+    This wraps a config property, the value it returns is kept until the
+    config changes, so reading it again doesn't walk the jsoncfg nodes or
+    compare the whole config before and after.
+
+    """
+
+    def __init__(self, name: str, prop: property):
+        self._name = name
+        self._prop = prop
+        self.__doc__ = prop.__doc__
+
+    def __get__(self, obj, objType=None):
+        if obj is None:
+            return self
+
+        config = obj if isinstance(obj, PeekFileConfigABC) else obj._config
+        generation = config._snapshotGeneration()
+
+        snapshot = obj.__dict__.get("_configSnapshot")
+        if not snapshot or snapshot[0] != generation:
+            snapshot = (generation, {})
+            obj.__dict__["_configSnapshot"] = snapshot
+
+        values = snapshot[1]
+        if self._name not in values:
+            values[self._name] = self._prop.fget(obj)
+
+        value = values[self._name]
+
+        # Don't let callers modify the snapshot
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+
+        return value
+
+    def __set__(self, obj, value):
+        if self._prop.fset is None:
+            raise AttributeError("can't set attribute %s" % self._name)
+
+        self._prop.fset(obj, value)
+
+        config = obj if isinstance(obj, PeekFileConfigABC) else obj._config
+        config._invalidateSnapshot()
+
+
+def snapshotConfigProperties(cls):
+    """Snapshot Config Properties
+
+    A class decorator that wraps the properties the config mixin declares
+    with `_SnapshotProperty`, except those marked with `noConfigSnapshot`.
+
+    """
+    for name, attr in list(vars(cls).items()):
+        if not isinstance(attr, property):
+            continue
+
+        if getattr(attr.fget, "_noConfigSnapshot", False):
+            continue
+
+        setattr(cls, name, _SnapshotProperty(name, attr))
+
+    return cls
+
+
+def noConfigSnapshot(prop: property) -> property:
+    """No Config Snapshot
+
+    Leave this property out of the snapshot, use this for properties with
+    side effects, EG creating a directory, or that check for files, so they
+    run every time they are read.
+
+    """
+    prop.fget._noConfigSnapshot = True
+    return prop
+
+
 class PeekFileConfigABC(metaclass=ABCMeta):
     """
     This class creates a basic agent configuration
@@ -44,6 +151,12 @@ class PeekFileConfigABC(metaclass=ABCMeta):
     DEFAULT_FILE_CHMOD = 0o600
     DEFAULT_DIR_CHMOD = 0o700
 
+    # How often to check if config.json has been changed on disk
+    FILE_CHECK_SECONDS = 1.0
+
+    # Changes to the config are written together, this long after the first
+    SAVE_DELAY_SECONDS = 2.0
+
     __instance = None
 
     def __new__(cls):
@@ -113,12 +226,196 @@ class PeekFileConfigABC(metaclass=ABCMeta):
             with open(self._configFilePath, "w") as fobj:
                 fobj.write("{}")
 
-        self._cfg = ConfigWithWrapper(self._configFilePath)
+        # This is a singleton, __init__ is called for each instantiation.
+        # Don't reload while a save is pending, the changes would be lost.
+        if not getattr(self, "_savePending", False):
+            self._savePending = False
+            self._loadConfig()
+            self._fileMtimeNs = self._configFileMtimeNs()
 
         self._hp = "%(" + self._homePath + ")s"
 
+        self._generation = getattr(self, "_generation", -1) + 1
+        self._fileCheckedTime = time.monotonic()
+
+        if not getattr(self, "_saveAtExitRegistered", False):
+            self._saveAtExitRegistered = True
+            atexit.register(self._saveAtExit)
+
+    def _loadConfig(self):
+        with open(self._configFilePath) as fobj:
+            self._savedJsonStr = fobj.read()
+
+        self._cfg = _BatchedConfigWithWrapper(
+            self._configFilePath, self._saveLater
+        )
+
+    def validateConfig(self) -> List[str]:
+        """Validate Config
+
+        Read the config properties declared by the services config mixins,
+        those decorated with `snapshotConfigProperties`, so defaults are
+        filled in, old settings are upgraded and invalid values are logged
+        when the service starts, rather than when a property is first used.
+        The values read are kept in the snapshot.
+
+        :return: The names of the properties that failed.
+
+        """
+        startTime = time.monotonic()
+
+        cls = type(self)
+        names = []
+        for mixin in cls.__mro__:
+            for name, attr in vars(mixin).items():
+                if not isinstance(attr, _SnapshotProperty):
+                    continue
+
+                # Skip properties the service config class overrides
+                if inspect.getattr_static(cls, name) is attr:
+                    names.append(name)
+
+        failedNames = []
+        for name in names:
+            try:
+                getattr(self, name)
+
+            except Exception as e:
+                failedNames.append(name)
+                logger.warning(
+                    "Config property %s in %s is invalid : %s",
+                    name,
+                    self._configFilePath,
+                    e,
+                )
+
+        logger.debug(
+            "Validated %s config properties in %.1fms",
+            len(names),
+            (time.monotonic() - startTime) * 1000,
+        )
+
+        return failedNames
+
+    def _configFileMtimeNs(self):
+        try:
+            return os.stat(self._configFilePath).st_mtime_ns
+
+        except FileNotFoundError:
+            return None
+
+    def _invalidateSnapshot(self):
+        self._generation += 1
+
+    def _snapshotGeneration(self) -> int:
+        """Snapshot Generation
+
+        Reload config.json if it has changed on disk, the snapshot values are
+        read again when the generation changes.
+
+        The reload waits while a save is pending, reloading would lose the
+        changes that haven't been saved.
+
+        """
+        now = time.monotonic()
+        if now - self._fileCheckedTime < self.FILE_CHECK_SECONDS:
+            return self._generation
+
+        if self._savePending:
+            return self._generation
+
+        self._fileCheckedTime = now
+
+        fileMtimeNs = self._configFileMtimeNs()
+        if fileMtimeNs == self._fileMtimeNs:
+            return self._generation
+
+        self._fileMtimeNs = fileMtimeNs
+
+        try:
+            self._loadConfig()
+            self._generation += 1
+
+        except Exception as e:
+            logger.error(
+                "Failed to reload %s, keeping the loaded config",
+                self._configFilePath,
+            )
+            logger.exception(e)
+
+        return self._generation
+
+    def _saveLater(self):
+        """Save Later
+
+        Save the config after SAVE_DELAY_SECONDS, this is called when a
+        `with self._cfg` block exits, it may be called from any thread.
+
+        """
+        if self._savePending:
+            return
+
+        self._savePending = True
+
+        from twisted.internet import reactor
+
+        reactor.callFromThread(
+            reactor.callLater, self.SAVE_DELAY_SECONDS, self._save
+        )
+
+    def _saveAtExit(self):
+        if not self._savePending:
+            return
+
+        try:
+            self._save()
+
+        except Exception as e:
+            logger.error("Failed to save %s", self._configFilePath)
+            logger.exception(e)
+
     def _save(self):
-        save_config(self._configFilePath, self._cfg)
+        """Save
+
+        Write the config if it has changed since it was loaded or last saved.
+        The file is replaced atomically, so a crash can't leave it truncated.
+
+        """
+        self._savePending = False
+
+        jsonStr = config_to_json_str(self._cfg)
+        if jsonStr == self._savedJsonStr:
+            return
+
+        if self._configFileMtimeNs() != self._fileMtimeNs:
+            logger.warning(
+                "%s was changed while a save was pending,"
+                " those changes are overwritten",
+                self._configFilePath,
+            )
+
+        # mkstemp creates the file readable only by us, config.json can
+        # contain passwords
+        fd, tmpFilePath = tempfile.mkstemp(
+            dir=self._homePath, prefix="config.json.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as fobj:
+                fobj.write(jsonStr)
+                fobj.flush()
+                os.fsync(fobj.fileno())
+
+            shutil.copymode(self._configFilePath, tmpFilePath)
+            os.replace(tmpFilePath, self._configFilePath)
+
+        except Exception:
+            if os.path.exists(tmpFilePath):
+                os.remove(tmpFilePath)
+            raise
+
+        self._savedJsonStr = jsonStr
+        self._fileMtimeNs = self._configFileMtimeNs()
+        self._invalidateSnapshot()
 
     def _chkDir(self, path):
         if not os.path.isdir(path):
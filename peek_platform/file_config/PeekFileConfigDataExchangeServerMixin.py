@@ -5,11 +5,14 @@ from jsoncfg.value_mappers import require_bool
 from jsoncfg.value_mappers import require_integer
 from jsoncfg.value_mappers import require_string
 
+from peek_platform.file_config.PeekFileConfigABC import noConfigSnapshot
+from peek_platform.file_config.PeekFileConfigABC import snapshotConfigProperties
 from peek_platform.file_config.PeekFileConfigPlatformMixin import (
     PeekFileConfigPlatformMixin,
 )
 
 
+@snapshotConfigProperties
 class PeekFileConfigDataExchangeServerMixin:
     def __init__(
         self, config: PeekFileConfigPlatformMixin, name: str, defaultPort: int
@@ -37,6 +40,7 @@ class PeekFileConfigDataExchangeServerMixin:
                 False, require_bool
             )
 
+    @noConfigSnapshot
     @property
     def sslBundleFilePath(self) -> Optional[str]:
         default = os.path.join(self._config._homePath, "key-cert-cachain.pem")
@@ -48,6 +52,7 @@ class PeekFileConfigDataExchangeServerMixin:
                 return file
             return None
 
+    @noConfigSnapshot
     @property
     def sslMutualTLSCertificateAuthorityBundleFilePath(self) -> Optional[str]:
         default = os.path.join(
@@ -64,6 +69,7 @@ class PeekFileConfigDataExchangeServerMixin:
                 return file
             return None
 
+    @noConfigSnapshot
     @property
     def sslMutualTLSTrustedPeerCertificateBundleFilePath(
         self,
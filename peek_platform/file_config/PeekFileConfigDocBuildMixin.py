@@ -1,10 +1,12 @@
 import logging
 
 from jsoncfg.value_mappers import require_bool
+from peek_platform.file_config.PeekFileConfigABC import snapshotConfigProperties
 
 logger = logging.getLogger(__name__)
 
 
+@snapshotConfigProperties
 class PeekFileConfigDocBuildMixin:
     @property
     def docBuildPrepareEnabled(self) -> bool:
@@ -2,13 +2,17 @@ import logging
 import os
 
 from jsoncfg.value_mappers import require_bool, require_string
+from peek_platform.file_config.PeekFileConfigABC import noConfigSnapshot
+from peek_platform.file_config.PeekFileConfigABC import snapshotConfigProperties
 
 logger = logging.getLogger(__name__)
 
 
+@snapshotConfigProperties
 class PeekFileConfigFrontendDirMixin:
     # --- Platform Logging
 
+    @noConfigSnapshot
     @property
     def feFrontendSrcOverlayDir(self) -> bool:
         """Frontend Src Overlay Directory
@@ -23,6 +27,7 @@ class PeekFileConfigFrontendDirMixin:
                 c.frontend.frontendSrcOverlayDir(default, require_string)
             )
 
+    @noConfigSnapshot
     @property
     def feFrontendNodeModuleOverlayDir(self) -> bool:
         """Frontend node_modules Overlay Directory
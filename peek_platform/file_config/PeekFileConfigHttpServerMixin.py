@@ -3,6 +3,8 @@ import os
 from typing import Optional
 
 from jsoncfg.value_mappers import require_string, require_bool, require_integer
+from peek_platform.file_config.PeekFileConfigABC import noConfigSnapshot
+from peek_platform.file_config.PeekFileConfigABC import snapshotConfigProperties
 from peek_platform.file_config.PeekFileConfigPlatformMixin import (
     PeekFileConfigPlatformMixin,
 )
@@ -10,6 +12,7 @@ from peek_platform.file_config.PeekFileConfigPlatformMixin import (
 logger = logging.getLogger(__name__)
 
 
+@snapshotConfigProperties
 class PeekFileConfigHttpMixin:
     def __init__(
         self, config: PeekFileConfigPlatformMixin, name: str, defaultPort: int
@@ -43,6 +46,7 @@ class PeekFileConfigHttpMixin:
                 5, require_integer
             )
 
+    @noConfigSnapshot
     @property
     def sslBundleFilePath(self) -> Optional[str]:
         default = os.path.join(self._config._homePath, "key-cert-cachain.pem")
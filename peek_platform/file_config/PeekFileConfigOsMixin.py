@@ -2,8 +2,10 @@ from abc import ABCMeta
 
 from jsoncfg.value_mappers import require_string, require_integer
 from peek_platform.WindowsPatch import isWindows
+from peek_platform.file_config.PeekFileConfigABC import snapshotConfigProperties
 
 
+@snapshotConfigProperties
 class PeekFileConfigOsMixin(metaclass=ABCMeta):
     _bashDefault = "C:\\Program Files\\Git\\bin\\bash.exe" if isWindows else "/bin/bash"
 
@@ -1,6 +1,5 @@
 import logging
 import os
-import time
 from abc import ABCMeta
 import random
 from typing import Optional
@@ -11,6 +10,7 @@ from jsoncfg.value_mappers import (
     require_list,
     require_bool,
     require_integer,
+    require_number,
 )
 
 from peek_platform.file_config.PeekFileConfigABC import PEEK_AGENT_SERVICE
@@ -18,10 +18,13 @@ from peek_platform.file_config.PeekFileConfigABC import PEEK_FIELD_SERVICE
 from peek_platform.file_config.PeekFileConfigABC import PEEK_LOGIC_SERVICE
 from peek_platform.file_config.PeekFileConfigABC import PEEK_OFFICE_SERVICE
 from peek_platform.file_config.PeekFileConfigABC import PEEK_WORKER_SERVICE
+from peek_platform.file_config.PeekFileConfigABC import noConfigSnapshot
+from peek_platform.file_config.PeekFileConfigABC import snapshotConfigProperties
 
 logger = logging.getLogger(__name__)
 
 
+@snapshotConfigProperties
 class PeekFileConfigPlatformMixin(metaclass=ABCMeta):
     # --- Platform Logging
 
@@ -91,12 +94,128 @@ class PeekFileConfigPlatformMixin(metaclass=ABCMeta):
 
         return count
 
+    @property
+    def twistedLatencyWatchdogEnabled(self) -> bool:
+        with self._cfg as c:
+            return c.twisted.latencyWatchdog.enabled(True, require_bool)
+
+    @property
+    def twistedLatencyWatchdogIntervalMs(self) -> int:
+        with self._cfg as c:
+            return c.twisted.latencyWatchdog.intervalMs(50, require_integer)
+
+    @property
+    def twistedLatencyWatchdogThresholdMs(self) -> int:
+        """Twisted Latency Watchdog Threshold Ms
+
+        The reactor being blocked for longer than this is logged as a stall,
+        and attributed to the plugin that was running.
+
+        """
+        with self._cfg as c:
+            return c.twisted.latencyWatchdog.thresholdMs(250, require_integer)
+
+    @property
+    def runtimeTunablesCheckSeconds(self) -> int:
+        """Runtime Tunables Check Seconds
+
+        How often to check config.json for settings that can be changed
+        without restarting the service, zero disables this.
+
+        """
+        with self._cfg as c:
+            return c.platform.runtimeTunablesCheckSeconds(5, require_integer)
+
+    # --- Plugin Subprocesses
+
+    @property
+    def subprocessGroupsEnabled(self) -> bool:
+        """Subprocess Groups Enabled
+
+        Run plugins that declare a subprocessGroup in their
+        plugin_package.json in that group's subprocesses. When disabled, they
+        run in the service process.
+
+        """
+        with self._cfg as c:
+            return c.subprocess.groupsEnabled(True, require_bool)
+
+    @property
+    def subprocessSharedMemoryThreshold(self) -> int:
+        """Subprocess Shared Memory Threshold
+
+        Vortex messages between the service and plugin subprocesses larger
+        than this many bytes are passed through shared memory instead of the
+        pipes. Zero disables the shared memory transport.
+
+        """
+        with self._cfg as c:
+            return c.subprocess.sharedMemoryThresholdBytes(0, require_integer)
+
+    @property
+    def subprocessCodecInlineThreshold(self) -> int:
+        """Subprocess Codec Inline Threshold
+
+        Messages to and from plugin subprocesses up to this many bytes are
+        encoded and decoded on the reactor thread, larger messages are
+        encoded in the codec thread pool.
+
+        """
+        with self._cfg as c:
+            return c.subprocess.codecInlineThresholdBytes(
+                4 * 1024, require_integer
+            )
+
+    @property
+    def subprocessCodecThreadPoolSize(self) -> int:
+        with self._cfg as c:
+            return c.subprocess.codecThreadPoolSize(4, require_integer)
+
+    @property
+    def subprocessWarmSpare(self) -> bool:
+        """Subprocess Warm Spare
+
+        Keep a spare subprocess, with the platform and plugin packages
+        already imported, for every plugin subprocess worker. This makes
+        respawning a worker much faster, at the cost of the memory used by
+        the spares.
+
+        """
+        with self._cfg as c:
+            return c.subprocess.warmSpare(False, require_bool)
+
+    def subprocessGroupWorkerCount(self, subprocessGroup: str) -> int:
+        """Subprocess Group Worker Count
+
+        The number of worker subprocesses to run for a plugin subprocess
+        group. Every worker loads all the plugins in the group.
+
+        """
+        with self._cfg as c:
+            return c.subprocess.group[subprocessGroup].workerCount(
+                1, require_integer
+            )
+
+    def subprocessGroupDispatch(self, subprocessGroup: str) -> str:
+        """Subprocess Group Dispatch
+
+        How payloads are dispatched to the workers of a subprocess group,
+        either "vortexUuid", to keep each clients messages in order, or
+        "roundRobin".
+
+        """
+        with self._cfg as c:
+            return c.subprocess.group[subprocessGroup].dispatch(
+                "vortexUuid", require_string
+            )
+
     @property
     def autoPackageUpdate(self):
         with self._cfg as c:
             return c.platform.autoPackageUpdate(True, require_bool)
 
     # --- Platform Tmp Path
+    @noConfigSnapshot
     @property
     def tmpPath(self):
         default = os.path.join(self._homePath, "tmp")
@@ -104,6 +223,7 @@ class PeekFileConfigPlatformMixin(metaclass=ABCMeta):
             return self._chkDir(c.disk.tmp(default, require_string))
 
     # --- Platform Software Path
+    @noConfigSnapshot
     @property
     def platformSoftwarePath(self):
         default = os.path.join(self._homePath, "platform_software")
@@ -124,6 +244,7 @@ class PeekFileConfigPlatformMixin(metaclass=ABCMeta):
             c.platform.version = value
 
     # --- Plugin Software Path
+    @noConfigSnapshot
     @property
     def pluginSoftwarePath(self):
         default = os.path.join(self._homePath, "plugin_software")
@@ -139,6 +260,39 @@ class PeekFileConfigPlatformMixin(metaclass=ABCMeta):
 
         return self._chkDir(os.path.join(pluginData, pluginName))
 
+    # --- Plugin Load Concurrency
+    @property
+    def pluginLoadConcurrency(self) -> int:
+        """Plugin Load Concurrency
+
+        The number of plugins to load or start at once. Plugins always wait
+        for the plugins they require in their package metadata.
+
+        """
+        with self._cfg as c:
+            return c.plugin.loadConcurrency(1, require_integer)
+
+    # --- Plugin Startup Report
+    @property
+    def pluginStartupReportPath(self) -> str:
+        default = os.path.join(self._homePath, "plugin_startup_report.json")
+        with self._cfg as c:
+            return c.plugin.startupReport.path(default, require_string)
+
+    @property
+    def pluginStartupProfileDir(self) -> Optional[str]:
+        """Plugin Startup Profile Dir
+
+        :return: The directory to write a cProfile of each plugin startup
+            phase to, or None if profiling is disabled.
+
+        """
+        default = os.path.join(self._homePath, "plugin_startup_profile")
+        with self._cfg as c:
+            if not c.plugin.startupReport.profileEnabled(False, require_bool):
+                return None
+            return c.plugin.startupReport.profileDir(default, require_string)
+
     # --- Plugin Software Version
     def pluginVersion(self, pluginName):
         """Plugin Version
@@ -165,6 +319,43 @@ class PeekFileConfigPlatformMixin(metaclass=ABCMeta):
         with self._cfg as c:
             c.plugin.enabled = value
 
+    # --- Plugin Metadata Cache
+    @property
+    def pluginMetadataCachePath(self) -> str:
+        default = os.path.join(self._homePath, "plugin_metadata_cache.json")
+        with self._cfg as c:
+            return c.plugin.metadataCachePath(default, require_string)
+
+    # --- Plugin Drain Timeout Seconds
+    @property
+    def pluginDrainTimeoutSeconds(self) -> float:
+        """Plugin Drain Timeout Seconds
+
+        When a plugin is stopped, the longest to wait for the payloads it's
+        processing to finish, before it's stopped anyway.
+
+        """
+        with self._cfg as c:
+            return c.plugin.drainTimeoutSeconds(10.0, require_number)
+
+    # --- Plugins Lazy
+    @property
+    def pluginsLazy(self):
+        """Plugins Lazy
+
+        Enabled plugins that are only imported and started when the first
+        payload for them arrives.
+
+        """
+        with self._cfg as c:
+            return c.plugin.lazy([], require_list)
+
+    @property
+    def pluginEndpointManifestPath(self) -> str:
+        default = os.path.join(self._homePath, "plugin_endpoint_manifest.json")
+        with self._cfg as c:
+            return c.plugin.endpointManifestPath(default, require_string)
+
     # --- Manhole
     @property
     def manholeEnabled(self) -> str:
@@ -187,16 +378,17 @@ class PeekFileConfigPlatformMixin(metaclass=ABCMeta):
 
     @property
     def manholePassword(self) -> str:
-        default = str(random.getrandbits(int(time.time() * 10**6 % 100000)))[
-            :32
-        ]
+        default = str(random.getrandbits(128))[:32]
         with self._cfg as c:
             return c.logging.manhole.password(default, require_string)
 
+    # Reading these creates the manhole keys
+    @noConfigSnapshot
     @property
     def manholePublicKeyFile(self) -> str:
         return self._ensureMaholeKeysExist()[0]
 
+    @noConfigSnapshot
     @property
     def manholePrivateKeyFile(self) -> str:
         return self._ensureMaholeKeysExist()[1]
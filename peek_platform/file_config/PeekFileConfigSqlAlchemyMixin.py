@@ -1,10 +1,14 @@
 import logging
 
 from jsoncfg.value_mappers import require_string, require_dict
+from jsoncfg.value_mappers import require_bool
+from jsoncfg.value_mappers import require_integer
+from peek_platform.file_config.PeekFileConfigABC import snapshotConfigProperties
 
 logger = logging.getLogger(__name__)
 
 
+@snapshotConfigProperties
 class PeekFileConfigSqlAlchemyMixin:
     @property
     def dbConnectString(self):
@@ -37,3 +41,19 @@ class PeekFileConfigSqlAlchemyMixin:
                 c.sqlalchemy.engineArgs = val
 
             return val
+
+    @property
+    def dbStatsEnabled(self) -> bool:
+        with self._cfg as c:
+            return c.sqlalchemy.statsEnabled(True, require_bool)
+
+    @property
+    def dbSlowQueryThresholdMs(self) -> int:
+        """DB Slow Query Threshold Ms
+
+        Queries that take longer than this are logged, with the plugin that
+        ran them.
+
+        """
+        with self._cfg as c:
+            return c.sqlalchemy.slowQueryThresholdMs(1000, require_integer)
@@ -1,10 +1,15 @@
+import inspect
 import logging
 import os
 import shutil
+import time
 import unittest
 
 import peek_platform
 from jsoncfg.functions import config_to_json_str
+from peek_platform.file_config import (
+    PeekFileConfigABC as config_module,
+)
 from peek_platform.file_config.PeekFileConfigABC import PeekFileConfigABC
 from peek_platform.file_config.PeekFileConfigDataExchangeClientMixin import (
     PeekFileConfigDataExchangeClientMixin,
@@ -45,6 +50,8 @@ class PeekFileConfigTest(unittest.TestCase):
             fobj.write('{"nothing":{"is_true":true}}')
 
     def tearDown(self):
+        # Save any pending changes before the home is removed
+        TestFileConfig()._save()
         self._rmHome()
 
     def testReadingConfig(self):
@@ -116,3 +123,162 @@ class PeekFileConfigTest(unittest.TestCase):
 
         self.assertEqual(bas.platformVersion, "4.4.4")
         self.assertEqual(bas.pluginVersion(pluginName), "2.5.6")
+
+    def testSnapshot(self):
+        bas = TestFileConfig()
+        bas.FILE_CHECK_SECONDS = 0
+
+        self.assertEqual(bas.pluginsEnabled, [])
+
+        # The snapshot can't be modified through the returned value
+        bas.pluginsEnabled.append("pluginNoop")
+        self.assertEqual(bas.pluginsEnabled, [])
+
+        # Setting a property starts a new snapshot
+        bas.pluginsEnabled = ["pluginNoop"]
+        self.assertEqual(bas.pluginsEnabled, ["pluginNoop"])
+
+    def _writeConfigFile(self, jsonStr):
+        with open(self.CONFIG_FILE_PATH, "w") as fobj:
+            fobj.write(jsonStr)
+
+        # Make sure the modified time changes
+        stat = os.stat(self.CONFIG_FILE_PATH)
+        os.utime(
+            self.CONFIG_FILE_PATH,
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9),
+        )
+
+    def testSnapshotReloadsChangedFile(self):
+        bas = TestFileConfig()
+        bas.FILE_CHECK_SECONDS = 0
+        self.assertEqual(bas.platformVersion, "0.0.0")
+        bas._save()
+
+        self._writeConfigFile('{"platform":{"version":"5.0.0"}}')
+
+        self.assertEqual(bas.platformVersion, "5.0.0")
+
+    def testSnapshotKeepsPendingChanges(self):
+        bas = TestFileConfig()
+        bas.FILE_CHECK_SECONDS = 0
+        bas.platformVersion = "6.0.0"
+
+        self._writeConfigFile('{"platform":{"version":"5.0.0"}}')
+
+        # The change that hasn't been saved yet is kept, and saved
+        self.assertEqual(bas.platformVersion, "6.0.0")
+        bas._save()
+        self.assertEqual(bas.platformVersion, "6.0.0")
+        with open(self.CONFIG_FILE_PATH, "r") as fobj:
+            self.assertIn('"6.0.0"', fobj.read())
+
+    def testInstantiatingKeepsPendingChanges(self):
+        bas = TestFileConfig()
+        bas.platformVersion = "6.0.0"
+
+        # The singleton is instantiated again before the change is saved
+        self.assertIs(TestFileConfig(), bas)
+        self.assertEqual(bas.platformVersion, "6.0.0")
+
+        bas._save()
+        with open(self.CONFIG_FILE_PATH, "r") as fobj:
+            self.assertIn('"6.0.0"', fobj.read())
+
+    def testBatchedSave(self):
+        bas = TestFileConfig()
+
+        # Reading a value that's in the config doesn't save it
+        with bas._cfg as c:
+            c.nothing.is_true(False)
+        self.assertFalse(bas._savePending)
+
+        # Reading a default adds it, which is saved
+        bas.platformVersion
+        self.assertTrue(bas._savePending)
+        bas._save()
+
+        with open(self.CONFIG_FILE_PATH, "r") as fobj:
+            contents = fobj.read()
+
+        # Changes are saved later, not at the end of the with block
+        bas.platformVersion = "6.0.0"
+        with open(self.CONFIG_FILE_PATH, "r") as fobj:
+            self.assertEqual(fobj.read(), contents)
+
+        bas._save()
+        mtimeNs = os.stat(self.CONFIG_FILE_PATH).st_mtime_ns
+        with open(self.CONFIG_FILE_PATH, "r") as fobj:
+            self.assertIn('"6.0.0"', fobj.read())
+
+        # An unchanged config isn't written
+        bas._save()
+        self.assertEqual(os.stat(self.CONFIG_FILE_PATH).st_mtime_ns, mtimeNs)
+        self.assertEqual(
+            [n for n in os.listdir(self.HOME_DIR) if n.endswith(".tmp")], []
+        )
+
+    def testSaveKeepsFileMode(self):
+        os.chmod(self.CONFIG_FILE_PATH, 0o640)
+        bas = TestFileConfig()
+        bas.platformVersion = "6.0.0"
+        bas._save()
+
+        mode = os.stat(self.CONFIG_FILE_PATH).st_mode & 0o777
+        self.assertEqual(mode, 0o640)
+
+    def testSideEffectPropertiesAreNotSnapshotted(self):
+        bas = TestFileConfig()
+
+        # The directory is created again when it's read again
+        tmpPath = bas.tmpPath
+        os.rmdir(tmpPath)
+        self.assertEqual(bas.tmpPath, tmpPath)
+        self.assertTrue(os.path.isdir(tmpPath))
+
+        self.assertIsInstance(
+            inspect.getattr_static(TestFileConfig, "manholePublicKeyFile"),
+            property,
+        )
+
+    def testValidateConfig(self):
+        bas = TestFileConfig()
+        self.assertNotIn("twistedThreadPoolSize", bas.validateConfig())
+
+        with bas._cfg as c:
+            c.twisted.threadPoolSize = "many"
+        bas._invalidateSnapshot()
+
+        with self.assertLogs(config_module.logger, "WARNING") as logs:
+            self.assertIn("twistedThreadPoolSize", bas.validateConfig())
+        self.assertNotIn("ERROR", [r.levelname for r in logs.records])
+
+        # Only the properties the config mixins declare are read
+        with bas._cfg as c:
+            c.dataExchange.httpPort = "many"
+        self.assertNotIn("peekServerHttpPort", bas.validateConfig())
+
+    def testPropertyAccessBenchmark(self):
+        bas = TestFileConfig()
+        repeats = 2000
+
+        fget = inspect.getattr_static(
+            TestFileConfig, "twistedThreadPoolSize"
+        )._prop.fget
+
+        startTime = time.perf_counter()
+        for _ in range(repeats):
+            fget(bas)
+        jsoncfgSeconds = time.perf_counter() - startTime
+
+        startTime = time.perf_counter()
+        for _ in range(repeats):
+            bas.twistedThreadPoolSize
+        snapshotSeconds = time.perf_counter() - startTime
+
+        logger.info(
+            "twistedThreadPoolSize access, jsoncfg %.2fus, snapshot %.2fus",
+            jsoncfgSeconds / repeats * 10**6,
+            snapshotSeconds / repeats * 10**6,
+        )
+        self.assertEqual(bas.twistedThreadPoolSize, fget(bas))
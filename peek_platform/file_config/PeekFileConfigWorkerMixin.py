@@ -3,10 +3,12 @@ import multiprocessing
 from typing import Optional
 
 from jsoncfg.value_mappers import require_string, require_integer, require_bool
+from peek_platform.file_config.PeekFileConfigABC import snapshotConfigProperties
 
 logger = logging.getLogger(__name__)
 
 
+@snapshotConfigProperties
 class PeekFileConfigWorkerMixin:
     @property
     def celeryBrokerUrl(self) -> str:
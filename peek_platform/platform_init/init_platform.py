@@ -1,4 +1,5 @@
 import logging
+import sys
 
 from setproctitle import setproctitle
 from twisted.internet import defer
@@ -47,6 +48,8 @@ class InitPlatform:
         yield PeekPlatformConfig.pluginLoader.startCorePlugins()
         yield PeekPlatformConfig.pluginLoader.startOptionalPlugins()
 
+        PeekPlatformConfig.pluginLoader.writeStartupReport()
+
     @inlineCallbacks
     def stopAndShutdownPluginsAndVortex(self):
         from peek_platform import PeekPlatformConfig
@@ -93,6 +96,76 @@ class InitPlatform:
             PeekPlatformConfig.config.twistedThreadPoolSize
         )
 
+        # Watch for callbacks that block the reactor
+        if PeekPlatformConfig.config.twistedLatencyWatchdogEnabled:
+            from peek_platform.util.ReactorLatencyWatchdog import (
+                reactorLatencyWatchdog,
+            )
+
+            reactorLatencyWatchdog.start(
+                PeekPlatformConfig.config.twistedLatencyWatchdogIntervalMs
+                / 1000.0,
+                PeekPlatformConfig.config.twistedLatencyWatchdogThresholdMs
+                / 1000.0,
+                PeekPlatformConfig.pluginLoader.pluginNameForModule,
+            )
+
+        # Apply config changes that don't need a restart
+        if PeekPlatformConfig.config.runtimeTunablesCheckSeconds:
+            self._startRuntimeTunables()
+
+    def _startRuntimeTunables(self):
+        from peek_platform import PeekPlatformConfig
+        from peek_platform.util.ReactorLatencyWatchdog import (
+            reactorLatencyWatchdog,
+        )
+        from peek_platform.util.RuntimeTunables import runtimeTunables
+
+        def setCeleryPlPythonWorkerCount(count):
+            # The patch is only imported by the services that use it
+            module = sys.modules.get("peek_platform.CeleryPatchToPlPython")
+            if module:
+                module._DeferredTaskPatch.setParallelism(count)
+
+        runtimeTunables.register(
+            "twistedThreadPoolSize", reactor.suggestThreadPoolSize
+        )
+        runtimeTunables.register("loggingLevel", logging.root.setLevel)
+        runtimeTunables.register(
+            "twistedLatencyWatchdogThresholdMs",
+            lambda ms: reactorLatencyWatchdog.setThresholdSeconds(ms / 1000.0),
+        )
+        runtimeTunables.register(
+            "celeryPlPythonWorkerCount", setCeleryPlPythonWorkerCount
+        )
+
+        def setDbSlowQueryThresholdMs(ms):
+            from peek_platform.util.DbEngineStats import dbEngineStats
+
+            dbEngineStats.setSlowQueryThresholdSeconds(ms / 1000.0)
+
+        runtimeTunables.register(
+            "dbSlowQueryThresholdMs", setDbSlowQueryThresholdMs
+        )
+
+        for name in (
+            "twistedLatencyWatchdogEnabled",
+            "twistedLatencyWatchdogIntervalMs",
+            "manholeEnabled",
+            "manholePort",
+            "manholePassword",
+            "celeryWorkerCount",
+            "celeryTaskPrefetch",
+            "dbConnectString",
+            "dbEngineArgs",
+        ):
+            runtimeTunables.register(name, None)
+
+        runtimeTunables.start(
+            PeekPlatformConfig.config,
+            PeekPlatformConfig.config.runtimeTunablesCheckSeconds,
+        )
+
     def setupMemoryDebugLogging(self):
         from peek_platform import PeekPlatformConfig
 
@@ -172,6 +245,23 @@ class InitPlatform:
 
         PeekPlatformConfig.config = Config()
         PeekPlatformConfig.config.platformVersion = __version__
+        PeekPlatformConfig.config.validateConfig()
+
+        # Record the DB pool and query stats, for services with a database
+        if getattr(PeekPlatformConfig.config, "dbStatsEnabled", False):
+            from peek_platform.util.DbEngineStats import dbEngineStats
+
+            def pluginNameForModule(moduleName):
+                if not PeekPlatformConfig.pluginLoader:
+                    return None
+                return PeekPlatformConfig.pluginLoader.pluginNameForModule(
+                    moduleName
+                )
+
+            dbEngineStats.install(
+                PeekPlatformConfig.config.dbSlowQueryThresholdMs / 1000.0,
+                pluginNameForModule,
+            )
 
     def setupPluginLoader(self):
         from peek_platform import PeekPlatformConfig
@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+from typing import Dict
+from typing import List
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class PluginEndpointManifest:
+    """Plugin Endpoint Manifest
+
+    This class stores the filts of the payload endpoints each lazy plugin
+    registers once it has started, keyed by the plugin version.
+
+    The manifest is recorded the first time a lazy plugin is loaded, or when
+    its version changes, so the plugin can be activated lazily from then on.
+
+    """
+
+    def __init__(self, filePath: str):
+        self._filePath = filePath
+        self._manifest = {}
+
+        if os.path.isfile(filePath):
+            try:
+                with open(filePath) as f:
+                    self._manifest = json.load(f)
+
+            except Exception as e:
+                logger.error(
+                    "Failed to read the plugin endpoint manifest %s, it will"
+                    " be recreated",
+                    filePath,
+                )
+                logger.exception(e)
+
+    def filtsForPlugin(
+        self, pluginName: str, pluginVersion: str
+    ) -> Optional[List[Dict]]:
+        entry = self._manifest.get(pluginName)
+        if not entry or entry.get("version") != pluginVersion:
+            return None
+
+        return entry["filts"]
+
+    def update(
+        self, pluginName: str, pluginVersion: str, filts: List[Dict]
+    ) -> None:
+        try:
+            json.dumps(filts)
+
+        except TypeError:
+            logger.warning(
+                "Plugin %s has endpoint filts that can't be stored in the"
+                " manifest, it will be loaded eagerly",
+                pluginName,
+            )
+            self._manifest.pop(pluginName, None)
+            return
+
+        self._manifest[pluginName] = dict(version=pluginVersion, filts=filts)
+
+    def save(self) -> None:
+        tmpFilePath = self._filePath + ".tmp"
+        with open(tmpFilePath, "w") as f:
+            json.dump(self._manifest, f, indent=4, sort_keys=True)
+
+        os.replace(tmpFilePath, self._filePath)
@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+
+from peek_platform.plugin.PluginEndpointManifest import PluginEndpointManifest
+
+
+class PluginEndpointManifestTest(unittest.TestCase):
+    def setUp(self):
+        fd, self._filePath = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        os.remove(self._filePath)
+
+    def tearDown(self):
+        if os.path.exists(self._filePath):
+            os.remove(self._filePath)
+
+    def testFiltsAreKeptPerVersion(self):
+        filts = [dict(plugin="pluginA", key="pluginA.data")]
+
+        manifest = PluginEndpointManifest(self._filePath)
+        self.assertIsNone(manifest.filtsForPlugin("pluginA", "1.0.0"))
+
+        manifest.update("pluginA", "1.0.0", filts)
+        manifest.save()
+
+        manifest = PluginEndpointManifest(self._filePath)
+        self.assertEqual(
+            manifest.filtsForPlugin("pluginA", "1.0.0"), filts
+        )
+        self.assertIsNone(manifest.filtsForPlugin("pluginA", "1.0.1"))
+
+    def testUnstorableFiltsRemoveThePlugin(self):
+        manifest = PluginEndpointManifest(self._filePath)
+        manifest.update("pluginA", "1.0.0", [dict(key="a")])
+        manifest.update("pluginA", "1.0.0", [dict(key=object())])
+
+        self.assertIsNone(manifest.filtsForPlugin("pluginA", "1.0.0"))
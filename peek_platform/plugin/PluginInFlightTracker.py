@@ -0,0 +1,188 @@
+import logging
+import time
+import weakref
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import maybeDeferred
+from twisted.internet.defer import succeed
+from vortex.PayloadEndpoint import PayloadEndpoint
+from vortex.PayloadEnvelope import PayloadEnvelope
+
+
+logger = logging.getLogger(__name__)
+
+
+class _PluginInFlight:
+    """The in flight state for one load of a plugin"""
+
+    def __init__(self):
+        self.inFlightCount = 0
+        self.refusedCount = 0
+        self.refusing = False
+        self.drainDeferreds = []
+        self.endpoints = weakref.WeakSet()
+
+    def finished(self, result):
+        self.inFlightCount -= 1
+
+        if not self.inFlightCount:
+            drainDeferreds, self.drainDeferreds = self.drainDeferreds, []
+            for d in drainDeferreds:
+                d.callback(0)
+
+        return result
+
+
+class PluginInFlightTracker:
+    """Plugin In Flight Tracker
+
+    This class counts the payloads each plugins endpoints are processing, so
+    a plugin can be stopped once the payloads it's processing have finished.
+
+    Tracking an endpoint wraps its `process` method, PayloadIO calls this for
+    each payload it dispatches to the endpoint.
+
+    """
+
+    def __init__(self):
+        self._stateByPluginName = {}
+
+    def inFlightCount(self, pluginName: str) -> int:
+        state = self._stateByPluginName.get(pluginName)
+        return state.inFlightCount if state else 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            pluginName: dict(
+                inFlight=state.inFlightCount,
+                refused=state.refusedCount,
+                refusing=state.refusing,
+                endpoints=len(state.endpoints),
+            )
+            for pluginName, state in self._stateByPluginName.items()
+        }
+
+    def track(self, pluginName: str, endpoint: PayloadEndpoint) -> None:
+        state = self._stateByPluginName.setdefault(
+            pluginName, _PluginInFlight()
+        )
+        if endpoint in state.endpoints:
+            return
+
+        state.endpoints.add(endpoint)
+        process = endpoint.process
+
+        def trackedProcess(*args, **kwargs):
+            if state.refusing:
+                state.refusedCount += 1
+                self._respondRefused(pluginName, *args, **kwargs)
+                return None
+
+            state.inFlightCount += 1
+            d = maybeDeferred(process, *args, **kwargs)
+            d.addBoth(state.finished)
+            return d
+
+        endpoint.process = trackedProcess
+
+    def _respondRefused(
+        self,
+        pluginName: str,
+        payloadEnvelope: PayloadEnvelope,
+        vortexUuid: str = None,
+        vortexName: str = None,
+        httpSession=None,
+        sendResponse=None,
+        **kwargs,
+    ) -> None:
+        logger.warning(
+            "Plugin %s is stopping, refused payload %s from %s",
+            pluginName,
+            payloadEnvelope.filt,
+            vortexName,
+        )
+
+        if not sendResponse:
+            return
+
+        # Respond with an error, like PayloadIO does when an endpoint fails
+        try:
+            sendResponse(
+                PayloadEnvelope(
+                    filt=payloadEnvelope.filt,
+                    result="Plugin %s is stopping, try again" % pluginName,
+                ).toVortexMsg()
+            )
+
+        except Exception as e:
+            logger.exception(e)
+
+    def refuse(self, pluginName: str) -> None:
+        """Refuse
+
+        Refuse the payloads dispatched to the plugin from now on, each is
+        logged and responded to with an error.
+
+        """
+        state = self._stateByPluginName.setdefault(
+            pluginName, _PluginInFlight()
+        )
+        state.refusing = True
+
+    def forget(self, pluginName: str) -> None:
+        """Forget
+
+        The plugin has been unloaded, the next load of it will accept payloads.
+        Payloads still processing for the old load are no longer counted.
+
+        """
+        self._stateByPluginName.pop(pluginName, None)
+
+    def drain(self, pluginName: str, timeoutSeconds: float) -> Deferred:
+        """Drain
+
+        Refuse new payloads for the plugin, and wait for the payloads it's
+        processing to finish.
+
+        :return: A deferred that fires with the number of payloads still
+            processing, zero, or more than zero if the timeout was reached.
+
+        """
+        self.refuse(pluginName)
+        state = self._stateByPluginName[pluginName]
+
+        if not state.inFlightCount:
+            return succeed(0)
+
+        startTime = time.monotonic()
+        logger.info(
+            "Waiting for %s payloads to finish for plugin %s",
+            state.inFlightCount,
+            pluginName,
+        )
+
+        d = Deferred()
+        state.drainDeferreds.append(d)
+
+        def timeout():
+            state.drainDeferreds.remove(d)
+            logger.warning(
+                "Plugin %s still has %s payloads processing after %.1fs,"
+                " stopping anyway",
+                pluginName,
+                state.inFlightCount,
+                time.monotonic() - startTime,
+            )
+            d.callback(state.inFlightCount)
+
+        timeoutCall = reactor.callLater(timeoutSeconds, timeout)
+
+        def cancelTimeout(result):
+            if timeoutCall.active():
+                timeoutCall.cancel()
+            return result
+
+        d.addCallback(cancelTimeout)
+        return d
@@ -0,0 +1,60 @@
+from twisted.internet import task
+from twisted.internet.defer import Deferred
+from twisted.trial import unittest
+from vortex.PayloadEnvelope import PayloadEnvelope
+
+from peek_platform.plugin import PluginInFlightTracker as tracker_module
+from peek_platform.plugin.PluginInFlightTracker import PluginInFlightTracker
+
+
+class _FakeEndpoint:
+    def __init__(self):
+        self.deferreds = []
+
+    def process(self, payloadEnvelope, *args):
+        d = Deferred()
+        self.deferreds.append(d)
+        return d
+
+
+class PluginInFlightTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self._clock = task.Clock()
+        self.patch(tracker_module, "reactor", self._clock)
+
+        self._tracker = PluginInFlightTracker()
+        self._endpoint = _FakeEndpoint()
+        self._tracker.track("pluginA", self._endpoint)
+
+    def testDrainWaitsForInFlightPayloads(self):
+        self._endpoint.process("payload 1")
+        self._endpoint.process("payload 2")
+        self.assertEqual(self._tracker.inFlightCount("pluginA"), 2)
+
+        d = self._tracker.drain("pluginA", 10)
+        self.assertNoResult(d)
+
+        # New payloads are refused while draining, with an error response
+        responses = []
+        refusedPayload = PayloadEnvelope(filt=dict(key="pluginA.test"))
+        self.assertIsNone(
+            self._endpoint.process(
+                refusedPayload, "uuid", "name", None, responses.append
+            )
+        )
+        self.assertEqual(len(self._endpoint.deferreds), 2)
+        self.assertEqual(len(responses), 1)
+
+        for endpointDeferred in self._endpoint.deferreds:
+            endpointDeferred.callback(None)
+
+        self.assertEqual(self.successResultOf(d), 0)
+        self.assertEqual(self._tracker.stats["pluginA"]["refused"], 1)
+
+    def testDrainTimesOut(self):
+        self._endpoint.process("payload 1")
+
+        d = self._tracker.drain("pluginA", 10)
+        self._clock.advance(10)
+
+        self.assertEqual(self.successResultOf(d), 1)
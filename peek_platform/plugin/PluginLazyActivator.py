@@ -0,0 +1,219 @@
+import logging
+import weakref
+from typing import Callable
+from typing import Dict
+from typing import List
+
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import inlineCallbacks
+from vortex.DeferUtil import vortexLogFailure
+from vortex.PayloadEndpoint import PayloadEndpoint
+from vortex.PayloadEnvelope import PayloadEnvelope
+from vortex.PayloadIO import PayloadIO
+
+from peek_platform.plugin.PluginRegistrationRecorder import (
+    PluginRegistrationRecorder,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class _NoKeycheckPayloadEndpoint(PayloadEndpoint):
+    def _keyCheck(self, filt):
+        pass
+
+
+class PluginLazyActivator:
+    """Plugin Lazy Activator
+
+    This class registers placeholder payload endpoints for a plugin that has
+    not been imported.
+
+    The first payload that matches a placeholder activates the plugin, payloads
+    that arrive while the plugin is loading and starting are queued. Each
+    placeholder is removed as the plugin registers the endpoint with the same
+    filt, so a payload is never processed by both. Once the plugin has
+    started, the queued payloads are processed again, this time by the
+    plugins own endpoints. Payloads already dispatched to a placeholder when
+    it's removed are passed on the same way.
+
+    If the plugin fails to activate, the queued payloads are responded to
+    with an error and the placeholders are registered again, the next payload
+    tries again.
+
+    """
+
+    def __init__(
+        self,
+        pluginName: str,
+        filts: List[Dict],
+        activate: Callable[[str], Deferred],
+    ):
+        """Constructor
+
+        :param pluginName: The name of the plugin.
+        :param filts: The filts of the endpoints the plugin registers, from
+            the PluginEndpointManifest.
+        :param activate: Called with the plugin name to load and start the
+            plugin.
+
+        """
+        self._pluginName = pluginName
+        self._filts = filts
+        self._activate = activate
+
+        self._activating = False
+        self._activated = False
+        self._isShutdown = False
+        self._queuedPayloads = []
+        self._queuedPayloadIds = set()
+        self._forwardedPayloads = weakref.WeakSet()
+
+        self._endpoints = []
+        self._addPlaceholders()
+
+    @property
+    def isActivating(self) -> bool:
+        return self._activating
+
+    def shutdown(self) -> None:
+        self._isShutdown = True
+        self._removePlaceholders()
+        PluginRegistrationRecorder.removeEndpointListener(self._endpointAdded)
+
+    def _addPlaceholders(self) -> None:
+        self._endpoints = [
+            _NoKeycheckPayloadEndpoint(filt, self._process)
+            for filt in self._filts
+        ]
+
+    def _removePlaceholders(self) -> None:
+        for endpoint in self._endpoints:
+            PayloadIO().remove(endpoint)
+        self._endpoints = []
+
+    def _endpointAdded(self, endpoint) -> None:
+        # The plugin added its endpoint, no payload has been dispatched to it
+        # yet, remove the placeholder so payloads aren't processed by both
+        filt = endpoint.filt
+        for placeholder in [e for e in self._endpoints if e.filt == filt]:
+            PayloadIO().remove(placeholder)
+            self._endpoints.remove(placeholder)
+
+    def _process(
+        self,
+        payloadEnvelope,
+        vortexUuid: str,
+        vortexName: str,
+        sendResponse,
+        **kwargs,
+    ):
+        # PayloadIO dispatches with callLater, so a placeholder can still be
+        # called after the plugin has activated, pass the payload on once.
+        if self._activated:
+            if payloadEnvelope in self._forwardedPayloads:
+                return
+
+            self._forwardedPayloads.add(payloadEnvelope)
+            PayloadIO().process(
+                payloadEnvelope=payloadEnvelope,
+                vortexUuid=vortexUuid,
+                vortexName=vortexName,
+                httpSession=kwargs.get("httpSession"),
+                sendResponse=sendResponse,
+            )
+            return
+
+        # The placeholder filts can overlap, queue each payload once
+        if id(payloadEnvelope) in self._queuedPayloadIds:
+            return
+
+        self._queuedPayloadIds.add(id(payloadEnvelope))
+        self._queuedPayloads.append(
+            (
+                payloadEnvelope,
+                vortexUuid,
+                vortexName,
+                kwargs.get("httpSession"),
+                sendResponse,
+            )
+        )
+
+        if not self._activating:
+            self._activating = True
+            d = self._activateAndReplay()
+            d.addErrback(vortexLogFailure, logger, consumeError=True)
+
+    @inlineCallbacks
+    def _activateAndReplay(self):
+        logger.info("Activating lazy plugin %s", self._pluginName)
+
+        PluginRegistrationRecorder.addEndpointListener(self._endpointAdded)
+        try:
+            yield self._activate(self._pluginName)
+            activated = True
+
+        except Exception as e:
+            logger.error("Failed to activate lazy plugin %s", self._pluginName)
+            logger.exception(e)
+            activated = False
+
+        finally:
+            PluginRegistrationRecorder.removeEndpointListener(
+                self._endpointAdded
+            )
+
+        self._removePlaceholders()
+
+        queuedPayloads, self._queuedPayloads = self._queuedPayloads, []
+        self._queuedPayloadIds = set()
+
+        if not activated:
+            for queuedPayload in queuedPayloads:
+                self._respondFailed(queuedPayload[0], queuedPayload[4])
+
+            self._activating = False
+            if not self._isShutdown:
+                self._addPlaceholders()
+            return
+
+        self._activated = True
+
+        for (
+            payloadEnvelope,
+            vortexUuid,
+            vortexName,
+            httpSession,
+            sendResponse,
+        ) in queuedPayloads:
+            PayloadIO().process(
+                payloadEnvelope=payloadEnvelope,
+                vortexUuid=vortexUuid,
+                vortexName=vortexName,
+                httpSession=httpSession,
+                sendResponse=sendResponse,
+            )
+
+    def _respondFailed(self, payloadEnvelope: PayloadEnvelope, sendResponse):
+        logger.error(
+            "Dropped payload %s, lazy plugin %s failed to activate",
+            payloadEnvelope.filt,
+            self._pluginName,
+        )
+
+        if not sendResponse:
+            return
+
+        # Respond with an error, like PayloadIO does when an endpoint fails
+        try:
+            sendResponse(
+                PayloadEnvelope(
+                    filt=payloadEnvelope.filt,
+                    result="Plugin %s failed to activate, try again"
+                    % self._pluginName,
+                ).toVortexMsg()
+            )
+
+        except Exception as e:
+            logger.exception(e)
@@ -0,0 +1,149 @@
+from twisted.internet.defer import Deferred
+from twisted.trial import unittest
+from vortex.PayloadEnvelope import PayloadEnvelope
+from vortex.PayloadIO import PayloadIO
+
+from peek_platform.plugin.PluginLazyActivator import PluginLazyActivator
+
+
+FILT_A = dict(plugin="pluginA", key="a")
+FILT_B = dict(plugin="pluginA", key="b")
+
+
+class _FakeEndpoint:
+    def __init__(self, filt):
+        self.filt = filt
+        self.payloads = []
+
+
+class PluginLazyActivatorTest(unittest.TestCase):
+    def setUp(self):
+        self._activateDeferreds = []
+        self._realEndpoints = []
+
+        # Dispatch payloads synchronously, to every endpoint with its filt
+        self.patch(
+            PayloadIO,
+            "process",
+            lambda payloadIO, **kwargs: self._dispatch(**kwargs),
+        )
+
+        self._activator = PluginLazyActivator(
+            "pluginA", [FILT_A, FILT_B], self._activate
+        )
+        self.addCleanup(self._activator.shutdown)
+        self.addCleanup(self._removeRealEndpoints)
+
+    def _activate(self, pluginName):
+        d = Deferred()
+        self._activateDeferreds.append(d)
+        return d
+
+    def _dispatch(self, payloadEnvelope, **kwargs):
+        for endpoint in PayloadIO().endpoints:
+            if endpoint.filt != payloadEnvelope.filt:
+                continue
+
+            if isinstance(endpoint, _FakeEndpoint):
+                endpoint.payloads.append(payloadEnvelope)
+            else:
+                self._activator._process(
+                    payloadEnvelope,
+                    kwargs["vortexUuid"],
+                    kwargs["vortexName"],
+                    kwargs["sendResponse"],
+                )
+
+    def _send(self, filt, sendResponse=None):
+        payloadEnvelope = PayloadEnvelope(filt=dict(filt))
+        PayloadIO().process(
+            payloadEnvelope=payloadEnvelope,
+            vortexUuid="uuid",
+            vortexName="name",
+            httpSession=None,
+            sendResponse=sendResponse,
+        )
+        return payloadEnvelope
+
+    def _addRealEndpoint(self, filt):
+        endpoint = _FakeEndpoint(filt)
+        self._realEndpoints.append(endpoint)
+        PayloadIO().add(endpoint)
+        return endpoint
+
+    def _removeRealEndpoints(self):
+        for endpoint in self._realEndpoints:
+            PayloadIO().remove(endpoint)
+
+    def _placeholderFilts(self):
+        return [
+            e.filt
+            for e in PayloadIO().endpoints
+            if not isinstance(e, _FakeEndpoint)
+            and e.filt.get("plugin") == "pluginA"
+        ]
+
+    def testPayloadsAreProcessedOnce(self):
+        first = self._send(FILT_A)
+        self._send(FILT_A)
+        self.assertEqual(len(self._activateDeferreds), 1)
+        self.assertTrue(self._activator.isActivating)
+
+        # The placeholder is replaced as the plugin adds its endpoint
+        realA = self._addRealEndpoint(FILT_A)
+        self.assertEqual(self._placeholderFilts(), [FILT_B])
+
+        afterRegister = self._send(FILT_A)
+        self.assertEqual(realA.payloads, [afterRegister])
+
+        self._activateDeferreds[0].callback(None)
+
+        # The queued payloads are replayed to the plugin's endpoint
+        self.assertEqual(len(realA.payloads), 3)
+        self.assertIs(realA.payloads[1], first)
+        self.assertEqual(len(set(map(id, realA.payloads))), 3)
+        self.assertEqual(self._placeholderFilts(), [])
+
+    def testLateDispatchIsPassedOnAfterActivation(self):
+        self._send(FILT_A)
+        self._activateDeferreds[0].callback(None)
+
+        realA = self._addRealEndpoint(FILT_A)
+
+        # PayloadIO dispatched this to the placeholder before it was removed
+        late = PayloadEnvelope(filt=dict(FILT_A))
+        for _ in range(2):
+            self._activator._process(late, "uuid", "name", None)
+
+        self.assertEqual(realA.payloads, [late])
+        self.assertEqual(len(self._activateDeferreds), 1)
+
+    def testFailedActivationTriesAgain(self):
+        responses = []
+        self._send(FILT_A, responses.append)
+        self._send(FILT_B)
+
+        with self.assertLogs(
+            "peek_platform.plugin.PluginLazyActivator"
+        ) as logs:
+            self._activateDeferreds[0].errback(Exception("Import failed"))
+
+        droppedMessages = [
+            r.getMessage()
+            for r in logs.records
+            if r.getMessage().startswith("Dropped payload")
+        ]
+        self.assertEqual(len(droppedMessages), 2)
+
+        # The payloads with a sendResponse are responded to with an error
+        self.assertEqual(len(responses), 1)
+        response = PayloadEnvelope().fromVortexMsg(responses[0])
+        self.assertEqual(response.filt, FILT_A)
+        self.assertIn("failed to activate", response.result)
+
+        # The placeholders are back, the next payload activates again
+        self.assertFalse(self._activator.isActivating)
+        self.assertCountEqual(self._placeholderFilts(), [FILT_A, FILT_B])
+
+        self._send(FILT_A)
+        self.assertEqual(len(self._activateDeferreds), 2)
@@ -0,0 +1,163 @@
+import gc
+import logging
+import sys
+import types
+import weakref
+from collections import defaultdict
+from typing import List
+from typing import Tuple
+
+from twisted.internet.defer import Deferred
+from twisted.internet.threads import deferToThread
+
+
+logger = logging.getLogger(__name__)
+
+
+class PluginLeakDetector:
+    """Plugin Leak Detector
+
+    This class holds weak references to the objects of a loaded plugin, its
+    entry hook, modules and tuple classes. Once the plugin is unloaded, these
+    should all be garbage collected.
+
+    For any object that is still alive, the chains of objects referring to it
+    are logged, EG ::
+
+        pluginA.tuples.ATuple <- dict <- peek_other_plugin.Cache
+
+    The collection and referrer search run in a thread, the reactor still
+    waits for the GIL, but it isn't blocked for the whole search.
+
+    """
+
+    # Limit the referrer search, gc.get_referrers scans every object
+    MAX_DEPTH = 4
+    MAX_CHAINS = 3
+
+    def __init__(self):
+        self._refsByPluginName = defaultdict(list)
+
+    def watch(self, pluginName: str, objects: List) -> None:
+        for obj in objects:
+            try:
+                self._refsByPluginName[pluginName].append(
+                    (self._describe(obj), weakref.ref(obj))
+                )
+
+            except TypeError:
+                # Some objects can't be weakly referenced
+                pass
+
+    def check(self, pluginName: str) -> Deferred:
+        """Check
+
+        Call this once the plugin is unloaded.
+
+        :return: A deferred that fires with a list of (description, chains)
+            for each object that is still alive.
+
+        """
+        refs = self._refsByPluginName.pop(pluginName, [])
+        return deferToThread(self._checkBlocking, pluginName, refs)
+
+    def _checkBlocking(self, pluginName: str, refs) -> List[Tuple[str, List]]:
+        gc.collect()
+
+        leaks = []
+        for description, ref in refs:
+            obj = ref()
+            if obj is None:
+                continue
+
+            chains = self._referrerChains(obj)
+            del obj
+            leaks.append((description, chains))
+
+        if not leaks:
+            logger.debug("Plugin %s unloaded cleanly", pluginName)
+            return leaks
+
+        logger.warning(
+            "%s objects from plugin %s are still referenced after unloading",
+            len(leaks),
+            pluginName,
+        )
+        for description, chains in leaks:
+            if not chains:
+                logger.warning("%s is still referenced", description)
+
+            for chain in chains:
+                logger.warning("%s", " <- ".join([description] + chain))
+
+        return leaks
+
+    def _referrerChains(self, obj) -> List[List[str]]:
+        """Referrer Chains
+
+        Search up from the object, through the objects that refer to it,
+        until a module, class or the depth limit is reached.
+
+        """
+        chains = []
+
+        # Ignore the references from this search
+        searchFrame = sys._getframe()
+        ignoreIds = {id(searchFrame), id(chains)}
+
+        def search(target, chain, depth):
+            if len(chains) >= self.MAX_CHAINS:
+                return
+
+            referrers = gc.get_referrers(target)
+            ignoreIds.add(id(referrers))
+
+            found = False
+            for referrer in referrers:
+                if len(chains) >= self.MAX_CHAINS:
+                    break
+
+                if id(referrer) in ignoreIds or isinstance(
+                    referrer, types.FrameType
+                ):
+                    continue
+
+                found = True
+                referrerChain = chain + [self._describe(referrer)]
+
+                if depth + 1 >= self.MAX_DEPTH or isinstance(
+                    referrer, (types.ModuleType, type)
+                ):
+                    chains.append(referrerChain)
+                    continue
+
+                search(referrer, referrerChain, depth + 1)
+
+            if not found and chain:
+                chains.append(chain)
+
+            del referrers
+
+        search(obj, [], 0)
+        return chains
+
+    @staticmethod
+    def _describe(obj) -> str:
+        if isinstance(obj, types.ModuleType):
+            return "module %s" % obj.__name__
+
+        if isinstance(obj, type):
+            return "%s.%s" % (obj.__module__, obj.__qualname__)
+
+        if isinstance(obj, (types.FunctionType, types.MethodType)):
+            return "%s %s" % (type(obj).__name__, obj.__qualname__)
+
+        if (
+            isinstance(obj, dict)
+            and "__name__" in obj
+            and "__builtins__" in obj
+        ):
+            return "module %s globals" % obj["__name__"]
+
+        objType = type(obj)
+        return "%s.%s" % (objType.__module__, objType.__qualname__)
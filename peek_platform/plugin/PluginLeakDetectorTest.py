@@ -0,0 +1,45 @@
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from peek_platform.plugin.PluginLeakDetector import PluginLeakDetector
+
+
+class _EntryHook:
+    pass
+
+
+class _Holder:
+    def __init__(self, held):
+        self.held = held
+
+
+class PluginLeakDetectorTest(unittest.TestCase):
+    @inlineCallbacks
+    def testReleasedObjectsAreNotReported(self):
+        detector = PluginLeakDetector()
+        detector.watch("pluginA", [_EntryHook()])
+
+        leaks = yield detector.check("pluginA")
+        self.assertEqual(leaks, [])
+
+    @inlineCallbacks
+    def testReferrerChainsAreReported(self):
+        detector = PluginLeakDetector()
+        entryHook = _EntryHook()
+        holder = _Holder(entryHook)
+        detector.watch("pluginA", [entryHook])
+        del entryHook
+
+        leaks = yield detector.check("pluginA")
+
+        self.assertEqual(len(leaks), 1)
+        description, chains = leaks[0]
+        self.assertIn("_EntryHook", description)
+        self.assertTrue(
+            any(
+                any("_Holder" in referrer for referrer in chain)
+                for chain in chains
+            ),
+            chains,
+        )
+        self.assertIsNotNone(holder)
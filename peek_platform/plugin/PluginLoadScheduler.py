@@ -0,0 +1,223 @@
+import logging
+import re
+import time
+from importlib.metadata import PackageNotFoundError
+from importlib.metadata import requires
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Set
+
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import DeferredSemaphore
+from twisted.internet.defer import gatherResults
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import maybeDeferred
+from vortex.DeferUtil import vortexLogFailure
+
+
+logger = logging.getLogger(__name__)
+
+# The distribution name at the start of a requirement,
+# EG "peek-core-device>=3.0; python_version > '3.6'"
+_REQUIREMENT_NAME_RE = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+
+def pluginDependenciesByName(pluginNames: List[str]) -> Dict[str, Set[str]]:
+    """Plugin Dependencies By Name
+
+    Read the dependencies between the plugins from the installed package
+    metadata. Dependencies on packages that are not in pluginNames are
+    ignored.
+
+    :param pluginNames: The plugin package names, EG "peek_core_device"
+
+    :return: A dict of the plugin names each plugin requires.
+
+    """
+    pluginNamesSet = set(pluginNames)
+    dependenciesByName = {}
+
+    for pluginName in pluginNames:
+        try:
+            requirements = requires(pluginName) or []
+
+        except PackageNotFoundError:
+            requirements = []
+
+        dependencies = set()
+        for requirement in requirements:
+            # Skip the requirements of optional extras
+            if "extra ==" in requirement:
+                continue
+
+            match = _REQUIREMENT_NAME_RE.match(requirement)
+            if not match:
+                continue
+
+            name = match.group(1).replace("-", "_").lower()
+            if name in pluginNamesSet and name != pluginName:
+                dependencies.add(name)
+
+        dependenciesByName[pluginName] = dependencies
+
+    return dependenciesByName
+
+
+def sortPluginNamesByDependency(
+    pluginNames: List[str], dependenciesByName: Dict[str, Set[str]]
+) -> List[str]:
+    """Sort Plugin Names By Dependency
+
+    :return: The plugin names with each plugin after the plugins it requires,
+        otherwise in the order they were given.
+
+    """
+    remaining = list(pluginNames)
+    sortedNames = []
+    sortedNamesSet = set()
+
+    while remaining:
+        for pluginName in remaining:
+            if dependenciesByName.get(pluginName, set()) <= sortedNamesSet:
+                break
+
+        else:
+            # A dependency cycle, fall back to the configured order
+            pluginName = remaining[0]
+            logger.warning(
+                "Plugin %s is in a dependency cycle with %s",
+                pluginName,
+                ", ".join(sorted(dependenciesByName[pluginName])),
+            )
+
+        remaining.remove(pluginName)
+        sortedNames.append(pluginName)
+        sortedNamesSet.add(pluginName)
+
+    return sortedNames
+
+
+class PluginLoadScheduler:
+    """Plugin Load Scheduler
+
+    This class runs a load or start step for many plugins concurrently,
+    each plugin waits for the plugins it requires.
+
+    """
+
+    def __init__(self, concurrency: int):
+        """Constructor
+
+        :param concurrency: The maximum number of plugins to run the step for
+            at once, one runs the plugins in sequence.
+
+        """
+        self._concurrency = max(1, concurrency)
+
+    @inlineCallbacks
+    def run(
+        self,
+        description: str,
+        pluginNames: List[str],
+        func: Callable[[str], Deferred],
+    ):
+        """Run
+
+        :param description: The step, for logging, EG "Load core plugins"
+        :param pluginNames: The plugins, in their configured order.
+        :param func: The step to run for each plugin, errors are logged and
+            the plugins that require it are still run.
+
+        :return: A deferred that fires with a dict of the seconds each
+            plugin took, once every plugin is done.
+
+        """
+        dependenciesByName = pluginDependenciesByName(pluginNames)
+        semaphore = DeferredSemaphore(self._concurrency)
+
+        secondsByName = {}
+        doneDeferredByName = {}
+
+        @inlineCallbacks
+        def timedRun(pluginName: str):
+            startTime = time.monotonic()
+            try:
+                yield maybeDeferred(func, pluginName)
+
+            except Exception as e:
+                logger.error("%s: %s failed", description, pluginName)
+                logger.exception(e)
+
+            secondsByName[pluginName] = time.monotonic() - startTime
+
+        startTime = time.monotonic()
+
+        for pluginName in sortPluginNamesByDependency(
+            pluginNames, dependenciesByName
+        ):
+            d = gatherResults(
+                [
+                    doneDeferredByName[dependency]
+                    for dependency in dependenciesByName[pluginName]
+                    if dependency in doneDeferredByName
+                ]
+            )
+            d.addCallback(
+                lambda _, pluginName=pluginName: semaphore.run(
+                    timedRun, pluginName
+                )
+            )
+            d.addErrback(vortexLogFailure, logger, consumeError=True)
+            doneDeferredByName[pluginName] = d
+
+        yield gatherResults(list(doneDeferredByName.values()))
+
+        self._logTimings(
+            description,
+            time.monotonic() - startTime,
+            secondsByName,
+            dependenciesByName,
+        )
+
+        return secondsByName
+
+    def _logTimings(
+        self,
+        description: str,
+        wallSeconds: float,
+        secondsByName: Dict[str, float],
+        dependenciesByName: Dict[str, Set[str]],
+    ):
+        if not secondsByName:
+            return
+
+        # The longest chain of dependencies, no amount of concurrency can
+        # make the step faster than this.
+        criticalPathSecondsByName = {}
+        for pluginName in sortPluginNamesByDependency(
+            list(secondsByName), dependenciesByName
+        ):
+            criticalPathSecondsByName[pluginName] = secondsByName[
+                pluginName
+            ] + max(
+                [
+                    criticalPathSecondsByName.get(dependency, 0)
+                    for dependency in dependenciesByName[pluginName]
+                ],
+                default=0,
+            )
+
+        logger.info(
+            "%s: %s plugins in %.2fs, critical path %.2fs, total %.2fs",
+            description,
+            len(secondsByName),
+            wallSeconds,
+            max(criticalPathSecondsByName.values()),
+            sum(secondsByName.values()),
+        )
+
+        for pluginName, seconds in sorted(
+            secondsByName.items(), key=lambda item: item[1], reverse=True
+        ):
+            logger.info("%s: %s took %.2fs", description, pluginName, seconds)
@@ -0,0 +1,68 @@
+from twisted.internet.defer import Deferred
+from twisted.trial import unittest
+
+from peek_platform.plugin import PluginLoadScheduler as scheduler_module
+from peek_platform.plugin.PluginLoadScheduler import PluginLoadScheduler
+from peek_platform.plugin.PluginLoadScheduler import (
+    sortPluginNamesByDependency,
+)
+
+
+class PluginLoadSchedulerTest(unittest.TestCase):
+    def testSortKeepsConfiguredOrder(self):
+        self.assertEqual(
+            sortPluginNamesByDependency(
+                ["peek_a", "peek_b", "peek_c"],
+                {"peek_a": {"peek_c"}, "peek_b": set(), "peek_c": set()},
+            ),
+            ["peek_b", "peek_c", "peek_a"],
+        )
+
+    def testSortFallsBackOnCycle(self):
+        self.assertEqual(
+            sortPluginNamesByDependency(
+                ["peek_a", "peek_b"],
+                {"peek_a": {"peek_b"}, "peek_b": {"peek_a"}},
+            ),
+            ["peek_a", "peek_b"],
+        )
+
+    def testDependentsWaitAndConcurrencyIsCapped(self):
+        self.patch(
+            scheduler_module,
+            "pluginDependenciesByName",
+            lambda names: {
+                "peek_a": set(),
+                "peek_b": set(),
+                "peek_c": set(),
+                "peek_d": {"peek_a"},
+            },
+        )
+
+        runningDeferredByName = {}
+
+        def load(pluginName):
+            runningDeferredByName[pluginName] = Deferred()
+            return runningDeferredByName[pluginName]
+
+        d = PluginLoadScheduler(2).run(
+            "Load", ["peek_a", "peek_b", "peek_c", "peek_d"], load
+        )
+        self.assertEqual(sorted(runningDeferredByName), ["peek_a", "peek_b"])
+
+        # peek_c takes the free slot, peek_d is now free to start
+        runningDeferredByName["peek_a"].callback(None)
+        self.assertEqual(
+            sorted(runningDeferredByName), ["peek_a", "peek_b", "peek_c"]
+        )
+
+        runningDeferredByName["peek_b"].callback(None)
+        self.assertIn("peek_d", runningDeferredByName)
+
+        runningDeferredByName["peek_c"].callback(None)
+        runningDeferredByName["peek_d"].callback(None)
+
+        secondsByName = self.successResultOf(d)
+        self.assertEqual(
+            sorted(secondsByName), ["peek_a", "peek_b", "peek_c", "peek_d"]
+        )
@@ -1,24 +1,36 @@
-import gc
 import logging
 import os
 import sys
+import time
 from abc import ABCMeta
 from abc import abstractmethod
 from abc import abstractproperty
 from collections import defaultdict
+from importlib import invalidate_caches
 from importlib.util import find_spec
 from typing import Optional
 from typing import Tuple
 from typing import Type
 
-from jsoncfg.value_mappers import require_array
-from jsoncfg.value_mappers import require_string
+from twisted.internet import reactor
 from twisted.internet.defer import maybeDeferred
 from vortex.DeferUtil import vortexLogFailure
 
 from peek_platform import PeekPlatformConfig
 from twisted.internet.defer import inlineCallbacks
 
+from peek_platform.plugin.PluginEndpointManifest import PluginEndpointManifest
+from peek_platform.plugin.PluginInFlightTracker import PluginInFlightTracker
+from peek_platform.plugin.PluginLazyActivator import PluginLazyActivator
+from peek_platform.plugin.PluginLeakDetector import PluginLeakDetector
+from peek_platform.plugin.PluginLoadScheduler import PluginLoadScheduler
+from peek_platform.plugin.PluginLoadScheduler import pluginDependenciesByName
+from peek_platform.plugin.PluginMetadataCache import PluginMetadataCache
+from peek_platform.plugin.PluginRegistrationRecorder import (
+    PluginRegistrationRecorder,
+)
+from peek_platform.plugin.PluginStartupReport import PluginStartupReport
+
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_platform_config_tuple import (
     PluginSubprocPlatformConfigTuple,
 )
@@ -29,7 +41,6 @@ from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_vortex_payl
     PluginSubprocVortexPayloadEnvelopeTuple,
 )
 from peek_plugin_base.PluginCommonEntryHookABC import PluginCommonEntryHookABC
-from peek_plugin_base.PluginPackageFileConfig import PluginPackageFileConfig
 from vortex.PayloadIO import PayloadIO
 from vortex.Tuple import registeredTupleNames
 from vortex.Tuple import removeTuplesForTupleNames
@@ -90,10 +101,93 @@ class PluginLoaderABC(metaclass=ABCMeta):
     def __init__(self):
         self._loadedPlugins = {}
         self._loadedSubprocessGroups = {}
+        self._subprocessGroupByPluginName = {}
 
         self._vortexEndpointInstancesByPluginName = defaultdict(list)
         self._vortexTupleNamesByPluginName = defaultdict(list)
 
+        # Plugins can be loaded concurrently, see PluginLoadScheduler
+        self._loadingPluginNames = set()
+        self._pluginSecondsByStep = {}
+
+        # Created when the first plugin loads, after the config is setup
+        self._startupReport = None
+        self._metadataCache = None
+
+        self._pluginVersionByName = {}
+        self._lazyActivatorsByPluginName = {}
+        self._reloadingPluginNames = set()
+        self._inFlightTracker = PluginInFlightTracker()
+        self._leakDetector = PluginLeakDetector()
+        self._registrationRecorder = PluginRegistrationRecorder()
+
+    @property
+    def startupReport(self) -> PluginStartupReport:
+        if not self._startupReport:
+            self._startupReport = PluginStartupReport(
+                PeekPlatformConfig.componentName,
+                profileDir=PeekPlatformConfig.config.pluginStartupProfileDir,
+            )
+        return self._startupReport
+
+    @property
+    def metadataCache(self) -> PluginMetadataCache:
+        if not self._metadataCache:
+            self._metadataCache = PluginMetadataCache(
+                PeekPlatformConfig.config.pluginMetadataCachePath,
+                PeekPlatformConfig.componentName,
+            )
+        return self._metadataCache
+
+    @property
+    def subprocessGroupStats(self) -> dict:
+        """Subprocess Group Stats
+
+        :return: The supervisor, flow control, CPU and memory stats of each
+            subprocess group.
+
+        """
+        return {
+            groupName: dict(
+                plugins=sorted(
+                    n
+                    for n, g in self._subprocessGroupByPluginName.items()
+                    if g == groupName
+                ),
+                workers=group.workerStats,
+                flowControl=group.flowControlStats,
+                processes=group.processStats,
+            )
+            for groupName, group in self._loadedSubprocessGroups.items()
+        }
+
+    @property
+    def inFlightStats(self) -> dict:
+        """In Flight Stats
+
+        :return: The payloads each plugin is processing, and has refused while
+            stopping, EG {"peek_core_user": {"inFlight": 2, ...}}
+
+        """
+        return self._inFlightTracker.stats
+
+    def writeStartupReport(self) -> None:
+        """Write Startup Report
+
+        Log the plugin startup summary table, and write the report to the
+        service home directory.
+
+        """
+        self.startupReport.logSummary()
+        try:
+            self.startupReport.writeJson(
+                PeekPlatformConfig.config.pluginStartupReportPath
+            )
+
+        except Exception as e:
+            logger.error("Failed to write the plugin startup report")
+            logger.exception(e)
+
     @abstractproperty
     def _entryHookFuncName(self) -> str:
         """Entry Hook Func Name.
@@ -132,9 +226,8 @@ class PluginLoaderABC(metaclass=ABCMeta):
 
     @inlineCallbacks
     def loadPlugin(self, pluginName):
-        # Until we implement dynamic loading and unloading of plugins
-        # make sure we don't load them twice, because we don't yet
-        # support it.
+        # Make sure we don't load them twice,
+        # use reloadPlugin to load a new version of a loaded plugin.
 
         from peek_platform import PeekPlatformConfig
 
@@ -143,133 +236,251 @@ class PluginLoaderABC(metaclass=ABCMeta):
                 "Plugin %s is already loaded, check config.json" % pluginName
             )
 
+        self._loadingPluginNames.add(pluginName)
+        report = self.startupReport
+
         try:
             self.unloadPlugin(pluginName)
 
-            # Make note of the initial registrations for this plugin
-            endpointInstancesBefore = set(PayloadIO().endpoints)
-            tupleNamesBefore = set(registeredTupleNames())
+            # Record the registrations for this plugin
+            self._registrationRecorder.start(pluginName)
+
+            try:
+                modSpec = find_spec(pluginName)
+                if not modSpec:
+                    raise Exception(
+                        "Failed to find package %s,"
+                        " is the python package installed?" % pluginName
+                    )
+
+                pluginRootDir = os.path.dirname(modSpec.origin)
+
+                # Load up the plugin package info, before importing the package
+                with report.phase(pluginName, "packageConfig"):
+                    metadata = self.metadataCache.metadata(
+                        pluginName, pluginRootDir
+                    )
+                    pluginVersion = metadata["version"]
+                    self._pluginVersionByName[pluginName] = pluginVersion
+                    pluginRequiresService = metadata["requiresServices"]
+
+                # Make sure the service is required
+                # Storage and Server are loaded at the same time, hence the intersection
+                if not set(pluginRequiresService) & set(
+                    self._platformServiceNames
+                ):
+                    logger.debug(
+                        "%s does not require %s, Skipping load",
+                        pluginName,
+                        self._platformServiceNames,
+                    )
+                    return
+
+                entryHookFuncNames = metadata["entryHookFuncNames"]
+                if (
+                    entryHookFuncNames is not None
+                    and self._entryHookFuncName not in entryHookFuncNames
+                ):
+                    logger.warning(
+                        "Skipping load for %s, %s.%s is missing",
+                        pluginName,
+                        pluginName,
+                        self._entryHookFuncName,
+                    )
+                    return
+
+                with report.importPhase(pluginName):
+                    PluginPackage = modSpec.loader.load_module()
+
+                self.metadataCache.setEntryHookFuncNames(
+                    pluginName,
+                    sorted(
+                        name
+                        for name in dir(PluginPackage)
+                        if name.startswith("peek")
+                        and name.endswith("EntryHook")
+                    ),
+                )
 
-            modSpec = find_spec(pluginName)
-            if not modSpec:
-                raise Exception(
-                    "Failed to find package %s,"
-                    " is the python package installed?" % pluginName
+                # Get the entry hook class from the package
+                entryHookGetter = getattr(
+                    PluginPackage, str(self._entryHookFuncName)
                 )
 
-            PluginPackage = modSpec.loader.load_module()
+                subprocessGroup = metadata["subprocessGroup"]
+                runInSubprocess = (
+                    subprocessGroup
+                    and not PeekPlatformConfig.isPluginSubprocess
+                    and PeekPlatformConfig.config.subprocessGroupsEnabled
+                )
 
-            pluginRootDir = os.path.dirname(PluginPackage.__file__)
+                with report.phase(pluginName, "entryHook"):
+                    RealEntryHookClass = (
+                        entryHookGetter() if entryHookGetter else None
+                    )
+
+                if not RealEntryHookClass:
+                    logger.warning(
+                        "Skipping load for %s, %s.%s is missing or returned None",
+                        pluginName,
+                        pluginName,
+                        self._entryHookFuncName,
+                    )
+                    return
+
+                if not issubclass(RealEntryHookClass, self._entryHookClassType):
+                    raise Exception(
+                        "%s load error, Excpected %s, received %s"
+                        % (
+                            pluginName,
+                            self._entryHookClassType,
+                            RealEntryHookClass,
+                        )
+                    )
+
+                # Are we going to run this plugin in a subprocess?
+                if runInSubprocess:
+                    from peek_platform.subproc_plugin_init.plugin_subproc_parent_main import (
+                        PluginSubprocParentMain,
+                    )
+
+                    # We can run multiple plugins in one group
+                    # Have we already created this group?
+                    if subprocessGroup in self._loadedSubprocessGroups:
+                        subprocParentMain = self._loadedSubprocessGroups[
+                            subprocessGroup
+                        ]
+                    else:
+                        # Else, create it.
+                        subprocParentMain = PluginSubprocParentMain(
+                            subprocessGroup
+                        )
+                        self._loadedSubprocessGroups[subprocessGroup] = (
+                            subprocParentMain
+                        )
+
+                    self._subprocessGroupByPluginName[pluginName] = (
+                        subprocessGroup
+                    )
 
-            # Load up the plugin package info
-            pluginPackageJson = PluginPackageFileConfig(pluginRootDir)
-            pluginVersion = pluginPackageJson.config.plugin.version(
-                require_string
-            )
-            pluginRequiresService = pluginPackageJson.config.requiresServices(
-                require_array
-            )
+                    # Return the subprocParentMain, it has a __call__ method
+                    # to simulate the plugin class constructor
+                    EntryHookClass = subprocParentMain
 
-            # Make sure the service is required
-            # Storage and Server are loaded at the same time, hence the intersection
-            if not set(pluginRequiresService) & set(self._platformServiceNames):
-                logger.debug(
-                    "%s does not require %s, Skipping load",
-                    pluginName,
-                    self._platformServiceNames,
+                else:
+                    EntryHookClass = RealEntryHookClass
+
+                ### Perform the loading of the plugin
+                with report.phase(pluginName, "load"):
+                    yield self._loadPluginThrows(
+                        pluginName,
+                        EntryHookClass,
+                        pluginRootDir,
+                        tuple(pluginRequiresService),
+                    )
+
+                with report.phase(pluginName, "webResources"):
+                    yield self._setupStaticWebResourcesForPlugin(
+                        RealEntryHookClass, pluginName
+                    )
+
+                # Make sure the version we have recorded is correct
+                # JJC Disabled, this is just spamming the config file at the moment
+                # PeekPlatformConfig.config.setPluginVersion(pluginName, pluginVersion)
+
+            finally:
+                # Make note of the final registrations for this plugin,
+                # other plugins may have been loading at the same time.
+                endpoints, tupleNames = self._registrationRecorder.stop(
+                    pluginName
                 )
-                return
 
-            configForService = pluginPackageJson.configForService(
-                PeekPlatformConfig.componentName
-            )
+            self._addPluginRegistrations(pluginName, endpoints, tupleNames)
 
-            # Get the entry hook class from the package
-            entryHookGetter = getattr(
-                PluginPackage, str(self._entryHookFuncName)
+            report.setCount(
+                pluginName,
+                "endpoints",
+                len(self._vortexEndpointInstancesByPluginName[pluginName]),
             )
-
-            subprocessGroup = configForService.subprocessGroup(None)
-            runInSubprocess = (
-                subprocessGroup and not PeekPlatformConfig.isPluginSubprocess
+            report.setCount(
+                pluginName,
+                "tuples",
+                len(self._vortexTupleNamesByPluginName[pluginName]),
             )
 
-            RealEntryHookClass = entryHookGetter() if entryHookGetter else None
+            self._trackPluginEndpoints(pluginName)
 
-            if not RealEntryHookClass:
-                logger.warning(
-                    "Skipping load for %s, %s.%s is missing or returned None",
-                    pluginName,
-                    pluginName,
-                    self._entryHookFuncName,
-                )
-                return
+            self.sanityCheckServerPlugin(pluginName)
 
-            if not issubclass(RealEntryHookClass, self._entryHookClassType):
-                raise Exception(
-                    "%s load error, Excpected %s, received %s"
-                    % (pluginName, self._entryHookClassType, RealEntryHookClass)
-                )
+        except Exception as e:
+            logger.error("Failed to load plugin %s", pluginName)
+            logger.exception(e)
 
-            # Are we going to run this plugin in a subprocess?
-            if False:  # runInSubprocess:
-                pass
-                """
-                from peek_platform.subproc_plugin_init.plugin_subproc_parent_main import (
-                    PluginSubprocParentMain,
-                )
+        finally:
+            self._loadingPluginNames.discard(pluginName)
 
-                # We can run multiple plugins in one group
-                # Have we already created this group?
-                if subprocessGroup in self._loadedSubprocessGroups:
-                    subprocParentMain = self._loadedSubprocessGroups[
-                        subprocessGroup
-                    ]
-                else:
-                    # Else, create it.
-                    subprocParentMain = PluginSubprocParentMain(subprocessGroup)
-                    self._loadedSubprocessGroups[
-                        subprocessGroup
-                    ] = subprocParentMain
+    def _addPluginRegistrations(
+        self, pluginName: str, endpoints: list, tupleNames: list
+    ) -> None:
+        """Add Plugin Registrations
 
-                # Return the subprocParentMain, it has a __call__ method
-                # to simulate the plugin class constructor
-                EntryHookClass = subprocParentMain
-                """
+        Keep the endpoints and tuple names recorded while the plugin loaded
+        or started, so they're removed when it's unloaded.
 
-            else:
-                EntryHookClass = RealEntryHookClass
+        """
+        pluginEndpoints = self._vortexEndpointInstancesByPluginName[pluginName]
+        for endpoint, shared in endpoints:
+            if endpoint in pluginEndpoints:
+                continue
 
-            ### Perform the loading of the plugin
-            yield self._loadPluginThrows(
-                pluginName,
-                EntryHookClass,
-                pluginRootDir,
-                tuple(pluginRequiresService),
-            )
+            if not shared or self._isRegisteredByPlugin(
+                pluginName, str(endpoint.filt.get("plugin", ""))
+            ):
+                pluginEndpoints.append(endpoint)
 
-            yield self._setupStaticWebResourcesForPlugin(
-                RealEntryHookClass, pluginName
-            )
+        pluginTupleNames = self._vortexTupleNamesByPluginName[pluginName]
+        for tupleName, shared in tupleNames:
+            if tupleName in pluginTupleNames:
+                continue
 
-            # Make sure the version we have recorded is correct
-            # JJC Disabled, this is just spamming the config file at the moment
-            # PeekPlatformConfig.config.setPluginVersion(pluginName, pluginVersion)
+            if not shared or self._isRegisteredByPlugin(pluginName, tupleName):
+                pluginTupleNames.append(tupleName)
 
-            # Make note of the final registrations for this plugin
-            self._vortexEndpointInstancesByPluginName[pluginName] = list(
-                set(PayloadIO().endpoints) - endpointInstancesBefore
-            )
+    def pluginNameForModule(self, moduleName: str) -> Optional[str]:
+        """Plugin Name For Module
 
-            self._vortexTupleNamesByPluginName[pluginName] = list(
-                set(registeredTupleNames()) - tupleNamesBefore
-            )
+        :return: The name of the loaded plugin that the module belongs to,
+            or None. This is called from other threads.
 
-            self.sanityCheckServerPlugin(pluginName)
+        """
+        pluginName = moduleName.partition(".")[0]
+        if pluginName in self._loadedPlugins:
+            return pluginName
 
-        except Exception as e:
-            logger.error("Failed to load plugin %s", pluginName)
-            logger.exception(e)
+        if pluginName in self._loadingPluginNames:
+            return pluginName
+
+        return None
+
+    def _isRegisteredByPlugin(self, pluginName: str, registeredName: str):
+        """Is Registered By Plugin
+
+        Registrations are prefixed with the plugin name, the plugin with the
+        longest matching name owns the registration. Registrations that no
+        loading or loaded plugin owns are kept, so the sanity checks report
+        them.
+
+        """
+        ownerNames = [
+            name
+            for name in self._loadingPluginNames | set(self._loadedPlugins)
+            if registeredName.startswith(name)
+        ]
+
+        if not ownerNames:
+            return True
+
+        return max(ownerNames, key=len) == pluginName
 
     @abstractmethod
     def _loadPluginThrows(
@@ -312,19 +523,121 @@ class PluginLoaderABC(metaclass=ABCMeta):
 
         del oldLoadedPlugin
 
+        self._inFlightTracker.forget(pluginName)
+
         # Remove the registered endpoints
         for endpoint in self._vortexEndpointInstancesByPluginName[pluginName]:
             PayloadIO().remove(endpoint)
         del self._vortexEndpointInstancesByPluginName[pluginName]
 
         # Remove the registered tuples
-        removeTuplesForTupleNames(
-            self._vortexTupleNamesByPluginName[pluginName]
+        tupleNames = self._vortexTupleNamesByPluginName[pluginName]
+        registeredNames = set(registeredTupleNames())
+        self._leakDetector.watch(
+            pluginName,
+            [
+                tupleForTupleName(tupleName)
+                for tupleName in tupleNames
+                if tupleName in registeredNames
+            ],
         )
+        removeTuplesForTupleNames(tupleNames)
         del self._vortexTupleNamesByPluginName[pluginName]
 
         yield self._unloadPluginPackage(pluginName)
 
+        # Stop the subprocess group once its last plugin is unloaded
+        subprocessGroup = self._subprocessGroupByPluginName.pop(
+            pluginName, None
+        )
+        if subprocessGroup and (
+            subprocessGroup not in self._subprocessGroupByPluginName.values()
+        ):
+            self._loadedSubprocessGroups.pop(subprocessGroup).shutdown()
+            logger.debug("Stopped subprocess group %s", subprocessGroup)
+
+    @inlineCallbacks
+    def reloadPlugin(self, pluginName: str):
+        """Reload Plugin
+
+        Load a new version of a plugin, while the other plugins keep running.
+
+        New payloads for the plugin are refused, the payloads already
+        dispatched to it are drained, then the plugin is stopped, unloaded,
+        loaded from the newly installed package and started.
+
+        """
+        if pluginName in self._reloadingPluginNames:
+            logger.warning("Plugin %s is already reloading", pluginName)
+            return
+
+        self._reloadingPluginNames.add(pluginName)
+        startTime = time.monotonic()
+
+        try:
+            # The package on disk has changed
+            invalidate_caches()
+
+            # A lazy plugin that hasn't been used yet has nothing to unload
+            activator = self._lazyActivatorsByPluginName.get(pluginName)
+            if activator and not activator.isActivating:
+                activator.shutdown()
+                del self._lazyActivatorsByPluginName[pluginName]
+
+                filts = self._lazyFiltsByPluginName(
+                    PeekPlatformConfig.config.pluginsEnabled
+                ).get(pluginName)
+                if filts is not None:
+                    self._lazyActivatorsByPluginName[pluginName] = (
+                        PluginLazyActivator(
+                            pluginName, filts, self._activateLazyPlugin
+                        )
+                    )
+                    return
+
+            if pluginName in self._loadedPlugins:
+                self._refusePayloadsForPlugin(pluginName)
+
+                yield self._tryStop(pluginName)
+                yield self.unloadPlugin(pluginName)
+
+            yield self.loadPlugin(pluginName)
+
+            if pluginName in self._loadedPlugins:
+                yield self._tryStart(pluginName)
+                self._updateEndpointManifest()
+
+            logger.info(
+                "Reloaded plugin %s version %s in %.2fs",
+                pluginName,
+                self._pluginVersionByName.get(pluginName),
+                time.monotonic() - startTime,
+            )
+
+        finally:
+            self._reloadingPluginNames.discard(pluginName)
+
+    def _refusePayloadsForPlugin(self, pluginName: str) -> None:
+        """Refuse Payloads For Plugin
+
+        Remove the plugins payload endpoints from PayloadIO, so no new payloads
+        are dispatched to it. The plugin will shut down the endpoints it
+        created when it's stopped.
+
+        """
+        for endpoint in self._vortexEndpointInstancesByPluginName[pluginName]:
+            PayloadIO().remove(endpoint)
+
+    def _trackPluginEndpoints(self, pluginName: str) -> None:
+        """Track Plugin Endpoints
+
+        Count the payloads the plugins endpoints are processing, including
+        the endpoints it creates when it starts.
+
+        """
+        for endpoint in self._vortexEndpointInstancesByPluginName[pluginName]:
+            self._inFlightTracker.track(pluginName, endpoint)
+
     def listPlugins(self):
         def pluginTest(name):
             if not name.startswith("plugin_"):
@@ -338,22 +651,57 @@ class PluginLoaderABC(metaclass=ABCMeta):
     # ---------------
     # Core Plugins
 
+    @property
+    def pluginSecondsByStep(self) -> dict:
+        """Plugin Seconds By Step
+
+        :return: The seconds each plugin took for each load and start step,
+            EG {"Load core plugins": {"peek_core_user": 1.2}}
+
+        """
+        return dict(self._pluginSecondsByStep)
+
+    @inlineCallbacks
+    def _runPluginStep(self, description: str, pluginNames, func):
+        scheduler = PluginLoadScheduler(
+            PeekPlatformConfig.config.pluginLoadConcurrency
+        )
+        startTime = time.monotonic()
+        self._pluginSecondsByStep[description] = yield scheduler.run(
+            description, list(pluginNames), func
+        )
+        self.startupReport.setStepSeconds(
+            description, time.monotonic() - startTime
+        )
+
+        try:
+            self.metadataCache.save()
+
+        except Exception as e:
+            logger.error("Failed to save the plugin metadata cache")
+            logger.exception(e)
+
     @inlineCallbacks
     def loadCorePlugins(self):
-        for pluginName in corePlugins:
-            yield self.loadPlugin(pluginName)
+        yield self._runPluginStep(
+            "Load core plugins", corePlugins, self.loadPlugin
+        )
 
     @inlineCallbacks
     def startCorePlugins(self):
         # Start the Plugin
-        for pluginName in corePlugins:
-            if pluginName not in self._loadedPlugins:
-                continue
-
-            yield self._tryStart(pluginName)
+        yield self._runPluginStep(
+            "Start core plugins",
+            [n for n in corePlugins if n in self._loadedPlugins],
+            self._tryStart,
+        )
 
     @inlineCallbacks
     def stopCorePlugins(self):
+        # Refuse new payloads while the plugins drain and stop
+        for pluginName in corePlugins:
+            self._inFlightTracker.refuse(pluginName)
+
         # Start the Plugin
         for pluginName in corePlugins:
             if pluginName not in self._loadedPlugins:
@@ -371,22 +719,48 @@ class PluginLoaderABC(metaclass=ABCMeta):
 
     @inlineCallbacks
     def loadOptionalPlugins(self):
-        for pluginName in PeekPlatformConfig.config.pluginsEnabled:
+        pluginNames = PeekPlatformConfig.config.pluginsEnabled
+        for pluginName in pluginNames:
             if pluginName.startswith("peek_core"):
                 raise Exception("Core plugins can not be configured")
-            yield self.loadPlugin(pluginName)
+
+        lazyFiltsByPluginName = self._lazyFiltsByPluginName(pluginNames)
+
+        yield self._runPluginStep(
+            "Load optional plugins",
+            [n for n in pluginNames if n not in lazyFiltsByPluginName],
+            self.loadPlugin,
+        )
+
+        for pluginName, filts in lazyFiltsByPluginName.items():
+            self._lazyActivatorsByPluginName[pluginName] = PluginLazyActivator(
+                pluginName, filts, self._activateLazyPlugin
+            )
+            logger.info(
+                "Plugin %s will be loaded when it's first used", pluginName
+            )
 
     @inlineCallbacks
     def startOptionalPlugins(self):
         # Start the Plugin
-        for pluginName in PeekPlatformConfig.config.pluginsEnabled:
-            if pluginName not in self._loadedPlugins:
-                continue
+        yield self._runPluginStep(
+            "Start optional plugins",
+            [
+                n
+                for n in PeekPlatformConfig.config.pluginsEnabled
+                if n in self._loadedPlugins
+            ],
+            self._tryStart,
+        )
 
-            yield self._tryStart(pluginName)
+        self._updateEndpointManifest()
 
     @inlineCallbacks
     def stopOptionalPlugins(self):
+        # Refuse new payloads while the plugins drain and stop
+        for pluginName in PeekPlatformConfig.config.pluginsEnabled:
+            self._inFlightTracker.refuse(pluginName)
+
         # Start the Plugin
         for pluginName in reversed(PeekPlatformConfig.config.pluginsEnabled):
             if pluginName not in self._loadedPlugins:
@@ -395,6 +769,10 @@ class PluginLoaderABC(metaclass=ABCMeta):
             yield self._tryStop(pluginName)
 
     def unloadOptionalPlugins(self):
+        for activator in self._lazyActivatorsByPluginName.values():
+            activator.shutdown()
+        self._lazyActivatorsByPluginName = {}
+
         for pluginName in reversed(PeekPlatformConfig.config.pluginsEnabled):
             if pluginName in self._loadedPlugins:
                 self.unloadPlugin(pluginName)
@@ -429,14 +807,132 @@ class PluginLoaderABC(metaclass=ABCMeta):
     # ---------------
     # Util methods Plugins
 
+    # ---------------
+    # Lazy Plugins
+
+    def _lazyFiltsByPluginName(self, pluginNames) -> dict:
+        """Lazy Filts By Plugin Name
+
+        :return: The endpoint filts of each plugin that can be loaded lazily.
+            Lazy plugins that other plugins require, or that have no endpoint
+            manifest for their version yet, are loaded eagerly.
+
+        """
+        lazyPluginNames = [
+            n for n in pluginNames if n in PeekPlatformConfig.config.pluginsLazy
+        ]
+        if not lazyPluginNames:
+            return {}
+
+        dependenciesByName = pluginDependenciesByName(
+            corePlugins + list(pluginNames)
+        )
+        requiredPluginNames = set().union(*dependenciesByName.values())
+
+        manifest = PluginEndpointManifest(
+            PeekPlatformConfig.config.pluginEndpointManifestPath
+        )
+
+        lazyFiltsByPluginName = {}
+        for pluginName in lazyPluginNames:
+            if pluginName in requiredPluginNames:
+                logger.info(
+                    "Plugin %s is required by other plugins,"
+                    " it can not be loaded lazily",
+                    pluginName,
+                )
+                continue
+
+            filts = manifest.filtsForPlugin(
+                pluginName, self._pluginPackageVersion(pluginName)
+            )
+            if filts is None:
+                logger.info(
+                    "Plugin %s has no endpoint manifest,"
+                    " it will be loaded now to record one",
+                    pluginName,
+                )
+                continue
+
+            lazyFiltsByPluginName[pluginName] = filts
+
+        return lazyFiltsByPluginName
+
+    def _pluginPackageVersion(self, pluginName: str) -> Optional[str]:
+        # Read the version without importing the plugin package
+        modSpec = find_spec(pluginName)
+        if not modSpec or not modSpec.origin:
+            return None
+
+        return self.metadataCache.metadata(
+            pluginName, os.path.dirname(modSpec.origin)
+        )["version"]
+
+    def _updateEndpointManifest(self) -> None:
+        """Update Endpoint Manifest
+
+        Record the endpoints of the lazy plugins that were loaded eagerly,
+        so they can be loaded lazily next time.
+
+        """
+        pluginNames = [
+            n
+            for n in PeekPlatformConfig.config.pluginsLazy
+            if n in self._loadedPlugins and n in self._pluginVersionByName
+        ]
+        if not pluginNames:
+            return
+
+        manifest = PluginEndpointManifest(
+            PeekPlatformConfig.config.pluginEndpointManifestPath
+        )
+
+        endpointFilts = [e.filt for e in PayloadIO().endpoints]
+        for pluginName in pluginNames:
+            manifest.update(
+                pluginName,
+                self._pluginVersionByName[pluginName],
+                [f for f in endpointFilts if f.get("plugin") == pluginName],
+            )
+
+        try:
+            manifest.save()
+
+        except Exception as e:
+            logger.error("Failed to save the plugin endpoint manifest")
+            logger.exception(e)
+
+    @inlineCallbacks
+    def _activateLazyPlugin(self, pluginName: str):
+        yield self.loadPlugin(pluginName)
+
+        # The activator keeps its placeholders and tries again
+        if pluginName not in self._loadedPlugins:
+            raise Exception("Lazy plugin %s failed to load" % pluginName)
+
+        self._lazyActivatorsByPluginName.pop(pluginName, None)
+        yield self._tryStart(pluginName)
+
     @inlineCallbacks
     def _tryStart(self, pluginName):
         plugin = self._loadedPlugins[pluginName]
         try:
-            d = plugin.start()
-            if d:
-                d.addErrback(vortexLogFailure, logger)
-                yield d
+            # Record the endpoints the plugin creates when it starts
+            self._registrationRecorder.start(pluginName)
+            try:
+                with self.startupReport.phase(pluginName, "start"):
+                    d = plugin.start()
+                    if d:
+                        d.addErrback(vortexLogFailure, logger)
+                        yield d
+
+            finally:
+                endpoints, tupleNames = self._registrationRecorder.stop(
+                    pluginName
+                )
+
+            self._addPluginRegistrations(pluginName, endpoints, tupleNames)
+            self._trackPluginEndpoints(pluginName)
 
         except Exception as e:
             logger.error(
@@ -447,6 +943,12 @@ class PluginLoaderABC(metaclass=ABCMeta):
     @inlineCallbacks
     def _tryStop(self, pluginName):
         plugin = self._loadedPlugins[pluginName]
+
+        # Let the payloads the plugin is processing finish first
+        yield self._inFlightTracker.drain(
+            pluginName, PeekPlatformConfig.config.pluginDrainTimeoutSeconds
+        )
+
         try:
             d = plugin.stop()
             if d:
@@ -487,26 +989,30 @@ class PluginLoaderABC(metaclass=ABCMeta):
             if modName.startswith("%s." % pluginName)
         ]
 
+        self._leakDetector.watch(
+            pluginName,
+            [oldLoadedPlugin]
+            + [
+                sys.modules[modName]
+                for modName in loadedSubmodules + [pluginName]
+                if modName in sys.modules
+            ],
+        )
+
         for modName in loadedSubmodules:
             del sys.modules[modName]
 
         if pluginName in sys.modules:
             del sys.modules[pluginName]
 
-        gc.collect()
+        del oldLoadedPlugin
 
-        # pypy doesn't have getrefcount
-        # ("oldLoadedPlugin" in this method and the call to getrefcount) == 2 references
-        if hasattr(sys, "getrefcount") and sys.getrefcount(oldLoadedPlugin) > 2:
-            logger.warning(
-                "Old references to %s still exist, count = %s",
-                pluginName,
-                sys.getrefcount(oldLoadedPlugin),
-            )
+        # Now there should be no references, check once this frame has gone
+        reactor.callLater(0, self._checkForLeaks, pluginName)
 
-        del oldLoadedPlugin
-        gc.collect()
-        # Now there should be no references.
+    def _checkForLeaks(self, pluginName: str) -> None:
+        d = self._leakDetector.check(pluginName)
+        d.addErrback(vortexLogFailure, logger, consumeError=True)
 
     def sanityCheckServerPlugin(self, pluginName):
         """Sanity Check Plugin
@@ -539,4 +1045,4 @@ class PluginLoaderABC(metaclass=ABCMeta):
             pluginName,
             pluginVersion,
         )
-        return self.loadPlugin(pluginName)
+        return self.reloadPlugin(pluginName)
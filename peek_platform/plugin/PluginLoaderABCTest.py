@@ -0,0 +1,148 @@
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import succeed
+from twisted.trial import unittest
+from vortex.PayloadEndpoint import PayloadEndpoint
+from vortex.PayloadIO import PayloadIO
+
+from peek_platform import PeekPlatformConfig
+from peek_platform.plugin.PluginLazyActivator import PluginLazyActivator
+from peek_platform.plugin.PluginLoaderABC import PluginLoaderABC
+
+
+FILT = dict(plugin="pluginA", key="a")
+
+
+class _FakeConfig:
+    pluginsEnabled = ["pluginA"]
+    pluginStartupProfileDir = None
+
+
+class _FakePlugin:
+    def __init__(self):
+        self.endpoint = None
+
+    def start(self):
+        self.endpoint = PayloadEndpoint(FILT, lambda **kwargs: None)
+
+
+class _TestPluginLoader(PluginLoaderABC):
+    _entryHookFuncName = None
+    _entryHookClassType = None
+    _platformServiceNames = []
+
+    def _loadPluginThrows(self, *args, **kwargs):
+        raise NotImplementedError()
+
+
+class PluginLoaderABCTest(unittest.TestCase):
+    def setUp(self):
+        self.patch(PeekPlatformConfig, "config", _FakeConfig())
+
+        self._loader = _TestPluginLoader()
+        self.addCleanup(setattr, _TestPluginLoader, "_instance", None)
+
+        self._calls = []
+        self._loadDeferred = None
+        self._lazyFilts = {}
+
+        for methodName in ("_tryStop", "_tryStart", "unloadPlugin"):
+            self.patch(self._loader, methodName, self._recorder(methodName))
+
+        self.patch(
+            self._loader,
+            "_refusePayloadsForPlugin",
+            lambda pluginName: self._calls.append("_refusePayloadsForPlugin"),
+        )
+        self.patch(self._loader, "loadPlugin", self._loadPlugin)
+        self.patch(self._loader, "_updateEndpointManifest", lambda: None)
+        self.patch(
+            self._loader,
+            "_lazyFiltsByPluginName",
+            lambda pluginNames: self._lazyFilts,
+        )
+
+    def _recorder(self, methodName):
+        def call(pluginName):
+            self._calls.append(methodName)
+            if methodName == "unloadPlugin":
+                del self._loader._loadedPlugins[pluginName]
+            return succeed(None)
+
+        return call
+
+    def _loadPlugin(self, pluginName):
+        self._calls.append("loadPlugin")
+        self._loader._loadedPlugins[pluginName] = object()
+        return self._loadDeferred or succeed(None)
+
+    def _placeholderCount(self):
+        return len([e for e in PayloadIO().endpoints if e.filt == FILT])
+
+    def testReloadLazyPlugin(self):
+        self._lazyFilts = {"pluginA": [FILT]}
+        activator = PluginLazyActivator(
+            "pluginA", [FILT], self._loader._activateLazyPlugin
+        )
+        self._loader._lazyActivatorsByPluginName["pluginA"] = activator
+
+        self.successResultOf(self._loader.reloadPlugin("pluginA"))
+
+        # The plugin isn't loaded, its placeholders are replaced
+        newActivator = self._loader._lazyActivatorsByPluginName["pluginA"]
+        self.addCleanup(newActivator.shutdown)
+        self.assertIsNot(newActivator, activator)
+        self.assertEqual(self._placeholderCount(), 1)
+        self.assertEqual(self._calls, [])
+
+    def testReloadRunningPlugin(self):
+        self._loader._loadedPlugins["pluginA"] = object()
+
+        self.successResultOf(self._loader.reloadPlugin("pluginA"))
+
+        self.assertEqual(
+            self._calls,
+            [
+                "_refusePayloadsForPlugin",
+                "_tryStop",
+                "unloadPlugin",
+                "loadPlugin",
+                "_tryStart",
+            ],
+        )
+
+    def testReloadWhileReloading(self):
+        self._loader._loadedPlugins["pluginA"] = object()
+        self._loadDeferred = Deferred()
+
+        firstReload = self._loader.reloadPlugin("pluginA")
+        self.assertNoResult(firstReload)
+
+        # The second reload returns without touching the plugin
+        self.successResultOf(self._loader.reloadPlugin("pluginA"))
+        self.assertEqual(self._calls.count("loadPlugin"), 1)
+
+        self._loadDeferred.callback(None)
+        self.successResultOf(firstReload)
+        self.assertEqual(self._calls[-1], "_tryStart")
+
+        # Once the reload has finished, the plugin can be reloaded again
+        self._loadDeferred = None
+        self.successResultOf(self._loader.reloadPlugin("pluginA"))
+        self.assertEqual(self._calls.count("loadPlugin"), 2)
+
+    def testEndpointsCreatedByStartAreTracked(self):
+        plugin = _FakePlugin()
+        self._loader._loadedPlugins["pluginA"] = plugin
+
+        self.successResultOf(PluginLoaderABC._tryStart(self._loader, "pluginA"))
+        self.addCleanup(PayloadIO().remove, plugin.endpoint)
+
+        self.assertEqual(
+            self._loader._vortexEndpointInstancesByPluginName["pluginA"],
+            [plugin.endpoint],
+        )
+        self.assertEqual(self._loader.inFlightStats["pluginA"]["endpoints"], 1)
+
+        # Refusing removes the endpoints recorded when the plugin started
+        PluginLoaderABC._refusePayloadsForPlugin(self._loader, "pluginA")
+        self.assertNotIn(plugin.endpoint, PayloadIO().endpoints)
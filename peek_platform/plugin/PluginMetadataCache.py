@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+from typing import List
+from typing import Optional
+
+from jsoncfg.value_mappers import require_array
+from jsoncfg.value_mappers import require_string
+
+from peek_plugin_base.PluginPackageFileConfig import PluginPackageFileConfig
+
+
+logger = logging.getLogger(__name__)
+
+
+class PluginMetadataCache:
+    """Plugin Metadata Cache
+
+    This class caches what the plugin loader needs to know about each plugin
+    package before importing it, so plugins that don't run on this service
+    are skipped without being imported.
+
+    The metadata of each plugin is a dict of :
+        * version, from plugin_package.json
+        * requiresServices, from plugin_package.json
+        * subprocessGroup, for this service, from plugin_package.json
+        * entryHookFuncNames, the entry hooks the package provides, None until
+          the package has been imported once.
+
+    An entry is rebuilt when the package path, or the modified time of
+    plugin_package.json or the packages __init__.py changes.
+
+    """
+
+    def __init__(self, filePath: str, serviceName: str):
+        self._filePath = filePath
+        self._serviceName = serviceName
+        self._entriesByPluginName = {}
+        self._dirty = False
+
+        if os.path.isfile(filePath):
+            try:
+                with open(filePath) as f:
+                    self._entriesByPluginName = json.load(f)
+
+            except Exception as e:
+                logger.error(
+                    "Failed to read the plugin metadata cache %s, it will"
+                    " be recreated",
+                    filePath,
+                )
+                logger.exception(e)
+
+    def metadata(self, pluginName: str, pluginRootDir: str) -> dict:
+        """Metadata
+
+        :return: The cached metadata for the plugin, read from the package if
+            the cache is out of date.
+
+        """
+        key = self._key(pluginRootDir)
+
+        entry = self._entriesByPluginName.get(pluginName)
+        if entry and entry["key"] == key:
+            return entry["metadata"]
+
+        pluginPackageJson = PluginPackageFileConfig(pluginRootDir)
+        configForService = pluginPackageJson.configForService(self._serviceName)
+
+        metadata = dict(
+            version=pluginPackageJson.config.plugin.version(require_string),
+            requiresServices=pluginPackageJson.config.requiresServices(
+                require_array
+            ),
+            subprocessGroup=configForService.subprocessGroup(None),
+            entryHookFuncNames=None,
+        )
+
+        self._entriesByPluginName[pluginName] = dict(key=key, metadata=metadata)
+        self._dirty = True
+        return metadata
+
+    def setEntryHookFuncNames(
+        self, pluginName: str, entryHookFuncNames: List[str]
+    ) -> None:
+        metadata = self._entriesByPluginName[pluginName]["metadata"]
+        if metadata["entryHookFuncNames"] != entryHookFuncNames:
+            metadata["entryHookFuncNames"] = entryHookFuncNames
+            self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+
+        tmpFilePath = self._filePath + ".tmp"
+        with open(tmpFilePath, "w") as f:
+            json.dump(self._entriesByPluginName, f, indent=4, sort_keys=True)
+
+        os.replace(tmpFilePath, self._filePath)
+        self._dirty = False
+
+    def _key(self, pluginRootDir: str) -> list:
+        def mtime(fileName: str) -> Optional[int]:
+            try:
+                return os.stat(
+                    os.path.join(pluginRootDir, fileName)
+                ).st_mtime_ns
+
+            except FileNotFoundError:
+                return None
+
+        return [
+            os.path.realpath(pluginRootDir),
+            mtime("plugin_package.json"),
+            mtime("__init__.py"),
+        ]
@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from peek_plugin_base.PeekVortexUtil import peekWorkerName
+
+from peek_platform.plugin.PluginMetadataCache import PluginMetadataCache
+
+
+class PluginMetadataCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._cacheFilePath = os.path.join(self._dir, "cache.json")
+        self._pluginRootDir = os.path.join(self._dir, "pluginA")
+        os.mkdir(self._pluginRootDir)
+        self._writePluginPackageJson("1.0.0")
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _writePluginPackageJson(self, version):
+        with open(
+            os.path.join(self._pluginRootDir, "plugin_package.json"), "w"
+        ) as f:
+            json.dump(
+                dict(
+                    plugin=dict(version=version),
+                    requiresServices=["logic", "worker"],
+                    worker=dict(subprocessGroup="group"),
+                ),
+                f,
+            )
+
+    def testMetadataIsCachedUntilThePackageChanges(self):
+        cache = PluginMetadataCache(self._cacheFilePath, peekWorkerName)
+        metadata = cache.metadata("pluginA", self._pluginRootDir)
+        self.assertEqual(metadata["version"], "1.0.0")
+        self.assertEqual(metadata["requiresServices"], ["logic", "worker"])
+        self.assertEqual(metadata["subprocessGroup"], "group")
+        self.assertIsNone(metadata["entryHookFuncNames"])
+
+        cache.setEntryHookFuncNames("pluginA", ["peekWorkerEntryHook"])
+        cache.save()
+
+        cache = PluginMetadataCache(self._cacheFilePath, peekWorkerName)
+        metadata = cache.metadata("pluginA", self._pluginRootDir)
+        self.assertEqual(
+            metadata["entryHookFuncNames"], ["peekWorkerEntryHook"]
+        )
+
+        self._writePluginPackageJson("1.0.1")
+        os.utime(
+            os.path.join(self._pluginRootDir, "plugin_package.json"),
+            ns=(0, 0),
+        )
+
+        metadata = cache.metadata("pluginA", self._pluginRootDir)
+        self.assertEqual(metadata["version"], "1.0.1")
+        self.assertIsNone(metadata["entryHookFuncNames"])
@@ -0,0 +1,113 @@
+import logging
+from typing import Callable
+from typing import List
+from typing import Tuple
+
+import vortex.Tuple
+from vortex.PayloadEndpoint import PayloadEndpoint
+from vortex.PayloadIO import PayloadIO
+
+
+logger = logging.getLogger(__name__)
+
+
+class _RegistrationScope:
+    def __init__(self):
+        # Each item is (registration, sharedWithAnotherScope)
+        self.endpoints = []
+        self.tupleNames = []
+
+
+class PluginRegistrationRecorder:
+    """Plugin Registration Recorder
+
+    This class records the payload endpoints and tuples that are registered
+    while a plugin loads, so the loader doesn't have to diff every registered
+    endpoint and tuple before and after each plugin loads.
+
+    `PayloadIO.add` and `vortex.Tuple.addTupleType` are wrapped once, plugins
+    that import addTupleType after this get the wrapped version.
+
+    Plugins can load concurrently, registrations made while more than one
+    plugin is loading are marked as shared, the loader decides which plugin
+    they belong to.
+
+    Endpoint listeners are called as each endpoint is added, before any
+    payload can be dispatched to it.
+
+    """
+
+    _installed = False
+    _activeScopesByPluginName = {}
+    _endpointListeners = []
+
+    def __init__(self):
+        self._install()
+
+    @classmethod
+    def _install(cls):
+        if cls._installed:
+            return
+        cls._installed = True
+
+        originalAdd = PayloadIO.add
+
+        def add(payloadIO, endpoint: PayloadEndpoint):
+            originalAdd(payloadIO, endpoint)
+            cls._record("endpoints", endpoint)
+
+            for listener in list(cls._endpointListeners):
+                listener(endpoint)
+
+        PayloadIO.add = add
+
+        originalAddTupleType = vortex.Tuple.addTupleType
+
+        def addTupleType(tupleCls):
+            result = originalAddTupleType(tupleCls)
+            cls._record("tupleNames", tupleCls.tupleName())
+            return result
+
+        vortex.Tuple.addTupleType = addTupleType
+
+    @classmethod
+    def _record(cls, attrName: str, registration) -> None:
+        scopes = cls._activeScopesByPluginName
+        if not scopes:
+            return
+
+        shared = len(scopes) > 1
+        for scope in scopes.values():
+            getattr(scope, attrName).append((registration, shared))
+
+    @classmethod
+    def addEndpointListener(
+        cls, listener: Callable[[PayloadEndpoint], None]
+    ) -> None:
+        cls._install()
+        cls._endpointListeners.append(listener)
+
+    @classmethod
+    def removeEndpointListener(
+        cls, listener: Callable[[PayloadEndpoint], None]
+    ) -> None:
+        if listener in cls._endpointListeners:
+            cls._endpointListeners.remove(listener)
+
+    def start(self, pluginName: str) -> None:
+        self._activeScopesByPluginName[pluginName] = _RegistrationScope()
+
+    def stop(
+        self, pluginName: str
+    ) -> Tuple[List[Tuple[PayloadEndpoint, bool]], List[Tuple[str, bool]]]:
+        """Stop
+
+        :return: The endpoints and tuple names registered since start, each
+            with a flag that is True if another plugin was also loading.
+
+        """
+        scope = self._activeScopesByPluginName.pop(pluginName, None)
+        if not scope:
+            return [], []
+
+        return scope.endpoints, scope.tupleNames
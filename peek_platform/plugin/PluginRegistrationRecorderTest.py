@@ -0,0 +1,59 @@
+import unittest
+
+import vortex.Tuple
+from vortex.PayloadIO import PayloadIO
+from vortex.Tuple import Tuple
+from vortex.Tuple import removeTuplesForTupleNames
+
+from peek_platform.plugin.PluginRegistrationRecorder import (
+    PluginRegistrationRecorder,
+)
+
+
+class _FakeEndpoint:
+    pass
+
+
+class PluginRegistrationRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self._recorder = PluginRegistrationRecorder()
+        self._endpoints = []
+
+    def tearDown(self):
+        for endpoint in self._endpoints:
+            PayloadIO().remove(endpoint)
+        removeTuplesForTupleNames(["pluginA.RecordedTuple"])
+
+    def _addEndpoint(self):
+        endpoint = _FakeEndpoint()
+        self._endpoints.append(endpoint)
+        PayloadIO().add(endpoint)
+        return endpoint
+
+    def testRegistrationsAreRecordedWhileLoading(self):
+        self._addEndpoint()
+
+        self._recorder.start("pluginA")
+        endpoint = self._addEndpoint()
+
+        @vortex.Tuple.addTupleType
+        class RecordedTuple(Tuple):
+            __tupleType__ = "pluginA.RecordedTuple"
+
+        endpoints, tupleNames = self._recorder.stop("pluginA")
+        self._addEndpoint()
+
+        self.assertEqual(endpoints, [(endpoint, False)])
+        self.assertEqual(tupleNames, [("pluginA.RecordedTuple", False)])
+
+    def testConcurrentRegistrationsAreShared(self):
+        self._recorder.start("pluginA")
+        self._recorder.start("pluginB")
+        endpoint = self._addEndpoint()
+
+        self.assertEqual(
+            self._recorder.stop("pluginA")[0], [(endpoint, True)]
+        )
+        self.assertEqual(
+            self._recorder.stop("pluginB")[0], [(endpoint, True)]
+        )
@@ -0,0 +1,195 @@
+import cProfile
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class PluginStartupReport:
+    """Plugin Startup Report
+
+    This class records how long each phase of loading and starting each plugin
+    takes, and how many vortex registrations each plugin makes.
+
+    Optionally, each phase is profiled with cProfile, the profiles are written
+    to profileDir as "<pluginName>.<phaseName>.prof", view them with
+    `python -m pstats` or snakeviz.
+
+    When plugins load concurrently, a phase that waits includes the work of
+    the other plugins that ran meanwhile.
+
+    """
+
+    # The columns of the summary table, in order
+    SUMMARY_PHASES = ("import", "entryHook", "load", "webResources", "start")
+
+    def __init__(self, serviceName: str, profileDir: Optional[str] = None):
+        """Constructor
+
+        :param serviceName: The name of the service, for the report.
+        :param profileDir: The directory to write the profiles to, or None to
+            not profile.
+
+        """
+        self._serviceName = serviceName
+        self._profileDir = profileDir
+
+        self._secondsByPhaseByPluginName: Dict[str, Dict[str, float]] = (
+            defaultdict(dict)
+        )
+        self._countsByPluginName: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._stepSecondsByDescription: Dict[str, float] = {}
+
+        # Only one profiler can run at a time, phases that overlap with a
+        # profiled phase are timed but not profiled.
+        self._activeProfile = None
+
+    @contextmanager
+    def phase(self, pluginName: str, phaseName: str):
+        """Phase
+
+        Time, and optionally profile, the code within this context.
+
+        """
+        profile = None
+        if self._profileDir and not self._activeProfile:
+            profile = self._activeProfile = cProfile.Profile()
+            profile.enable()
+
+        startTime = time.monotonic()
+        try:
+            yield
+
+        finally:
+            seconds = time.monotonic() - startTime
+            phases = self._secondsByPhaseByPluginName[pluginName]
+            phases[phaseName] = phases.get(phaseName, 0.0) + seconds
+
+            if profile:
+                profile.disable()
+                self._activeProfile = None
+                self._writeProfile(profile, pluginName, phaseName)
+
+    @contextmanager
+    def importPhase(self, pluginName: str):
+        """Import Phase
+
+        Time the import of the plugin package, and count the modules it
+        imports.
+
+        """
+        modulesBefore = len(sys.modules)
+        with self.phase(pluginName, "import"):
+            yield
+
+        self.setCount(
+            pluginName, "importedModules", len(sys.modules) - modulesBefore
+        )
+
+    def setCount(self, pluginName: str, countName: str, value: int) -> None:
+        self._countsByPluginName[pluginName][countName] = value
+
+    def setStepSeconds(self, description: str, seconds: float) -> None:
+        self._stepSecondsByDescription[description] = seconds
+
+    def toJsonDict(self) -> dict:
+        plugins = {}
+        for pluginName in self._pluginNamesSlowestFirst():
+            phases = self._secondsByPhaseByPluginName.get(pluginName, {})
+            plugins[pluginName] = dict(
+                totalSeconds=round(sum(phases.values()), 4),
+                phaseSeconds={k: round(v, 4) for k, v in phases.items()},
+                counts=dict(self._countsByPluginName.get(pluginName, {})),
+            )
+
+        return dict(
+            serviceName=self._serviceName,
+            generated=datetime.now().isoformat(),
+            stepSeconds={
+                k: round(v, 4)
+                for k, v in self._stepSecondsByDescription.items()
+            },
+            plugins=plugins,
+        )
+
+    def writeJson(self, filePath: str) -> None:
+        tmpFilePath = filePath + ".tmp"
+        with open(tmpFilePath, "w") as f:
+            json.dump(self.toJsonDict(), f, indent=4)
+
+        os.replace(tmpFilePath, filePath)
+        logger.info("Plugin startup report written to %s", filePath)
+
+    def logSummary(self) -> None:
+        pluginNames = self._pluginNamesSlowestFirst()
+        if not pluginNames:
+            return
+
+        nameWidth = max(len(n) for n in pluginNames)
+        columns = self.SUMMARY_PHASES + ("total",)
+
+        logger.info(
+            "Plugin startup times (seconds):\n%s",
+            "\n".join(
+                [
+                    "%s %s %9s %9s"
+                    % (
+                        "plugin".ljust(nameWidth),
+                        " ".join("%12s" % c for c in columns),
+                        "endpoints",
+                        "tuples",
+                    )
+                ]
+                + [self._summaryRow(n, nameWidth) for n in pluginNames]
+            ),
+        )
+
+    def _summaryRow(self, pluginName: str, nameWidth: int) -> str:
+        phases = self._secondsByPhaseByPluginName.get(pluginName, {})
+        counts = self._countsByPluginName.get(pluginName, {})
+
+        values = [phases.get(p) for p in self.SUMMARY_PHASES]
+        values.append(sum(phases.values()))
+
+        return "%s %s %9s %9s" % (
+            pluginName.ljust(nameWidth),
+            " ".join(
+                "%12s" % ("-" if v is None else "%.3f" % v) for v in values
+            ),
+            counts.get("endpoints", "-"),
+            counts.get("tuples", "-"),
+        )
+
+    def _pluginNamesSlowestFirst(self):
+        return sorted(
+            set(self._secondsByPhaseByPluginName)
+            | set(self._countsByPluginName),
+            key=lambda n: sum(
+                self._secondsByPhaseByPluginName.get(n, {}).values()
+            ),
+            reverse=True,
+        )
+
+    def _writeProfile(self, profile, pluginName: str, phaseName: str):
+        try:
+            os.makedirs(self._profileDir, exist_ok=True)
+            profile.dump_stats(
+                os.path.join(
+                    self._profileDir, "%s.%s.prof" % (pluginName, phaseName)
+                )
+            )
+
+        except Exception as e:
+            logger.error(
+                "Failed to write the %s profile for %s", phaseName, pluginName
+            )
+            logger.exception(e)
@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import tempfile
+
+from twisted.trial import unittest
+
+from peek_platform.plugin import PluginStartupReport as report_module
+from peek_platform.plugin.PluginStartupReport import PluginStartupReport
+
+
+class _FakeTime:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class PluginStartupReportTest(unittest.TestCase):
+    def setUp(self):
+        self._time = _FakeTime()
+        self.patch(report_module, "time", self._time)
+
+        self._dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._dir)
+
+        self._report = PluginStartupReport("peek-test-service")
+
+    def _runPhase(self, pluginName, phaseName, seconds):
+        with self._report.phase(pluginName, phaseName):
+            self._time.now += seconds
+
+    def testPhaseSecondsAccumulate(self):
+        self._runPhase("pluginA", "load", 1.0)
+        self._runPhase("pluginA", "load", 0.5)
+        self._runPhase("pluginA", "start", 2.0)
+
+        # A phase that raises is still timed
+        with self.assertRaises(ValueError):
+            with self._report.phase("pluginB", "load"):
+                self._time.now += 0.25
+                raise ValueError("load failed")
+
+        plugins = self._report.toJsonDict()["plugins"]
+        self.assertEqual(list(plugins), ["pluginA", "pluginB"])
+        self.assertEqual(
+            plugins["pluginA"]["phaseSeconds"], dict(load=1.5, start=2.0)
+        )
+        self.assertEqual(plugins["pluginA"]["totalSeconds"], 3.5)
+        self.assertEqual(plugins["pluginB"]["phaseSeconds"], dict(load=0.25))
+
+    def testWriteJsonReplacesTheReport(self):
+        filePath = os.path.join(self._dir, "report.json")
+        with open(filePath, "w") as f:
+            f.write("old report")
+
+        self._runPhase("pluginA", "load", 1.0)
+        self._report.setCount("pluginA", "endpoints", 3)
+        self._report.setStepSeconds("Loading plugins", 1.0)
+        self._report.writeJson(filePath)
+
+        with open(filePath) as f:
+            report = json.load(f)
+
+        self.assertEqual(report["serviceName"], "peek-test-service")
+        self.assertEqual(report["stepSeconds"], {"Loading plugins": 1.0})
+        self.assertEqual(
+            report["plugins"]["pluginA"]["counts"], dict(endpoints=3)
+        )
+        self.assertEqual(os.listdir(self._dir), ["report.json"])
+
+    def testWriteJsonFailureKeepsTheOldReport(self):
+        filePath = os.path.join(self._dir, "report.json")
+        with open(filePath, "w") as f:
+            f.write("old report")
+
+        def fail():
+            raise ValueError("Not serialisable")
+
+        self.patch(self._report, "toJsonDict", fail)
+        self.assertRaises(ValueError, self._report.writeJson, filePath)
+
+        with open(filePath) as f:
+            self.assertEqual(f.read(), "old report")
+
+    def testLogSummary(self):
+        self._runPhase("pluginA", "load", 1.0)
+        self._runPhase("pluginLonger", "import", 0.5)
+        self._runPhase("pluginLonger", "start", 2.0)
+        self._report.setCount("pluginLonger", "endpoints", 4)
+
+        with self.assertLogs(report_module.logger, "INFO") as logs:
+            self._report.logSummary()
+
+        header, slowest, fastest = logs.records[0].getMessage().splitlines()[1:]
+        self.assertEqual(
+            header.split(),
+            ["plugin"]
+            + list(PluginStartupReport.SUMMARY_PHASES)
+            + ["total", "endpoints", "tuples"],
+        )
+        self.assertEqual(
+            slowest.split(),
+            [
+                "pluginLonger",
+                "0.500",
+                "-",
+                "-",
+                "-",
+                "2.000",
+                "2.500",
+                "4",
+                "-",
+            ],
+        )
+        self.assertEqual(
+            fastest.split(),
+            ["pluginA", "-", "-", "1.000", "-", "-", "1.000", "-", "-"],
+        )
+
+        # The columns line up
+        self.assertEqual(len(set(map(len, (header, slowest, fastest)))), 1)
+
+    def testLogSummaryWithoutPlugins(self):
+        with self.assertNoLogs(report_module.logger, "INFO"):
+            self._report.logSummary()
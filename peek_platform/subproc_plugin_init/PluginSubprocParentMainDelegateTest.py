@@ -0,0 +1,91 @@
+from twisted.internet.defer import succeed
+from twisted.trial import unittest
+from vortex.PayloadEnvelope import PayloadEnvelope
+from vortex.PayloadIO import PayloadIO
+
+from peek_platform import PeekPlatformConfig
+from peek_platform.plugin.PluginRegistrationRecorder import (
+    PluginRegistrationRecorder,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc_parent_main_delegate import (
+    PluginSubprocParentMainDelegate,
+)
+
+
+class _FakeSubprocessGroupMain:
+    def __init__(self):
+        self.commands = []
+        self.payloads = []
+
+    def sendPayloadEnvelopeToChild(self, payloadEnvelope, *args, **kwargs):
+        self.payloads.append(payloadEnvelope)
+        return succeed(None)
+
+    def __getattr__(self, methodName):
+        def send(pluginName):
+            self.commands.append(methodName)
+            return succeed(None)
+
+        return send
+
+
+class PluginSubprocParentMainDelegateTest(unittest.TestCase):
+    def setUp(self):
+        self.patch(PeekPlatformConfig, "componentName", "peek-test-service")
+
+        self._groupMain = _FakeSubprocessGroupMain()
+        self._delegate = PluginSubprocParentMainDelegate(
+            "pluginA", "/tmp", None, self._groupMain
+        )
+
+    def _pluginEndpoints(self):
+        return [
+            e
+            for e in PayloadIO().endpoints
+            if getattr(e, "filt", {}).get("plugin") == "pluginA"
+        ]
+
+    def testEndpointIsRecordedWhileLoading(self):
+        recorder = PluginRegistrationRecorder()
+        recorder.start("pluginA")
+        self.successResultOf(self._delegate.load())
+        endpoints, _ = recorder.stop("pluginA")
+
+        self.assertEqual(
+            [e for e, shared in endpoints], self._pluginEndpoints()
+        )
+
+        self.successResultOf(self._delegate.unload())
+        self.assertEqual(self._pluginEndpoints(), [])
+
+    def testPayloadsAreSentOnlyWhileStarted(self):
+        self.successResultOf(self._delegate.load())
+        self.addCleanup(self._delegate.unload)
+        endpoint = self._pluginEndpoints()[0]
+
+        payloadEnvelope = PayloadEnvelope(filt=dict(plugin="pluginA"))
+
+        # Before it's started, the payload is responded to with an error
+        responses = []
+        self.assertIsNone(
+            self._delegate._sendPayloadEnvelopeToChild(
+                payloadEnvelope, "uuid", "name", sendResponse=responses.append
+            )
+        )
+        response = PayloadEnvelope().fromVortexMsg(responses[0])
+        self.assertEqual(response.filt, payloadEnvelope.filt)
+        self.assertIn("not started", response.result)
+
+        self.successResultOf(self._delegate.start())
+        self._delegate._sendPayloadEnvelopeToChild(
+            payloadEnvelope, "uuid", "name"
+        )
+        self.assertEqual(self._groupMain.payloads, [payloadEnvelope])
+
+        # Stopping keeps the endpoint, so the loader can keep refusing
+        self.successResultOf(self._delegate.stop())
+        self.assertIn(endpoint, PayloadIO().endpoints)
+        self.assertEqual(
+            self._groupMain.commands,
+            ["sendPluginLoad", "sendPluginStart", "sendPluginStop"],
+        )
@@ -0,0 +1,300 @@
+import os
+from itertools import count
+
+from twisted.internet import task
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import succeed
+from twisted.internet.error import ProcessTerminated
+from twisted.python.failure import Failure
+from twisted.trial import unittest
+from vortex.PayloadEnvelope import PayloadEnvelope
+
+from peek_platform.subproc_plugin_init import plugin_subproc_parent_worker
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    PLUGIN_STATE_FROM_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    PLUGIN_STATE_TO_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_platform_config_tuple import (
+    PluginSubprocPlatformConfigTuple,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc_parent_worker import (
+    PluginSubprocParentWorker,
+)
+
+
+class _FakeProcessTransport:
+    def __init__(self, protocol):
+        self.protocol = protocol
+        self.commands = []
+        self.vortexMsgs = []
+
+    def registerProducer(self, producer, streaming):
+        pass
+
+    def writeToChild(self, childFD, data):
+        if childFD == PLUGIN_STATE_TO_CHILD_FD:
+            self.commands.append(data.decode().strip())
+
+    def writeSequence(self, data):
+        self.vortexMsgs.append(data[-1])
+
+    def reply(self, result="SUCCESS"):
+        """Reply to every command sent so far"""
+        commands, self.commands = self.commands, []
+        for command in commands:
+            commandId, pluginName, _ = command.split(":")
+            self.protocol.childDataReceived(
+                PLUGIN_STATE_FROM_CHILD_FD,
+                f"{commandId}:{pluginName}:{result}\n".encode(),
+            )
+
+    def ready(self):
+        self.protocol.childDataReceived(
+            PLUGIN_STATE_FROM_CHILD_FD, b"0::READY\n"
+        )
+
+    def signalProcess(self, signal):
+        self.die()
+
+    def die(self):
+        self.protocol.processEnded(Failure(ProcessTerminated(signal=9)))
+
+
+class _FakeReactor(task.Clock):
+    def __init__(self):
+        task.Clock.__init__(self)
+        self.transports = []
+        self.triggers = {}
+        self._triggerIds = count(1)
+
+    def addSystemEventTrigger(self, phase, eventType, callable_):
+        triggerId = next(self._triggerIds)
+        self.triggers[triggerId] = callable_
+        return triggerId
+
+    def removeSystemEventTrigger(self, triggerId):
+        del self.triggers[triggerId]
+
+    def spawnProcess(self, protocol, *args, **kwargs):
+        protocol._vortexUpdateLoopingCall.clock = self
+        transport = _FakeProcessTransport(protocol)
+        self.transports.append(transport)
+        protocol.makeConnection(transport)
+        return transport
+
+
+class PluginSubprocParentWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self._reactor = _FakeReactor()
+        self.patch(plugin_subproc_parent_worker, "reactor", self._reactor)
+
+        self._sent = []
+        self._worker = self._createWorker()
+
+    def _createWorker(self, warmSpare=False):
+        worker = PluginSubprocParentWorker(
+            PluginSubprocPlatformConfigTuple(
+                serviceName="peek-test-service",
+                subprocessGroup="test",
+                workerIndex=0,
+                sharedMemoryThreshold=0,
+            ),
+            warmSpare=warmSpare,
+        )
+        self.patch(
+            worker,
+            "_sendPayloadEnvelopeToChild",
+            lambda *args: self._sent.append(args),
+        )
+        self.addCleanup(worker.shutdown)
+        return worker
+
+    def _lastTransport(self):
+        return self._reactor.transports[-1]
+
+    def testRespawnReplaysPluginsAndBufferedPayloads(self):
+        self._worker.sendPluginLoad("pluginA")
+        self._worker.sendPluginStart("pluginA")
+        self._lastTransport().reply()
+
+        self._lastTransport().die()
+        self.assertFalse(self._worker.isRunning)
+
+        # Payloads are buffered while the subprocess is down
+        self._worker.sendPayloadEnvelopeToChild("envelope", "uuid", "name")
+        self.assertEqual(self._sent, [])
+
+        self._reactor.advance(PluginSubprocParentWorker.RESPAWN_BACKOFF_INITIAL)
+        self.assertEqual(len(self._reactor.transports), 2)
+
+        # The load is replayed, then the start
+        self.assertEqual(self._lastTransport().commands, ["1:pluginA:LOAD"])
+        self._lastTransport().reply()
+        self.assertEqual(self._lastTransport().commands, ["2:pluginA:START"])
+        self._lastTransport().reply()
+
+        self.assertTrue(self._worker.isRunning)
+        self.assertEqual(self._sent, [("envelope", "uuid", "name")])
+        self.assertEqual(self._worker.stats["restartCount"], 1)
+
+    def testInFlightCommandsFailAndBackoffDoubles(self):
+        d = self._worker.sendPluginLoad("pluginA")
+        self._lastTransport().die()
+        self.failureResultOf(d)
+
+        backoff = PluginSubprocParentWorker.RESPAWN_BACKOFF_INITIAL
+        for failures in range(3):
+            self._reactor.advance(backoff - 0.01)
+            self.assertEqual(len(self._reactor.transports), failures + 1)
+            self._reactor.advance(0.01)
+            self.assertEqual(len(self._reactor.transports), failures + 2)
+
+            self._lastTransport().die()
+            backoff *= 2
+
+        self.assertGreater(self._worker.stats["downtimeSeconds"], 0)
+
+    def testGivesUpAfterFailedRespawns(self):
+        self._worker.sendPluginLoad("pluginA")
+        self._lastTransport().reply()
+        self._lastTransport().die()
+
+        envelope = PayloadEnvelope(filt=dict(key="test"))
+        self._worker.sendPayloadEnvelopeToChild(envelope, "uuid", "name")
+
+        # Each respawn dies before it loads the plugin
+        for _ in range(PluginSubprocParentWorker.MAX_FAILED_RESPAWNS):
+            self.assertFalse(self._worker.isFailed)
+            self._reactor.advance(PluginSubprocParentWorker.RESPAWN_BACKOFF_MAX)
+            self._lastTransport().die()
+
+        transportCount = len(self._reactor.transports)
+        self._reactor.advance(PluginSubprocParentWorker.RESPAWN_BACKOFF_MAX)
+        self.assertEqual(len(self._reactor.transports), transportCount)
+
+        # The buffered payload and the new payloads are rejected
+        self.assertTrue(self._worker.isFailed)
+        self._worker.sendPayloadEnvelopeToChild(envelope, "uuid", "name")
+        self.assertEqual(self._sent, [])
+        self.assertEqual(self._worker.stats["bufferedPayloadCount"], 0)
+        self.assertEqual(self._worker.stats["rejectedPayloadCount"], 2)
+
+        # A restart starts supervising again
+        self._worker.restart()
+        self._reactor.advance(0)
+        self.assertEqual(len(self._reactor.transports), transportCount + 1)
+        self._lastTransport().reply()
+        self.assertTrue(self._worker.isRunning)
+        self.assertFalse(self._worker.isFailed)
+
+    def testPluginLoadFailureFailsWithoutKill(self):
+        self._worker.sendPluginLoad("pluginA")
+        self._lastTransport().reply()
+        self._lastTransport().die()
+
+        self._reactor.advance(PluginSubprocParentWorker.RESPAWN_BACKOFF_INITIAL)
+        transport = self._lastTransport()
+        signals = []
+        transport.signalProcess = signals.append
+        transport.reply("FAILED")
+
+        self.assertTrue(self._worker.isFailed)
+        self.assertEqual(signals, [])
+
+    def testWarmSpareReplacesSubprocess(self):
+        self._reactor.transports = []
+        worker = self._createWorker(warmSpare=True)
+        active, spare = self._reactor.transports
+
+        worker.sendPluginLoad("pluginA")
+        active.reply()
+
+        # The spare imports the plugin packages once it's ready
+        spare.ready()
+        self.assertEqual(spare.commands, ["1:pluginA:IMPORT"])
+        spare.reply()
+
+        # The spare is used immediately, and a new spare is spawned
+        active.die()
+        self._reactor.advance(0)
+        self.assertEqual(len(self._reactor.transports), 3)
+        self.assertEqual(spare.commands, ["2:pluginA:LOAD"])
+        spare.reply()
+
+        self.assertTrue(worker.isRunning)
+        self.assertEqual(worker.stats["warmRestartCount"], 1)
+
+    def testReadySpareImportsLoadedPlugins(self):
+        self._reactor.transports = []
+        worker = self._createWorker(warmSpare=True)
+        active, spare = self._reactor.transports
+
+        # The spare is ready before any plugins are loaded
+        spare.ready()
+        self.assertEqual(spare.commands, [])
+
+        worker.sendPluginLoad("pluginA")
+        worker.sendPluginLoad("pluginB")
+        active.reply()
+        self.assertEqual(
+            spare.commands, ["1:pluginA:IMPORT", "2:pluginB:IMPORT"]
+        )
+        spare.reply()
+
+        # The spare replaces the subprocess with the plugins imported
+        active.die()
+        self._reactor.advance(0)
+        self.assertEqual(spare.commands, ["3:pluginA:LOAD"])
+
+    def testShutdownRemovesTrigger(self):
+        self.assertEqual(
+            list(self._reactor.triggers.values()),
+            [self._worker._shutdownFromReactor],
+        )
+
+        self._worker.shutdown()
+        self.assertEqual(self._reactor.triggers, {})
+
+        # Shutting down again doesn't remove it twice
+        self._worker.shutdown()
+
+    def testProcessStats(self):
+        self.assertEqual(self._worker.processStats, dict(pid=None))
+
+        self._lastTransport().pid = os.getpid()
+        stats = self._worker.processStats
+        self.assertEqual(stats["pid"], os.getpid())
+        self.assertGreater(stats["rssBytes"], 0)
+
+    def testLargePayloadIsWrittenBeforeSmallPayload(self):
+        worker = PluginSubprocParentWorker(
+            PluginSubprocPlatformConfigTuple(
+                serviceName="peek-test-service",
+                subprocessGroup="test",
+                workerIndex=1,
+                sharedMemoryThreshold=0,
+            )
+        )
+        self.addCleanup(worker.shutdown)
+        self._lastTransport().ready()
+
+        # The large payload is still encoding in the codec thread pool
+        largeEncoded = Deferred()
+        encodeResults = iter([largeEncoded, succeed(b"small")])
+        self.patch(worker, "_encodeTuple", lambda tuple_: next(encodeResults))
+
+        largeSent = worker.sendPayloadEnvelopeToChild(
+            PayloadEnvelope(filt=dict(key="large")), "uuid", "name"
+        )
+        smallSent = worker.sendPayloadEnvelopeToChild(
+            PayloadEnvelope(filt=dict(key="small")), "uuid", "name"
+        )
+        self.assertEqual(self._lastTransport().vortexMsgs, [])
+        self.assertNoResult(smallSent)
+
+        largeEncoded.callback(b"large")
+        self.assertEqual(self._lastTransport().vortexMsgs, [b"large", b"small"])
+        self.successResultOf(largeSent)
+        self.successResultOf(smallSent)
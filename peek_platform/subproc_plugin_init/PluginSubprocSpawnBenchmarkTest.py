@@ -0,0 +1,93 @@
+import logging
+import os
+import time
+
+from twisted.internet import reactor
+from twisted.internet import task
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_platform_config_tuple import (
+    PluginSubprocPlatformConfigTuple,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc_parent_worker import (
+    PluginSubprocParentWorker,
+)
+
+logger = logging.getLogger(__name__)
+
+# This spawns real subprocesses, they need a configured peek service.
+# Set this to the service name to run the benchmark, EG peek-logic-service
+SERVICE_NAME = os.environ.get("PEEK_SUBPROC_BENCH_SPAWN_SERVICE")
+
+REPEATS = int(os.environ.get("PEEK_SUBPROC_BENCH_SPAWN_REPEATS", 5))
+
+
+class PluginSubprocSpawnBenchmarkTest(unittest.TestCase):
+    timeout = 600
+
+    if not SERVICE_NAME:
+        skip = "Set PEEK_SUBPROC_BENCH_SPAWN_SERVICE to run this benchmark"
+
+    def _createWorker(self, warmSpare: bool) -> PluginSubprocParentWorker:
+        worker = PluginSubprocParentWorker(
+            PluginSubprocPlatformConfigTuple(
+                serviceName=SERVICE_NAME,
+                subprocessGroup="benchmark",
+                workerIndex=0,
+                sharedMemoryThreshold=0,
+            ),
+            warmSpare=warmSpare,
+        )
+        self.addCleanup(worker.shutdown)
+        return worker
+
+    @inlineCallbacks
+    def _waitUntil(self, condition):
+        while not condition():
+            yield task.deferLater(reactor, 0.001, lambda: None)
+
+    @inlineCallbacks
+    def _timeRestarts(self, worker: PluginSubprocParentWorker):
+        yield worker._processProtocol.whenReady()
+
+        timings = []
+        for _ in range(REPEATS):
+            if worker._warmSpare:
+                yield self._waitUntil(
+                    lambda: worker._spareProtocol
+                    and worker._spareProtocol.isReady
+                )
+
+            restartCount = worker.stats["restartCount"]
+            startTime = time.monotonic()
+            worker.restart()
+            yield self._waitUntil(
+                lambda: worker.stats["restartCount"] == restartCount + 1
+            )
+            yield worker._processProtocol.whenReady()
+            timings.append(time.monotonic() - startTime)
+
+            # Don't let the backoff grow between the restarts
+            worker._consecutiveFailures = 0
+
+        return timings
+
+    @inlineCallbacks
+    def testColdVersusWarmRespawn(self):
+        # Compare the spawn times, not the backoff
+        self.patch(PluginSubprocParentWorker, "RESPAWN_BACKOFF_INITIAL", 0)
+
+        coldTimings = yield self._timeRestarts(self._createWorker(False))
+        warmTimings = yield self._timeRestarts(self._createWorker(True))
+
+        for mode, timings in (("Cold", coldTimings), ("Warm", warmTimings)):
+            logger.info(
+                "%s respawn, min %.3fs, mean %.3fs, max %.3fs",
+                mode,
+                min(timings),
+                sum(timings) / len(timings),
+                max(timings),
+            )
+
+        self.assertLess(min(warmTimings), min(coldTimings))
@@ -0,0 +1,51 @@
+from twisted.internet.defer import Deferred
+from twisted.trial import unittest
+
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_child_vortex_protocol import (
+    PluginSubprocChildVortexProtocol,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    encodeFrameHeader,
+)
+
+
+class PluginSubprocChildVortexProtocolTest(unittest.TestCase):
+    def setUp(self):
+        self._protocol = PluginSubprocChildVortexProtocol(None)
+        self.addCleanup(self._protocol.connectionLost, None)
+
+        self._decodeDeferreds = {}
+        self._processed = []
+
+        self.patch(self._protocol, "_decodeVortexPayloadTuple", self._decode)
+        self.patch(
+            self._protocol, "_processVortexPayloadTuple", self._processed.append
+        )
+
+    def _decode(self, message):
+        d = Deferred()
+        self._decodeDeferreds[message] = d
+        return d
+
+    def testPayloadsAreProcessedInOrder(self):
+        self._protocol.dataReceived(
+            encodeFrameHeader(5) + b"large" + encodeFrameHeader(5) + b"small"
+        )
+
+        # The small payload decodes first, it waits for the large one
+        self._decodeDeferreds[b"small"].callback("small")
+        self.assertEqual(self._processed, [])
+
+        self._decodeDeferreds[b"large"].callback("large")
+        self.assertEqual(self._processed, ["large", "small"])
+
+    def testDecodeFailureDoesNotStopProcessing(self):
+        self._protocol.dataReceived(
+            encodeFrameHeader(3) + b"bad" + encodeFrameHeader(4) + b"good"
+        )
+
+        self._decodeDeferreds[b"good"].callback("good")
+        with self.assertLogs("child_vortex_protocol", "ERROR"):
+            self._decodeDeferreds[b"bad"].errback(ValueError("Bad payload"))
+
+        self.assertEqual(self._processed, ["good"])
@@ -0,0 +1,56 @@
+import threading
+
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_codec import (
+    PluginSubprocCodec,
+)
+
+
+class PluginSubprocCodecTest(unittest.TestCase):
+    def setUp(self):
+        self._codec = PluginSubprocCodec()
+        self._codec.configure(inlineThreshold=100, threadPoolSize=2)
+
+    def tearDown(self):
+        if self._codec._threadPool:
+            self._codec._threadPool.stop()
+
+    @inlineCallbacks
+    def testSmallMessageRunsInline(self):
+        threadName = yield self._codec.run(
+            100, lambda: threading.current_thread().name
+        )
+
+        self.assertEqual(threadName, threading.current_thread().name)
+        self.assertEqual(self._codec.stats["inlineCount"], 1)
+        self.assertEqual(self._codec.stats["threadedCount"], 0)
+
+    @inlineCallbacks
+    def testLargeMessageRunsInCodecPool(self):
+        threadName = yield self._codec.run(
+            101, lambda: threading.current_thread().name
+        )
+
+        self.assertIn("subproc codec", threadName)
+        self.assertEqual(self._codec.stats["inlineCount"], 0)
+        self.assertEqual(self._codec.stats["threadedCount"], 1)
+        self.assertEqual(self._codec.stats["threadedBytes"], 101)
+
+    @inlineCallbacks
+    def testSmallMessageRunsInCodecPoolWhenAsked(self):
+        threadName = yield self._codec.runInThreadPool(
+            10, lambda: threading.current_thread().name
+        )
+
+        self.assertIn("subproc codec", threadName)
+        self.assertEqual(self._codec.stats["threadedCount"], 1)
+
+    @inlineCallbacks
+    def testErrorsAreReturned(self):
+        for sizeHint in (1, 1000):
+            with self.assertRaises(ValueError):
+                yield self._codec.run(sizeHint, int, "not a number")
+
+        self.flushLoggedErrors()
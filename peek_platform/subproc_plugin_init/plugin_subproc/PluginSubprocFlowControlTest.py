@@ -0,0 +1,63 @@
+from twisted.trial import unittest
+
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_flow_control import (
+    PluginSubprocFlowControl,
+)
+
+
+class PluginSubprocFlowControlTest(unittest.TestCase):
+    def testWritableWhenNotPaused(self):
+        flowControl = PluginSubprocFlowControl("test")
+
+        self.assertTrue(flowControl.waitUntilWritable().called)
+        self.assertEqual(flowControl.queueDepth, 0)
+
+    def testWritersWaitWhilePaused(self):
+        calls = []
+        flowControl = PluginSubprocFlowControl(
+            "test",
+            onPause=lambda: calls.append("pause"),
+            onResume=lambda: calls.append("resume"),
+        )
+
+        flowControl.pauseProducing()
+        released = []
+        for index in range(3):
+            d = flowControl.waitUntilWritable()
+            d.addCallback(lambda _, index=index: released.append(index))
+
+        self.assertEqual(released, [])
+        self.assertEqual(flowControl.queueDepth, 3)
+
+        flowControl.resumeProducing()
+        self.assertEqual(released, [0, 1, 2])
+        self.assertEqual(calls, ["pause", "resume"])
+
+        stats = flowControl.stats
+        self.assertEqual(stats["pauseCount"], 1)
+        self.assertEqual(stats["maxQueueDepth"], 3)
+        self.assertFalse(stats["paused"])
+
+    def testReleaseStopsWhenPausedAgain(self):
+        flowControl = PluginSubprocFlowControl("test")
+        flowControl.pauseProducing()
+
+        released = []
+
+        def write(_, index):
+            released.append(index)
+            # This write fills the pipe again
+            flowControl.pauseProducing()
+
+        for index in range(3):
+            flowControl.waitUntilWritable().addCallback(write, index)
+
+        flowControl.resumeProducing()
+        self.assertEqual(released, [0])
+
+        flowControl.resumeProducing()
+        self.assertEqual(released, [0, 1])
+
+        # The remaining writers are released when the pipe closes
+        flowControl.stopProducing()
+        self.assertEqual(released, [0, 1, 2])
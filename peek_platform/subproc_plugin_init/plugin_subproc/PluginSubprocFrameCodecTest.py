@@ -0,0 +1,80 @@
+import os
+import unittest
+
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    FRAME_HEADER_SIZE,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    FRAME_TYPE_DATA,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    PluginSubprocFrameError,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    PluginSubprocFrameReader,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    encodeFrame,
+)
+
+
+class PluginSubprocFrameCodecTest(unittest.TestCase):
+    def _chunk(self, data: bytes, size: int):
+        return [data[i : i + size] for i in range(0, len(data), size)]
+
+    def testSingleFrame(self):
+        reader = PluginSubprocFrameReader()
+        frames = reader.feed(encodeFrame(b'{"a": 1}'))
+
+        self.assertEqual(frames, [(FRAME_TYPE_DATA, b'{"a": 1}')])
+        self.assertFalse(reader.hasPartialFrame)
+
+    def testPayloadMayContainAnyByte(self):
+        payload = bytes(range(256)) * 4
+        reader = PluginSubprocFrameReader()
+
+        self.assertEqual(
+            reader.feed(encodeFrame(payload)), [(FRAME_TYPE_DATA, payload)]
+        )
+
+    def testEmptyPayload(self):
+        reader = PluginSubprocFrameReader()
+        data = encodeFrame(b"") + encodeFrame(b"x")
+
+        self.assertEqual(
+            reader.feed(data), [(FRAME_TYPE_DATA, b""), (FRAME_TYPE_DATA, b"x")]
+        )
+
+    def testSplitReads(self):
+        payloads = [os.urandom(n) for n in (0, 1, 7, 1000, 65537)]
+        data = b"".join([encodeFrame(p) for p in payloads])
+
+        # Include chunks smaller than the header
+        for chunkSize in (1, FRAME_HEADER_SIZE - 1, 3, 4096, len(data)):
+            reader = PluginSubprocFrameReader()
+            frames = []
+            for chunk in self._chunk(data, chunkSize):
+                frames.extend(reader.feed(chunk))
+
+            self.assertEqual([bytes(f[1]) for f in frames], payloads)
+            self.assertFalse(reader.hasPartialFrame)
+
+    def testPartialFrameIsKept(self):
+        data = encodeFrame(b"hello world")
+        reader = PluginSubprocFrameReader()
+
+        self.assertEqual(reader.feed(data[:-1]), [])
+        self.assertTrue(reader.hasPartialFrame)
+        self.assertEqual(
+            reader.feed(data[-1:]), [(FRAME_TYPE_DATA, b"hello world")]
+        )
+
+    def testOversizedFrameRaises(self):
+        reader = PluginSubprocFrameReader(maxFrameSize=10)
+
+        self.assertEqual(
+            reader.feed(encodeFrame(b"0123456789")),
+            [(FRAME_TYPE_DATA, b"0123456789")],
+        )
+        with self.assertRaises(PluginSubprocFrameError):
+            reader.feed(encodeFrame(b"0123456789A"))
@@ -0,0 +1,39 @@
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import fail
+from twisted.internet.defer import succeed
+from twisted.trial import unittest
+
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_ordered_writer import (
+    PluginSubprocOrderedWriter,
+)
+
+
+class PluginSubprocOrderedWriterTest(unittest.TestCase):
+    def setUp(self):
+        self._written = []
+        self._writer = PluginSubprocOrderedWriter("test", self._written.append)
+
+    def testMessagesAreWrittenInOrder(self):
+        first = Deferred()
+        firstWritten = self._writer.write(first)
+        secondWritten = self._writer.write(succeed(b"second"))
+
+        self.assertEqual(self._written, [])
+        self.assertEqual(self._writer.queueDepth, 1)
+        self.assertNoResult(secondWritten)
+
+        first.callback(b"first")
+        self.assertEqual(self._written, [b"first", b"second"])
+        self.successResultOf(firstWritten)
+        self.successResultOf(secondWritten)
+
+        # With nothing queued, an encoded message is written immediately
+        self.successResultOf(self._writer.write(succeed(b"third")))
+        self.assertEqual(self._written[-1], b"third")
+
+    def testFailedEncodeIsReturnedToTheSender(self):
+        failedWritten = self._writer.write(fail(ValueError("Bad tuple")))
+        self.failureResultOf(failedWritten, ValueError)
+
+        self.successResultOf(self._writer.write(succeed(b"next")))
+        self.assertEqual(self._written, [b"next"])
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import time
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import succeed
+from twisted.trial import unittest
+from vortex.VortexFactory import VortexFactory
+
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    VORTEX_MSG_FROM_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    encodeFrame,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_parent_protocol import (
+    PluginSubprocParentProtocol,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_vortex_msg_tuple import (
+    PluginSubprocVortexMsgTuple,
+)
+
+logger = logging.getLogger(__name__)
+
+# This is a stress run of several GB, set this to run the benchmark
+RUN_BENCHMARK = os.environ.get("PEEK_SUBPROC_BENCH_PROTOCOL")
+
+# The number of distinct messages that are repeated
+CYCLE_LENGTH = 4
+
+# Scale these with environment variables for a longer or shorter run,
+# the message count is rounded down to whole cycles.
+MESSAGE_COUNT = int(os.environ.get("PEEK_SUBPROC_BENCH_MESSAGE_COUNT", 2000))
+MESSAGE_COUNT -= MESSAGE_COUNT % CYCLE_LENGTH
+MESSAGE_SIZE = int(
+    os.environ.get("PEEK_SUBPROC_BENCH_MESSAGE_SIZE", 2 * 1024 * 1024)
+)
+
+# The size twisted reads from a pipe at a time
+PIPE_READ_SIZE = 64 * 1024
+
+
+class _FakeProcessReader:
+    def __init__(self):
+        self.reading = True
+
+    def stopReading(self):
+        self.reading = False
+
+    def startReading(self):
+        self.reading = True
+
+
+class _FakeProcessTransport:
+    def __init__(self):
+        self.pipes = {VORTEX_MSG_FROM_CHILD_FD: _FakeProcessReader()}
+
+
+class PluginSubprocParentProtocolBenchmarkTest(unittest.TestCase):
+    timeout = 600
+
+    if not RUN_BENCHMARK:
+        skip = "Set PEEK_SUBPROC_BENCH_PROTOCOL to run this benchmark"
+
+    def setUp(self):
+        self._received = []
+        self._allReceivedDeferred = Deferred()
+
+        def sendVortexMsg(vortexMsgs, destVortexUuid):
+            self._received.append((destVortexUuid, vortexMsgs))
+            if len(self._received) == MESSAGE_COUNT:
+                self._allReceivedDeferred.callback(True)
+            return succeed(True)
+
+        self.patch(VortexFactory, "sendVortexMsg", sendVortexMsg)
+
+    def _encodedCycle(self):
+        # Encoding is not what we're measuring, so encode a few distinct
+        # messages once and send them over and over.
+        payloads = [os.urandom(MESSAGE_SIZE) for _ in range(CYCLE_LENGTH)]
+
+        cycle = bytearray()
+        for index, payload in enumerate(payloads):
+            tuple_ = PluginSubprocVortexMsgTuple(
+                vortexUuid=str(index), vortexMsgs=[payload], priority=0
+            )
+            cycle += encodeFrame(json.dumps(tuple_.toJsonDict()).encode())
+
+        return payloads, bytes(cycle)
+
+    def _pipeReads(self, cycle: bytes):
+        """Pipe Reads
+
+        Yield the repeated cycle in pipe sized reads. The cycle length is not
+        a multiple of the read size, so the reads split the frames and
+        headers at a different place in every message.
+
+        """
+        repeats = MESSAGE_COUNT // CYCLE_LENGTH
+        with memoryview(cycle) as view:
+            for _ in range(repeats):
+                for offset in range(0, len(view), PIPE_READ_SIZE):
+                    yield bytes(view[offset : offset + PIPE_READ_SIZE])
+
+    def _letReactorRun(self):
+        d = Deferred()
+        reactor.callLater(0, d.callback, True)
+        return d
+
+    @inlineCallbacks
+    def testSplitReadThroughput(self):
+        payloads, cycle = self._encodedCycle()
+        protocol = PluginSubprocParentProtocol("benchmark")
+        protocol.transport = _FakeProcessTransport()
+        pipe = protocol.transport.pipes[VORTEX_MSG_FROM_CHILD_FD]
+
+        startTime = time.time()
+        streamSize = 0
+
+        # Feed the stream as twisted would, letting the reactor run between
+        # some of the reads, and while the protocol has stopped reading.
+        maxQueueDepth = 0
+        for readIndex, data in enumerate(self._pipeReads(cycle)):
+            streamSize += len(data)
+            protocol.outReceived(data)
+
+            queueDepth = len(protocol._vortexMsgDecodeQueue)
+            maxQueueDepth = max(maxQueueDepth, queueDepth)
+
+            if readIndex % 64 == 0:
+                yield self._letReactorRun()
+
+            while not pipe.reading:
+                yield self._letReactorRun()
+
+        yield self._allReceivedDeferred
+
+        secondsTaken = time.time() - startTime
+        megabytes = streamSize / 1024 / 1024
+        logger.info(
+            "Received %s messages, %.1f MB in %.2fs, %.1f MB/s,"
+            " max queue depth %s, %s",
+            MESSAGE_COUNT,
+            megabytes,
+            secondsTaken,
+            megabytes / secondsTaken,
+            maxQueueDepth,
+            protocol.flowControlStats["fromChild"],
+        )
+
+        self.assertEqual(len(self._received), MESSAGE_COUNT)
+        for index, (vortexUuid, vortexMsgs) in enumerate(self._received):
+            self.assertEqual(vortexUuid, str(index % CYCLE_LENGTH))
+            self.assertEqual(vortexMsgs, [payloads[index % CYCLE_LENGTH]])
+
+        self.assertFalse(protocol._vortexMsgFrameReader.hasPartialFrame)
+
+        # Reading stops at the high water mark, the last read may complete a
+        # few more messages.
+        messagesPerRead = PIPE_READ_SIZE // MESSAGE_SIZE + 1
+        self.assertLessEqual(
+            maxQueueDepth,
+            protocol.VORTEX_MSG_FROM_CHILD_HIGH_WATER + messagesPerRead,
+        )
@@ -0,0 +1,64 @@
+import os
+import unittest
+
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_shared_memory import (
+    PluginSubprocSharedMemoryPool,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_shared_memory import (
+    readSharedMemoryPayload,
+)
+
+
+class PluginSubprocSharedMemoryTest(unittest.TestCase):
+    def setUp(self):
+        self._pool = PluginSubprocSharedMemoryPool(threshold=1024)
+
+    def tearDown(self):
+        self._pool.close()
+
+    def testSmallPayloadUsesPipe(self):
+        self.assertIsNone(self._pool.write(b"x" * 1024))
+        self.assertIsNone(PluginSubprocSharedMemoryPool(0).write(b"x" * 4096))
+
+    def testRoundTrip(self):
+        payload = os.urandom(100 * 1024)
+        descriptor = self._pool.write(payload)
+
+        self.assertLess(len(descriptor), 100)
+        self.assertEqual(self._pool.inUseCount, 1)
+
+        received, segmentName = readSharedMemoryPayload(descriptor)
+        self.assertEqual(received, payload)
+
+        self._pool.release(segmentName)
+        self.assertEqual(self._pool.inUseCount, 0)
+
+    def testSegmentIsReusedAfterRelease(self):
+        first = self._pool.write(os.urandom(3000))
+        second = self._pool.write(os.urandom(3000))
+
+        firstPayload, firstName = readSharedMemoryPayload(first)
+        secondPayload, secondName = readSharedMemoryPayload(second)
+        self.assertNotEqual(firstName, secondName)
+
+        self._pool.release(firstName)
+
+        # A smaller payload fits in the released segment
+        payload = os.urandom(2000)
+        received, name = readSharedMemoryPayload(self._pool.write(payload))
+        self.assertEqual(received, payload)
+        self.assertEqual(name, firstName)
+
+    def testPoolsInOneProcessUseDifferentSegments(self):
+        otherPool = PluginSubprocSharedMemoryPool(threshold=1024)
+        self.addCleanup(otherPool.close)
+
+        payload = os.urandom(3000)
+        otherPayload = os.urandom(3000)
+        _, name = readSharedMemoryPayload(self._pool.write(payload))
+        received, otherName = readSharedMemoryPayload(
+            otherPool.write(otherPayload)
+        )
+
+        self.assertNotEqual(name, otherName)
+        self.assertEqual(received, otherPayload)
@@ -17,6 +17,9 @@ from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_child_vorte
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_child_vortex_uuid_protocol import (
     PluginSubprocChildVortexUuidProtocol,
 )
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_codec import (
+    pluginSubprocCodec,
+)
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
     PLUGIN_STATE_FROM_CHILD_FD,
 )
@@ -58,15 +61,20 @@ if __name__ == "__main__":
     platformConfigTuple = PluginSubprocPlatformConfigTuple().fromJsonDict(
         json.loads(b64decode(base64Tuple))
     )
-    logger = logging.getLogger(
-        "subproc plugin main %s %s"
-        % (platformConfigTuple.serviceName, platformConfigTuple.subprocessGroup)
+    workerName = "%s %s:%s" % (
+        platformConfigTuple.serviceName,
+        platformConfigTuple.subprocessGroup,
+        platformConfigTuple.workerIndex or 0,
     )
+    logger = logging.getLogger("subproc plugin main %s" % workerName)
 
-    setproctitle(
-        "%s %s"
-        % (platformConfigTuple.serviceName, platformConfigTuple.subprocessGroup)
-    )
+    setproctitle(workerName)
+
+    if platformConfigTuple.codecInlineThreshold is not None:
+        pluginSubprocCodec.configure(
+            inlineThreshold=platformConfigTuple.codecInlineThreshold,
+            threadPoolSize=platformConfigTuple.codecThreadPoolSize,
+        )
 
     from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_child_vortex import (
         PluginSubprocChildVortex,
@@ -77,7 +85,10 @@ if __name__ == "__main__":
     )
 
     # Create the protocol used to send vortex messages
-    sendVortexToParentProtocol = PluginSubprocChildVortexProtocol(vortex)
+    sendVortexToParentProtocol = PluginSubprocChildVortexProtocol(
+        vortex,
+        sharedMemoryThreshold=platformConfigTuple.sharedMemoryThreshold or 0,
+    )
     StandardIO(
         sendVortexToParentProtocol,
         stdin=VORTEX_MSG_TO_CHILD_FD,
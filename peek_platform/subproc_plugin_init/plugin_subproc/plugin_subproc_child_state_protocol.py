@@ -1,6 +1,9 @@
+import importlib
 import logging
+from collections import defaultdict
 
 from twisted.internet import protocol
+from twisted.internet.defer import DeferredLock
 from twisted.internet.defer import inlineCallbacks
 
 from peek_platform.platform_init.init_platform import InitPlatform
@@ -17,11 +20,22 @@ class PluginSubprocChildStateProtocol(protocol.Protocol):
     COMMAND_UNLOAD = "UNLOAD"
     COMMAND_SUCCESS = "SUCCESS"
 
+    # Import the plugin package, without loading the plugin
+    COMMAND_IMPORT = "IMPORT"
+
+    # Events are sent to the parent with this command ID
+    EVENT_COMMAND_ID = "0"
+    EVENT_READY = "READY"
+
     def __init__(self, serviceName: str, subprocessGroup: str):
         self._data = b""
         self._serviceName = serviceName
         self._subprocessGroup = subprocessGroup
 
+        # Commands for different plugins run concurrently, commands for the
+        # same plugin run in the order they were received.
+        self._commandLockByPluginName = defaultdict(DeferredLock)
+
     @inlineCallbacks
     def connectionMade(self):
 
@@ -39,7 +53,11 @@ class PluginSubprocChildStateProtocol(protocol.Protocol):
         if self._serviceName != peekServerName:
             yield platformInitter.connectVortexClient()
 
-    @inlineCallbacks
+        # Tell the parent we're ready for plugins
+        self.transport.write(
+            f"{self.EVENT_COMMAND_ID}::{self.EVENT_READY}\n".encode()
+        )
+
     def dataReceived(self, data: bytes):
         self._data += data
 
@@ -48,12 +66,14 @@ class PluginSubprocChildStateProtocol(protocol.Protocol):
             if not message:
                 continue
 
-            pluginName, command = message.decode().split(":", 1)
+            commandId, pluginName, command = message.decode().split(":", 2)
 
-            yield self._runCommand(pluginName, command)
+            self._commandLockByPluginName[pluginName].run(
+                self._runCommand, commandId, pluginName, command
+            )
 
     @inlineCallbacks
-    def _runCommand(self, pluginName: str, command: str):
+    def _runCommand(self, commandId: str, pluginName: str, command: str):
         from peek_platform import PeekPlatformConfig
 
         try:
@@ -74,21 +94,20 @@ class PluginSubprocChildStateProtocol(protocol.Protocol):
                 yield PeekPlatformConfig.pluginLoader.unloadStandalonePlugin(
                     pluginName
                 )
+            elif command == self.COMMAND_IMPORT:
+                importlib.import_module(pluginName)
             else:
                 raise NotImplementedError(f"Unhandled command '{command}'")
 
             # Send the success response
             self.transport.write(
-                f"{pluginName}:{self.COMMAND_SUCCESS}".encode()
+                f"{commandId}:{pluginName}:{self.COMMAND_SUCCESS}\n".encode()
             )
-            self.transport.write(b"\n")
 
         except Exception as e:
             logger.exception(e)
-            # Send the success response
+            # Send the failure response, it must be one line
+            error = (e.message if hasattr(e, "message") else str(e)) or repr(e)
             self.transport.write(
-                (e.message if hasattr(e, "message") else str(e))
-                .splitlines()[0]
-                .encode()
+                f"{commandId}:{pluginName}:{error.splitlines()[0]}\n".encode()
             )
-            self.transport.write(b"\n")
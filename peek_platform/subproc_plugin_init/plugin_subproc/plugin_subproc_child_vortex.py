@@ -17,8 +17,7 @@ logger = logging.getLogger("child_vortex")
 class PluginSubprocChildVortex(VortexABC):
     def __init__(self, vortexName: str):
         self._localVortexInfo = VortexInfo(vortexName, uuid.uuid4())
-        self._remoteVortexInfos = []
-        self._remoteVortexUuidsSet = set()
+        self._remoteVortexInfoByUuid = {}
         self._sendVortexToParentProtocol = None
 
     def setStdoutProtocol(self, sendVortexToParentProtocol: StandardIO):
@@ -30,7 +29,7 @@ class PluginSubprocChildVortex(VortexABC):
 
     @property
     def remoteVortexInfo(self) -> List[VortexInfo]:
-        return self._remoteVortexInfos
+        return list(self._remoteVortexInfoByUuid.values())
 
     @property
     def requiresBase64Encoding(self) -> bool:
@@ -42,7 +41,7 @@ class PluginSubprocChildVortex(VortexABC):
         vortexMsgs: Union[VortexMsgList, bytes],
         vortexUuid: Optional[str] = None,
     ):
-        if vortexUuid not in self._remoteVortexUuidsSet:
+        if vortexUuid not in self._remoteVortexInfoByUuid:
             logger.debug(
                 "Remote client vortex with UUID %s doesn't exist", vortexUuid
             )
@@ -56,14 +55,21 @@ class PluginSubprocChildVortex(VortexABC):
         )
 
     def ensureRemoteVortexIsRegistered(self, vortexUuid: str, vortexName: str):
-        if vortexUuid in self._remoteVortexUuidsSet:
+        if vortexUuid in self._remoteVortexInfoByUuid:
             return
 
-        self._remoteVortexInfos.append(
-            VortexInfo(name=vortexName, uuid=vortexUuid)
+        self._remoteVortexInfoByUuid[vortexUuid] = VortexInfo(
+            name=vortexName, uuid=vortexUuid
         )
-        self._remoteVortexUuidsSet.add(vortexUuid)
 
     def updateRemoteVortexUuids(self, vortexInfos: list[VortexInfo]):
-        self._remoteVortexInfos = vortexInfos
-        self._remoteVortexUuidsSet = set([vi.uuid for vi in vortexInfos])
+        self._remoteVortexInfoByUuid = {vi.uuid: vi for vi in vortexInfos}
+
+    def applyRemoteVortexUuidDelta(
+        self, addedVortexInfos: list[VortexInfo], removedVortexUuids: list[str]
+    ):
+        for vortexInfo in addedVortexInfos:
+            self._remoteVortexInfoByUuid[vortexInfo.uuid] = vortexInfo
+
+        for vortexUuid in removedVortexUuids:
+            self._remoteVortexInfoByUuid.pop(vortexUuid, None)
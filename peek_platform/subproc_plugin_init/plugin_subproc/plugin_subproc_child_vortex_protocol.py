@@ -1,12 +1,11 @@
 import json
 import logging
-from base64 import b64decode
-from base64 import b64encode
+from collections import deque
 from typing import Union
 
 from twisted.internet import protocol
+from twisted.internet.defer import Deferred
 from twisted.internet.defer import inlineCallbacks
-from vortex.DeferUtil import deferToThreadWrapWithLogger
 from vortex.PayloadEnvelope import VortexMsgList
 from vortex.PayloadIO import PayloadIO
 from vortex.PayloadPriority import DEFAULT_PRIORITY
@@ -14,6 +13,33 @@ from vortex.PayloadPriority import DEFAULT_PRIORITY
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_child_vortex import (
     PluginSubprocChildVortex,
 )
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_codec import (
+    pluginSubprocCodec,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_flow_control import (
+    PluginSubprocFlowControl,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    FRAME_TYPE_SHARED_MEMORY,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    FRAME_TYPE_SHARED_MEMORY_ACK,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    PluginSubprocFrameReader,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    encodeFrameHeader,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_ordered_writer import (
+    PluginSubprocOrderedWriter,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_shared_memory import (
+    PluginSubprocSharedMemoryPool,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_shared_memory import (
+    readSharedMemoryPayload,
+)
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_vortex_msg_tuple import (
     PluginSubprocVortexMsgTuple,
 )
@@ -26,49 +52,122 @@ logger = logging.getLogger("child_vortex_protocol")
 
 
 class PluginSubprocChildVortexProtocol(protocol.Protocol):
-    def __init__(self, vortex: PluginSubprocChildVortex):
-        self._data = b""
+    def __init__(
+        self, vortex: PluginSubprocChildVortex, sharedMemoryThreshold: int = 0
+    ):
+        self._frameReader = PluginSubprocFrameReader()
+        self._sharedMemoryPool = PluginSubprocSharedMemoryPool(
+            sharedMemoryThreshold
+        )
         self._vortex = vortex
+        self._decodeQueue = deque()
+        self._processLoopRunning = False
+
+        # When the parent isn't reading our messages, stop reading messages
+        # from the parent, this holds back the PayloadIO processing that
+        # creates more messages.
+        self._toParentFlowControl = PluginSubprocFlowControl(
+            "Pipe to parent",
+            onPause=self._stopReadingFromParent,
+            onResume=self._startReadingFromParent,
+        )
+        self._toParentWriter = PluginSubprocOrderedWriter(
+            "Pipe to parent", self._writeEncodedVortexMsgToParent
+        )
 
-    @inlineCallbacks
-    def dataReceived(self, data: bytes):
-        self._data += data
+    def connectionMade(self):
+        self.transport.registerProducer(self._toParentFlowControl, True)
 
-        while b"." in self._data:
-            message, self._data = self._data.split(b".", 1)
-            if not message:
+    def _stopReadingFromParent(self):
+        self.transport.pauseProducing()
+
+    def _startReadingFromParent(self):
+        self.transport.resumeProducing()
+
+    def connectionLost(self, reason):
+        self._sharedMemoryPool.close()
+
+    def dataReceived(self, data: bytes):
+        # Start the decoding now, so large messages decode in parallel.
+        # The payloads are still processed in the order the parent sent them.
+        for frameType, message in self._frameReader.feed(data):
+            if frameType == FRAME_TYPE_SHARED_MEMORY_ACK:
+                self._sharedMemoryPool.release(message.decode())
                 continue
 
-            vortexPayloadTuple = yield self._decodeVortexPayloadTuple(message)
+            if frameType == FRAME_TYPE_SHARED_MEMORY:
+                d = self._readSharedMemoryPayload(message)
+                d.addCallback(self._ackSharedMemoryPayload)
+                d.addCallback(self._decodeVortexPayloadTuple)
 
-            # assign these locally so they are not used in the closure.
-            payloadEnvelope = vortexPayloadTuple.payloadEnvelope
-            vortexUuid = vortexPayloadTuple.vortexUuid
-            vortexName = vortexPayloadTuple.vortexName
-            del vortexPayloadTuple
+            else:
+                d = self._decodeVortexPayloadTuple(message)
 
-            self._vortex.ensureRemoteVortexIsRegistered(
-                vortexUuid=vortexUuid, vortexName=vortexName
-            )
+            self._decodeQueue.append(d)
 
-            def sendResponse(
-                vortexMsgs: Union[VortexMsgList, bytes],
-                priority: int = DEFAULT_PRIORITY,
-            ):
-                return self.sendVortexMsg(
-                    vortexMsgs=vortexMsgs,
-                    vortexUuid=vortexUuid,
-                    priority=priority,
-                )
-
-            PayloadIO().process(
-                payloadEnvelope=payloadEnvelope,
+        if not self._processLoopRunning:
+            self._processVortexPayloadsFromParent()
+
+    @inlineCallbacks
+    def _processVortexPayloadsFromParent(self):
+        self._processLoopRunning = True
+        try:
+            while self._decodeQueue:
+                try:
+                    vortexPayloadTuple = yield self._decodeQueue.popleft()
+                    self._processVortexPayloadTuple(vortexPayloadTuple)
+
+                except Exception as e:
+                    logger.exception(e)
+
+        finally:
+            self._processLoopRunning = False
+
+    def _processVortexPayloadTuple(
+        self, vortexPayloadTuple: PluginSubprocVortexPayloadEnvelopeTuple
+    ):
+        # assign these locally so they are not used in the closure.
+        payloadEnvelope = vortexPayloadTuple.payloadEnvelope
+        vortexUuid = vortexPayloadTuple.vortexUuid
+        vortexName = vortexPayloadTuple.vortexName
+        del vortexPayloadTuple
+
+        self._vortex.ensureRemoteVortexIsRegistered(
+            vortexUuid=vortexUuid, vortexName=vortexName
+        )
+
+        def sendResponse(
+            vortexMsgs: Union[VortexMsgList, bytes],
+            priority: int = DEFAULT_PRIORITY,
+        ):
+            return self.sendVortexMsg(
+                vortexMsgs=vortexMsgs,
                 vortexUuid=vortexUuid,
-                vortexName=vortexName,
-                httpSession=None,
-                sendResponse=sendResponse,
+                priority=priority,
             )
 
+        PayloadIO().process(
+            payloadEnvelope=payloadEnvelope,
+            vortexUuid=vortexUuid,
+            vortexName=vortexName,
+            httpSession=None,
+            sendResponse=sendResponse,
+        )
+
+    def _ackSharedMemoryPayload(self, result) -> bytes:
+        # Let the parent reuse the segment now we've copied it out
+        message, segmentName = result
+        segmentName = segmentName.encode()
+        self.transport.writeSequence(
+            [
+                encodeFrameHeader(
+                    len(segmentName), FRAME_TYPE_SHARED_MEMORY_ACK
+                ),
+                segmentName,
+            ]
+        )
+        return message
+
     @inlineCallbacks
     def sendVortexMsg(
         self,
@@ -77,22 +176,61 @@ class PluginSubprocChildVortexProtocol(protocol.Protocol):
         priority: int = DEFAULT_PRIORITY,
     ):
 
+        yield self._toParentFlowControl.waitUntilWritable()
+
         tuple_ = PluginSubprocVortexMsgTuple(
             vortexUuid=vortexUuid, vortexMsgs=vortexMsgs, priority=priority
         )
-        vortexMsgTuple = yield self._encodeVortexMsgTuple(tuple_)
-        self.transport.write(vortexMsgTuple)
-        self.transport.write(b".")
+        yield self._toParentWriter.write(self._encodeVortexMsgTuple(tuple_))
 
-    @deferToThreadWrapWithLogger(logger)
-    def _decodeVortexPayloadTuple(self, message):
+    def _writeEncodedVortexMsgToParent(self, vortexMsgTuple: bytes):
+        descriptor = self._sharedMemoryPool.write(vortexMsgTuple)
+        if descriptor is None:
+            self.transport.writeSequence(
+                [encodeFrameHeader(len(vortexMsgTuple)), vortexMsgTuple]
+            )
+        else:
+            self.transport.writeSequence(
+                [
+                    encodeFrameHeader(
+                        len(descriptor), FRAME_TYPE_SHARED_MEMORY
+                    ),
+                    descriptor,
+                ]
+            )
+
+    def _decodeVortexPayloadTuple(self, message) -> Deferred:
+        return pluginSubprocCodec.run(
+            len(message), self._decodeVortexPayloadTupleBlocking, message
+        )
+
+    def _decodeVortexPayloadTupleBlocking(self, message):
         vortexPayloadTuple = (
             PluginSubprocVortexPayloadEnvelopeTuple().fromJsonDict(
-                json.loads(b64decode(message))
+                json.loads(message)
             )
         )
         return vortexPayloadTuple
 
-    @deferToThreadWrapWithLogger(logger)
-    def _encodeVortexMsgTuple(self, tuple_):
-        return b64encode(json.dumps(tuple_.toJsonDict()).encode())
+    def _readSharedMemoryPayload(self, descriptor: bytes) -> Deferred:
+        # Copying the payload out of shared memory can be large, so it always
+        # runs in the codec thread pool.
+        return pluginSubprocCodec.runInThreadPool(
+            len(descriptor), readSharedMemoryPayload, descriptor
+        )
+
+    def _encodeVortexMsgTuple(
+        self, tuple_: PluginSubprocVortexMsgTuple
+    ) -> Deferred:
+        vortexMsgs = tuple_.vortexMsgs
+        if isinstance(vortexMsgs, bytes):
+            sizeHint = len(vortexMsgs)
+        else:
+            sizeHint = sum([len(m) for m in vortexMsgs])
+
+        return pluginSubprocCodec.run(
+            sizeHint, self._encodeVortexMsgTupleBlocking, tuple_
+        )
+
+    def _encodeVortexMsgTupleBlocking(self, tuple_):
+        return json.dumps(tuple_.toJsonDict()).encode()
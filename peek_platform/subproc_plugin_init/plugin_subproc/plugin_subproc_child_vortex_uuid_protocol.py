@@ -1,15 +1,15 @@
 import json
 import logging
-from base64 import b64decode
 
 from twisted.internet import protocol
-from twisted.internet.defer import inlineCallbacks
-from vortex.DeferUtil import deferToThreadWrapWithLogger
 from vortex.VortexABC import VortexInfo
 
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_child_vortex import (
     PluginSubprocChildVortex,
 )
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    PluginSubprocFrameReader,
+)
 
 
 logger = logging.getLogger("child_vortex_uuid_protocol")
@@ -17,27 +17,26 @@ logger = logging.getLogger("child_vortex_uuid_protocol")
 
 class PluginSubprocChildVortexUuidProtocol(protocol.Protocol):
     def __init__(self, vortex: PluginSubprocChildVortex):
-        self._data = b""
+        self._frameReader = PluginSubprocFrameReader()
         self._vortex = vortex
 
-    @inlineCallbacks
     def dataReceived(self, data: bytes):
-        self._data += data
+        frames = self._frameReader.feed(data)
         if not self._vortex:
             return
 
-        while b"." in self._data:
-            message, self._data = self._data.split(b".", 1)
-            if not message:
-                continue
+        # The updates are deltas, so they must be applied in order.
+        # They are small, so decode them here rather than in a thread.
+        for frameType, message in frames:
+            update = json.loads(message)
 
             # Tell the child fake vortex about the remote UUIDs in our parent
             # process
-            vortexInfoLists = yield self._decodeMessage(message)
-            self._vortex.updateRemoteVortexUuids(
-                [VortexInfo(name=o[0], uuid=o[1]) for o in vortexInfoLists]
-            )
-
-    @deferToThreadWrapWithLogger(logger)
-    def _decodeMessage(self, message):
-        return json.loads(b64decode(message))
+            added = [VortexInfo(name=o[0], uuid=o[1]) for o in update["added"]]
+
+            if update["full"]:
+                self._vortex.updateRemoteVortexUuids(added)
+            else:
+                self._vortex.applyRemoteVortexUuidDelta(
+                    added, update["removed"]
+                )
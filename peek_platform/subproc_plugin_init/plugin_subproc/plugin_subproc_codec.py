@@ -0,0 +1,134 @@
+import logging
+from typing import Any
+from typing import Callable
+
+from twisted.internet import reactor
+from twisted.internet import threads
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import fail
+from twisted.internet.defer import succeed
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+
+logger = logging.getLogger(__name__)
+
+
+class PluginSubprocCodec:
+    """Plugin Subprocess Codec
+
+    This class runs the JSON encoding and decoding of messages passed between
+    the service and the plugin subprocesses.
+
+    Small messages are encoded inline on the reactor thread, the thread
+    handoff costs more than the encoding. Larger messages are sent to a small
+    thread pool dedicated to the codec, so they don't compete with the
+    reactors thread pool.
+
+    """
+
+    DEFAULT_INLINE_THRESHOLD = 4 * 1024
+    DEFAULT_THREAD_POOL_SIZE = 4
+
+    def __init__(self):
+        self._inlineThreshold = self.DEFAULT_INLINE_THRESHOLD
+        self._threadPoolSize = self.DEFAULT_THREAD_POOL_SIZE
+        self._threadPool = None
+
+        self._inlineCount = 0
+        self._inlineBytes = 0
+        self._threadedCount = 0
+        self._threadedBytes = 0
+
+    def configure(self, inlineThreshold: int, threadPoolSize: int) -> None:
+        """Configure
+
+        :param inlineThreshold: Messages of up to this many bytes are encoded
+            or decoded on the reactor thread.
+        :param threadPoolSize: The maximum number of codec threads.
+
+        """
+        self._inlineThreshold = inlineThreshold
+        self._threadPoolSize = max(1, threadPoolSize)
+
+        if self._threadPool:
+            self._threadPool.adjustPoolsize(maxthreads=self._threadPoolSize)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return dict(
+            inlineCount=self._inlineCount,
+            inlineBytes=self._inlineBytes,
+            threadedCount=self._threadedCount,
+            threadedBytes=self._threadedBytes,
+        )
+
+    def run(
+        self, sizeHint: int, func: Callable[..., Any], *args, **kwargs
+    ) -> Deferred:
+        """Run
+
+        :param sizeHint: The approximate size of the message in bytes.
+        :param func: The function that encodes or decodes the message.
+
+        :return: A deferred that fires with the result of func.
+
+        """
+        if sizeHint <= self._inlineThreshold:
+            self._inlineCount += 1
+            self._inlineBytes += sizeHint
+            try:
+                return succeed(func(*args, **kwargs))
+
+            except Exception:
+                failure = Failure()
+                logger.error(failure.getTraceback())
+                return fail(failure)
+
+        return self.runInThreadPool(sizeHint, func, *args, **kwargs)
+
+    def runInThreadPool(
+        self, sizeHint: int, func: Callable[..., Any], *args, **kwargs
+    ) -> Deferred:
+        """Run In Thread Pool
+
+        Run func in the codec thread pool regardless of the size, this is used
+        for reading messages from shared memory.
+
+        :param sizeHint: The approximate size of the message in bytes.
+        :param func: The function that reads or decodes the message.
+
+        :return: A deferred that fires with the result of func.
+
+        """
+        self._threadedCount += 1
+        self._threadedBytes += sizeHint
+
+        d = threads.deferToThreadPool(
+            reactor, self._startedThreadPool(), func, *args, **kwargs
+        )
+        d.addErrback(self._logFailure)
+        return d
+
+    def _logFailure(self, failure: Failure) -> Failure:
+        logger.error(failure.getTraceback())
+        return failure
+
+    def _startedThreadPool(self) -> ThreadPool:
+        if not self._threadPool:
+            self._threadPool = ThreadPool(
+                minthreads=0,
+                maxthreads=self._threadPoolSize,
+                name="subproc codec",
+            )
+            self._threadPool.start()
+            reactor.addSystemEventTrigger(
+                "during", "shutdown", self._threadPool.stop
+            )
+
+        return self._threadPool
+
+
+# There is one codec per process, the parent configures it from the config
+# file, the subprocesses are configured from the PluginSubprocPlatformConfigTuple
+pluginSubprocCodec = PluginSubprocCodec()
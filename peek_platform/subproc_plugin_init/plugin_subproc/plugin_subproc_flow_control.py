@@ -0,0 +1,137 @@
+import logging
+import time
+from collections import deque
+from typing import Callable
+from typing import Optional
+
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import succeed
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
+
+
+logger = logging.getLogger(__name__)
+
+
+@implementer(IPushProducer)
+class PluginSubprocFlowControl:
+    """Plugin Subprocess Flow Control
+
+    This class is registered as the producer for a pipe to or from a plugin
+    subprocess. Twisted pauses it when the pipes write buffer is full and
+    resumes it when the buffer has drained.
+
+    Writers yield `waitUntilWritable()` before encoding and writing each
+    message, so while the pipe is paused messages wait un-encoded, in order,
+    instead of growing the write buffer.
+
+    """
+
+    # Log when a pipe has been paused for longer than this
+    SATURATED_LOG_SECONDS = 5.0
+
+    def __init__(
+        self,
+        name: str,
+        onPause: Optional[Callable[[], None]] = None,
+        onResume: Optional[Callable[[], None]] = None,
+    ):
+        """Constructor
+
+        :param name: The name of the pipe, for logging.
+        :param onPause: Called when the pipe is paused, use this to stop
+            reading more work.
+        :param onResume: Called when the pipe is resumed.
+
+        """
+        self._name = name
+        self._onPause = onPause
+        self._onResume = onResume
+
+        self._paused = False
+        self._stopped = False
+        self._waitingDeferreds = deque()
+
+        self._pauseCount = 0
+        self._pausedSeconds = 0.0
+        self._pausedTime = None
+        self._maxQueueDepth = 0
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @property
+    def queueDepth(self) -> int:
+        return len(self._waitingDeferreds)
+
+    @property
+    def stats(self) -> dict:
+        pausedSeconds = self._pausedSeconds
+        if self._pausedTime is not None:
+            pausedSeconds += time.monotonic() - self._pausedTime
+
+        return dict(
+            paused=self._paused,
+            pauseCount=self._pauseCount,
+            pausedSeconds=pausedSeconds,
+            queueDepth=self.queueDepth,
+            maxQueueDepth=self._maxQueueDepth,
+        )
+
+    def waitUntilWritable(self) -> Deferred:
+        if not self._paused and not self._waitingDeferreds:
+            return succeed(None)
+
+        d = Deferred()
+        self._waitingDeferreds.append(d)
+        self._maxQueueDepth = max(self._maxQueueDepth, self.queueDepth)
+        return d
+
+    def pauseProducing(self) -> None:
+        if self._paused or self._stopped:
+            return
+
+        self._paused = True
+        self._pauseCount += 1
+        self._pausedTime = time.monotonic()
+
+        if self._onPause:
+            self._onPause()
+
+    def resumeProducing(self) -> None:
+        if not self._paused:
+            return
+
+        self._paused = False
+        pausedSeconds = time.monotonic() - self._pausedTime
+        self._pausedSeconds += pausedSeconds
+        self._pausedTime = None
+
+        if self.SATURATED_LOG_SECONDS <= pausedSeconds:
+            logger.info(
+                "%s was saturated for %.1fs, %s messages are waiting",
+                self._name,
+                pausedSeconds,
+                self.queueDepth,
+            )
+
+        if self._onResume:
+            self._onResume()
+
+        # Release the writers in order, until a write fills the pipe again
+        while self._waitingDeferreds and not self._paused:
+            self._waitingDeferreds.popleft().callback(None)
+
+    def stopProducing(self) -> None:
+        """Stop Producing
+
+        The pipe has closed, release the writers, their writes are discarded.
+
+        """
+        self._stopped = True
+        self._paused = False
+        self._pausedTime = None
+
+        while self._waitingDeferreds:
+            self._waitingDeferreds.popleft().callback(None)
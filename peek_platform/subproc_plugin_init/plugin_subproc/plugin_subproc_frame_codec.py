@@ -0,0 +1,156 @@
+import struct
+from typing import List
+from typing import Tuple
+from typing import Union
+
+# Each frame is a fixed size header followed by the raw payload bytes.
+# The header is the frame type (1 byte) and the payload length (4 bytes),
+# both in network byte order.
+_FRAME_HEADER = struct.Struct("!BI")
+FRAME_HEADER_SIZE = _FRAME_HEADER.size
+
+# The payload is a JSON encoded tuple
+FRAME_TYPE_DATA = 0
+
+# The payload describes a JSON encoded tuple placed in shared memory
+FRAME_TYPE_SHARED_MEMORY = 1
+
+# The payload is the name of a shared memory segment the receiver has read,
+# sent back on the pipe in the opposite direction.
+FRAME_TYPE_SHARED_MEMORY_ACK = 2
+
+# A header claiming a larger payload than this means the stream is corrupt.
+DEFAULT_MAX_FRAME_SIZE = 1024 * 1024 * 1024
+
+FrameBytes = Union[bytes, bytearray]
+
+
+def encodeFrameHeader(
+    payloadSize: int, frameType: int = FRAME_TYPE_DATA
+) -> bytes:
+    """Encode Frame Header
+
+    Write this to the pipe, followed by the payload, to send a frame.
+    Writing the header and payload separately avoids concatenating
+    large payloads.
+
+    """
+    return _FRAME_HEADER.pack(frameType, payloadSize)
+
+
+def encodeFrame(payload: FrameBytes, frameType: int = FRAME_TYPE_DATA) -> bytes:
+    return encodeFrameHeader(len(payload), frameType) + payload
+
+
+class PluginSubprocFrameError(Exception):
+    """Plugin Subprocess Frame Error
+
+    Raised when a frame header can not be valid. A length prefixed stream can
+    not be resynchronised after this, the pipe must be discarded.
+
+    """
+
+
+class PluginSubprocFrameReader:
+    """Plugin Subprocess Frame Reader
+
+    This class reassembles length prefixed frames from the chunks read from
+    a pipe.
+
+    The headers are unpacked directly from a memoryview of the chunk, so data
+    is never rescanned. Every payload byte is copied exactly once, either
+    sliced out of the chunk when the frame is complete, or into a buffer
+    preallocated to the frame size when the frame spans several chunks.
+
+    """
+
+    def __init__(self, maxFrameSize: int = DEFAULT_MAX_FRAME_SIZE):
+        self._maxFrameSize = maxFrameSize
+        self._header = bytearray()
+
+        self._partialFrame = None
+        self._partialFrameType = None
+        self._partialFrameFilled = 0
+
+    @property
+    def hasPartialFrame(self) -> bool:
+        return bool(self._header) or self._partialFrame is not None
+
+    def feed(self, data: bytes) -> List[Tuple[int, FrameBytes]]:
+        """Feed
+
+        :param data: The next chunk of data read from the pipe.
+
+        :return: A list of (frameType, payload) for every frame completed by
+            this chunk, in the order they were sent.
+
+        """
+        frames = []
+
+        with memoryview(data) as view:
+            offset = 0
+            end = len(view)
+
+            while offset < end:
+                # Continue filling a frame that spans chunks
+                if self._partialFrame is not None:
+                    frameSize = len(self._partialFrame)
+                    filled = self._partialFrameFilled
+                    take = min(frameSize - filled, end - offset)
+
+                    self._partialFrame[filled : filled + take] = view[
+                        offset : offset + take
+                    ]
+                    self._partialFrameFilled += take
+                    offset += take
+
+                    if self._partialFrameFilled == frameSize:
+                        frames.append(
+                            (self._partialFrameType, self._partialFrame)
+                        )
+                        self._partialFrame = None
+                        self._partialFrameType = None
+                        self._partialFrameFilled = 0
+
+                    continue
+
+                # Read the header, it may have been split across chunks
+                if self._header or end - offset < FRAME_HEADER_SIZE:
+                    take = min(
+                        FRAME_HEADER_SIZE - len(self._header), end - offset
+                    )
+                    self._header += view[offset : offset + take]
+                    offset += take
+
+                    if len(self._header) < FRAME_HEADER_SIZE:
+                        break
+
+                    frameType, payloadSize = _FRAME_HEADER.unpack(self._header)
+                    self._header.clear()
+
+                else:
+                    frameType, payloadSize = _FRAME_HEADER.unpack_from(
+                        view, offset
+                    )
+                    offset += FRAME_HEADER_SIZE
+
+                if self._maxFrameSize < payloadSize:
+                    raise PluginSubprocFrameError(
+                        "Frame of %s bytes exceeds the maximum of %s bytes"
+                        % (payloadSize, self._maxFrameSize)
+                    )
+
+                # The whole payload is in this chunk
+                if payloadSize <= end - offset:
+                    frames.append(
+                        (frameType, bytes(view[offset : offset + payloadSize]))
+                    )
+                    offset += payloadSize
+                    continue
+
+                # Otherwise, preallocate the frame and fill it as chunks arrive
+                self._partialFrame = bytearray(payloadSize)
+                self._partialFrameType = frameType
+                self._partialFrameFilled = 0
+
+        return frames
@@ -0,0 +1,72 @@
+from collections import deque
+from typing import Callable
+
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import inlineCallbacks
+from twisted.python.failure import Failure
+
+
+class PluginSubprocOrderedWriter:
+    """Plugin Subprocess Ordered Writer
+
+    Messages are encoded inline or in the codec thread pool depending on
+    their size, so a small message can finish encoding before a larger one
+    that was sent first.
+
+    This class keeps the encode deferreds for one pipe in a queue and writes
+    each encoded message only after every earlier message has been written.
+
+    """
+
+    def __init__(self, name: str, writeFunc: Callable[[bytes], None]):
+        """Constructor
+
+        :param name: The name of the pipe, for logging.
+        :param writeFunc: Called with each encoded message, in order.
+
+        """
+        self._name = name
+        self._writeFunc = writeFunc
+        self._queue = deque()
+        self._writeLoopRunning = False
+
+    @property
+    def queueDepth(self) -> int:
+        return len(self._queue)
+
+    def write(self, encodeDeferred: Deferred) -> Deferred:
+        """Write
+
+        :param encodeDeferred: A deferred that fires with the encoded message.
+
+        :return: A deferred that fires once the message has been written.
+
+        """
+        writtenDeferred = Deferred()
+        self._queue.append((encodeDeferred, writtenDeferred))
+
+        if not self._writeLoopRunning:
+            self._writeQueuedMessages()
+
+        return writtenDeferred
+
+    @inlineCallbacks
+    def _writeQueuedMessages(self):
+        self._writeLoopRunning = True
+        try:
+            while self._queue:
+                encodeDeferred, writtenDeferred = self._queue.popleft()
+                try:
+                    encodedMessage = yield encodeDeferred
+                    self._writeFunc(encodedMessage)
+
+                except Exception:
+                    # Return the failure to the sender, later messages are
+                    # still written.
+                    writtenDeferred.errback(Failure())
+                    continue
+
+                writtenDeferred.callback(None)
+
+        finally:
+            self._writeLoopRunning = False
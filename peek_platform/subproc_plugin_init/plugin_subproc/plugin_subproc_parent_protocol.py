@@ -1,19 +1,27 @@
 import json
 import logging
 import os
-from base64 import b64decode
-from base64 import b64encode
+import time
+from collections import deque
+from itertools import count
+from typing import Callable
+from typing import Optional
 
 from twisted.internet import protocol
 from twisted.internet import task
 from twisted.internet.defer import Deferred
+from twisted.internet.defer import fail
 from twisted.internet.defer import inlineCallbacks
-from vortex.DeferUtil import deferToThreadWrapWithLogger
+from twisted.internet.defer import succeed
+from twisted.python.failure import Failure
 from vortex.VortexFactory import VortexFactory
 
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_child_state_protocol import (
     PluginSubprocChildStateProtocol,
 )
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_codec import (
+    pluginSubprocCodec,
+)
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
     LOGGING_FROM_CHILD_FD,
 )
@@ -29,6 +37,39 @@ from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants i
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
     VORTEX_UUID_TO_CHILD_FD,
 )
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    VORTEX_MSG_TO_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_flow_control import (
+    PluginSubprocFlowControl,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    FRAME_TYPE_DATA,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    FRAME_TYPE_SHARED_MEMORY,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    FRAME_TYPE_SHARED_MEMORY_ACK,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    PluginSubprocFrameError,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    PluginSubprocFrameReader,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_frame_codec import (
+    encodeFrameHeader,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_ordered_writer import (
+    PluginSubprocOrderedWriter,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_shared_memory import (
+    PluginSubprocSharedMemoryPool,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_shared_memory import (
+    readSharedMemoryPayload,
+)
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_vortex_msg_tuple import (
     PluginSubprocVortexMsgTuple,
 )
@@ -38,18 +79,59 @@ logger = logging.getLogger(__name__)
 
 
 class PluginSubprocParentProtocol(protocol.ProcessProtocol):
-    VORTEX_UUID_UPDATE_PERIOD = 30
-
-    def __init__(self, subprocessGroupName):
-        self._dataBytesArray = bytearray()
+    # Check for connected and disconnected vortexes this often
+    VORTEX_UUID_UPDATE_PERIOD = 1.0
+
+    # Send the complete list of vortexes this often, as a safety net
+    VORTEX_UUID_FULL_RESYNC_PERIOD = 300.0
+
+    # Stop reading vortex messages from the child when this many are waiting
+    # to be sent, and start again when the queue drains to the low water mark
+    VORTEX_MSG_FROM_CHILD_HIGH_WATER = 64
+    VORTEX_MSG_FROM_CHILD_LOW_WATER = 16
+
+    def __init__(
+        self,
+        subprocessGroupName,
+        sharedMemoryThreshold: int = 0,
+        processEndedCallback: Optional[Callable[[Failure], None]] = None,
+    ):
+        self._subprocessGroupName = subprocessGroupName
+        self._processEndedCallback = processEndedCallback
+        self._vortexMsgFrameReader = PluginSubprocFrameReader()
+        self._sharedMemoryPool = PluginSubprocSharedMemoryPool(
+            sharedMemoryThreshold
+        )
+        self._running = False
+        self._ready = False
+        self._readyDeferreds = []
+        self._vortexMsgDecodeQueue = deque()
+        self._vortexMsgSendLoopRunning = False
+
+        self._vortexMsgToChildFlowControl = PluginSubprocFlowControl(
+            f"Pipe to subprocess group {subprocessGroupName}"
+        )
+        self._vortexMsgToChildWriter = PluginSubprocOrderedWriter(
+            f"Pipe to subprocess group {subprocessGroupName}",
+            self._writeEncodedVortexMsgToChild,
+        )
+        self._vortexMsgFromChildFlowControl = PluginSubprocFlowControl(
+            f"Pipe from subprocess group {subprocessGroupName}",
+            onPause=self._stopReadingVortexMsgsFromChild,
+            onResume=self._startReadingVortexMsgsFromChild,
+        )
         self._logData = b""
         self._pluginStateData = b""
 
         self._vortexUpdateLoopingCall = task.LoopingCall(
             self._sendUpdatedVortexUuids
         )
+        self._sentVortexNameByUuid = {}
+        self._lastFullVortexUuidSyncTime = None
 
-        self._lastPluginStateCommandDeferred = None
+        # Many commands can be in flight, the child responds with the ID
+        self._pluginStateCommandIds = count(1)
+        self._pluginStateCommandDeferredsById = {}
 
         self._loggerForChild = logging.getLogger(
             f"subproc:{subprocessGroupName}"
@@ -70,9 +152,40 @@ class PluginSubprocParentProtocol(protocol.ProcessProtocol):
                 f"We didn't expect to get data from {childFD}"
             )
 
+    @property
+    def isRunning(self) -> bool:
+        return self._running
+
+    @property
+    def isReady(self) -> bool:
+        """Is Ready
+
+        :return: True once the child has setup the platform and is ready to
+            load plugins.
+
+        """
+        return self._running and self._ready
+
+    def whenReady(self) -> Deferred:
+        if self._ready:
+            return succeed(True)
+
+        d = Deferred()
+        self._readyDeferreds.append(d)
+        return d
+
     def connectionMade(self):
+        self._running = True
+        self.transport.registerProducer(self._vortexMsgToChildFlowControl, True)
         self._vortexUpdateLoopingCall.start(self.VORTEX_UUID_UPDATE_PERIOD)
 
+    @property
+    def flowControlStats(self) -> dict:
+        return dict(
+            toChild=self._vortexMsgToChildFlowControl.stats,
+            fromChild=self._vortexMsgFromChildFlowControl.stats,
+        )
+
     def inConnectionLost(self):
         """
         This will be called when stdin is closed.
@@ -81,23 +194,143 @@ class PluginSubprocParentProtocol(protocol.ProcessProtocol):
             self._vortexUpdateLoopingCall.stop()
             self._vortexUpdateLoopingCall = None
 
+    def processEnded(self, reason: Failure):
+        self._running = False
+
+        if (
+            self._vortexUpdateLoopingCall
+            and self._vortexUpdateLoopingCall.running
+        ):
+            self._vortexUpdateLoopingCall.stop()
+            self._vortexUpdateLoopingCall = None
+
+        # The child can no longer acknowledge any segments
+        self._sharedMemoryPool.close()
+
+        # The child will never respond to the commands in flight
+        commandDeferreds = list(self._pluginStateCommandDeferredsById.values())
+        commandDeferreds += self._readyDeferreds
+        self._pluginStateCommandDeferredsById = {}
+        self._readyDeferreds = []
+        for d in commandDeferreds:
+            d.errback(
+                Exception(
+                    f"Subprocess {self._subprocessGroupName} ended:"
+                    f" {reason.getErrorMessage()}"
+                )
+            )
+
+        if self._processEndedCallback:
+            self._processEndedCallback(reason)
+
     # ---------------------------------
     # Handle sending vortex uuid updates to subprocess
 
     @inlineCallbacks
     def _sendUpdatedVortexUuids(self):
-        encodedUuids = yield self._encodeVortexUuids()
-        self.transport.writeToChild(VORTEX_UUID_TO_CHILD_FD, encodedUuids)
-        self.transport.writeToChild(VORTEX_UUID_TO_CHILD_FD, b".")
+        """Send Updated Vortex UUIDs
+
+        Send only the vortexes that have connected or disconnected since the
+        last update, with a periodic full resync.
 
-    @deferToThreadWrapWithLogger(logger)
-    def _encodeVortexUuids(self):
-        remoteInfoTuples = [
-            [info.name, info.uuid]
+        """
+        vortexNameByUuid = {
+            info.uuid: info.name
             for info in VortexFactory.getRemoteClientVortexInfos()
-        ]
-        encodedUuids = b64encode(json.dumps(remoteInfoTuples).encode())
-        return encodedUuids
+        }
+
+        now = time.monotonic()
+        if (
+            self._lastFullVortexUuidSyncTime is None
+            or self.VORTEX_UUID_FULL_RESYNC_PERIOD
+            <= now - self._lastFullVortexUuidSyncTime
+        ):
+            self._lastFullVortexUuidSyncTime = now
+            encodedUuids = yield self._encodeVortexUuids(
+                dict(full=True, added=self._vortexInfoLists(vortexNameByUuid))
+            )
+
+        else:
+            sentVortexNameByUuid = self._sentVortexNameByUuid
+            added = {
+                uuid: name
+                for uuid, name in vortexNameByUuid.items()
+                if uuid not in sentVortexNameByUuid
+            }
+            removed = [
+                uuid
+                for uuid in sentVortexNameByUuid
+                if uuid not in vortexNameByUuid
+            ]
+
+            if not added and not removed:
+                return
+
+            encodedUuids = json.dumps(
+                dict(
+                    full=False,
+                    added=self._vortexInfoLists(added),
+                    removed=removed,
+                )
+            ).encode()
+
+        self._sentVortexNameByUuid = vortexNameByUuid
+        self.transport.writeToChild(
+            VORTEX_UUID_TO_CHILD_FD, encodeFrameHeader(len(encodedUuids))
+        )
+        self.transport.writeToChild(VORTEX_UUID_TO_CHILD_FD, encodedUuids)
+
+    def _vortexInfoLists(self, vortexNameByUuid: dict[str, str]):
+        return [[name, uuid] for uuid, name in vortexNameByUuid.items()]
+
+    def _encodeVortexUuids(self, update: dict) -> Deferred:
+        # Each vortex name and UUID is roughly this many bytes
+        sizeHint = 64 * len(update["added"])
+        return pluginSubprocCodec.run(
+            sizeHint, self._encodeVortexUuidsBlocking, update
+        )
+
+    def _encodeVortexUuidsBlocking(self, update: dict) -> bytes:
+        return json.dumps(update).encode()
+
+    # ---------------------------------
+    # Handle sending vortex messages to the subprocess
+
+    def waitUntilVortexMsgWritable(self) -> Deferred:
+        """Wait Until Vortex Message Writable
+
+        Yield this before encoding each message for the child, so messages
+        wait here while the child is not keeping up.
+
+        """
+        return self._vortexMsgToChildFlowControl.waitUntilWritable()
+
+    def writeVortexMsgToChild(self, encodeDeferred: Deferred) -> Deferred:
+        """Write Vortex Msg To Child
+
+        :param encodeDeferred: A deferred that fires with the encoded tuple.
+
+        :return: A deferred that fires once the tuple has been written, the
+            tuples are written in the order this is called.
+
+        """
+        return self._vortexMsgToChildWriter.write(encodeDeferred)
+
+    def _writeEncodedVortexMsgToChild(self, encodedTuple: bytes):
+        descriptor = self._sharedMemoryPool.write(encodedTuple)
+        if descriptor is None:
+            self.transport.writeSequence(
+                [encodeFrameHeader(len(encodedTuple)), encodedTuple]
+            )
+        else:
+            self.transport.writeSequence(
+                [
+                    encodeFrameHeader(
+                        len(descriptor), FRAME_TYPE_SHARED_MEMORY
+                    ),
+                    descriptor,
+                ]
+            )
 
     # ---------------------------------
     # Handle sending vortex messages from clients
@@ -128,41 +361,106 @@ class PluginSubprocParentProtocol(protocol.ProcessProtocol):
                 else:
                     self._loggerForChild.error(message)
 
-    @inlineCallbacks
     def outReceived(self, data):
-        self._dataBytesArray.append(data)
+        try:
+            frames = self._vortexMsgFrameReader.feed(data)
 
-        if b"." not in data:
+        except PluginSubprocFrameError as e:
+            # We can't find the start of the next frame, so stop reading
+            logger.error(
+                "Discarding the vortex message pipe from the subprocess: %s", e
+            )
+            self.transport.closeChildFD(VORTEX_MSG_FROM_CHILD_FD)
             return
 
-        # Avoid accidentally referencing this
-        del data
+        # Start the decoding now, so large messages decode in parallel.
+        # The messages are still sent in the order the child sent them.
+        for frameType, message in frames:
+            if frameType == FRAME_TYPE_SHARED_MEMORY_ACK:
+                self._sharedMemoryPool.release(message.decode())
+
+            elif frameType == FRAME_TYPE_SHARED_MEMORY:
+                d = self._readSharedMemoryPayload(message)
+                d.addCallback(self._ackSharedMemoryPayload)
+                d.addCallback(self._decodeVortexMsgTuple)
+                self._vortexMsgDecodeQueue.append(d)
+
+            elif frameType == FRAME_TYPE_DATA:
+                self._vortexMsgDecodeQueue.append(
+                    self._decodeVortexMsgTuple(message)
+                )
+
+            else:
+                logger.error(
+                    "Ignoring unknown frame type %s from the subprocess",
+                    frameType,
+                )
 
-        joinedData = bytes(self._dataBytesArray)
+        if self.VORTEX_MSG_FROM_CHILD_HIGH_WATER <= len(
+            self._vortexMsgDecodeQueue
+        ):
+            self._vortexMsgFromChildFlowControl.pauseProducing()
 
-        while b"." in joinedData:
-            message, joinedData = joinedData.split(b".", 1)
-            if not message:
-                continue
+        if not self._vortexMsgSendLoopRunning:
+            self._sendVortexMsgsFromChild()
 
-            yield self._sendVortexMsgFromChild(message)
+    def _stopReadingVortexMsgsFromChild(self):
+        self.transport.pipes[VORTEX_MSG_FROM_CHILD_FD].stopReading()
 
-        self._dataArray = bytearray(joinedData)
+    def _startReadingVortexMsgsFromChild(self):
+        self.transport.pipes[VORTEX_MSG_FROM_CHILD_FD].startReading()
 
     @inlineCallbacks
-    def _sendVortexMsgFromChild(self, message: bytes):
-        vortexMsgTuple = yield self._decodeVortexMsgTuple(message)
+    def _sendVortexMsgsFromChild(self):
+        self._vortexMsgSendLoopRunning = True
+        try:
+            while self._vortexMsgDecodeQueue:
+                try:
+                    d = self._vortexMsgDecodeQueue.popleft()
+                    if (
+                        len(self._vortexMsgDecodeQueue)
+                        <= self.VORTEX_MSG_FROM_CHILD_LOW_WATER
+                    ):
+                        self._vortexMsgFromChildFlowControl.resumeProducing()
+
+                    vortexMsgTuple = yield d
+
+                    yield VortexFactory.sendVortexMsg(
+                        vortexMsgs=vortexMsgTuple.vortexMsgs,
+                        destVortexUuid=vortexMsgTuple.vortexUuid,
+                    )
+
+                except Exception as e:
+                    logger.exception(e)
+
+        finally:
+            self._vortexMsgSendLoopRunning = False
+
+    def _decodeVortexMsgTuple(self, message: bytes) -> Deferred:
+        return pluginSubprocCodec.run(
+            len(message), self._decodeVortexMsgTupleBlocking, message
+        )
+
+    def _decodeVortexMsgTupleBlocking(self, message: bytes):
+        return PluginSubprocVortexMsgTuple().fromJsonDict(json.loads(message))
 
-        yield VortexFactory.sendVortexMsg(
-            vortexMsgs=vortexMsgTuple.vortexMsgs,
-            destVortexUuid=vortexMsgTuple.vortexUuid,
+    def _readSharedMemoryPayload(self, descriptor: bytes) -> Deferred:
+        # Copying the payload out of shared memory can be large, so it always
+        # runs in the codec thread pool.
+        return pluginSubprocCodec.runInThreadPool(
+            len(descriptor), readSharedMemoryPayload, descriptor
         )
 
-    @deferToThreadWrapWithLogger(logger)
-    def _decodeVortexMsgTuple(self, message: bytes):
-        return PluginSubprocVortexMsgTuple().fromJsonDict(
-            json.loads(b64decode(message).decode())
+    def _ackSharedMemoryPayload(self, result) -> bytes:
+        # Let the child reuse the segment as soon as we've copied it out
+        message, segmentName = result
+        segmentName = segmentName.encode()
+        self.transport.writeToChild(
+            VORTEX_MSG_TO_CHILD_FD,
+            encodeFrameHeader(len(segmentName), FRAME_TYPE_SHARED_MEMORY_ACK),
         )
+        self.transport.writeToChild(VORTEX_MSG_TO_CHILD_FD, segmentName)
+        return message
 
     # ---------------------------------
     # Handle the plugin state changes
@@ -187,20 +485,30 @@ class PluginSubprocParentProtocol(protocol.ProcessProtocol):
             pluginName, PluginSubprocChildStateProtocol.COMMAND_UNLOAD
         )
 
-    @inlineCallbacks
-    def _sendPluginStateCommand(self, pluginName: str, command: bytes):
-        assert not self._lastPluginStateCommandDeferred, (
-            "There is already a pending " "command"
+    def sendPluginImport(self, pluginName: str) -> Deferred:
+        return self._sendPluginStateCommand(
+            pluginName, PluginSubprocChildStateProtocol.COMMAND_IMPORT
         )
-        self._lastPluginStateCommandDeferred = Deferred()
+
+    def _sendPluginStateCommand(self, pluginName: str, command: str):
+        if not self._running:
+            return fail(
+                Exception(
+                    f"Subprocess {self._subprocessGroupName} is not running"
+                )
+            )
+
+        commandId = next(self._pluginStateCommandIds)
+
+        d = Deferred()
+        self._pluginStateCommandDeferredsById[commandId] = d
 
         self.transport.writeToChild(
-            PLUGIN_STATE_TO_CHILD_FD, f"{pluginName}:{command}".encode()
+            PLUGIN_STATE_TO_CHILD_FD,
+            f"{commandId}:{pluginName}:{command}\n".encode(),
         )
-        self.transport.writeToChild(PLUGIN_STATE_TO_CHILD_FD, b"\n")
 
-        yield self._lastPluginStateCommandDeferred
-        self._lastPluginStateCommandDeferred = None
+        return d
 
     def _pluginStateDataReceived(self, data):
         self._pluginStateData += data
@@ -212,20 +520,40 @@ class PluginSubprocParentProtocol(protocol.ProcessProtocol):
             if not message:
                 continue
 
-            if not self._lastPluginStateCommandDeferred:
-                error = (
-                    f"We got a result when we have no deferred to "
-                    f"call, result={message}"
-                )
-                logger.error(error)
-                raise Exception(error)
+            commandId, pluginName, result = message.decode().split(":", 2)
 
-            pluginName, result = message.decode().split(":", 1)
+            if commandId == PluginSubprocChildStateProtocol.EVENT_COMMAND_ID:
+                self._childEventReceived(result)
+                continue
+
+            d = self._pluginStateCommandDeferredsById.pop(int(commandId), None)
+            if not d:
+                logger.error(
+                    "We got a result when we have no deferred to "
+                    "call, result=%s",
+                    message,
+                )
+                continue
 
             if result == PluginSubprocChildStateProtocol.COMMAND_SUCCESS:
-                self._lastPluginStateCommandDeferred.callback(result)
+                d.callback(result)
 
             else:
-                self._lastPluginStateCommandDeferred.errback(result)
+                d.errback(
+                    Exception(f"Plugin {pluginName} command failed: {result}")
+                )
+
+    def _childEventReceived(self, event: str):
+        if event == PluginSubprocChildStateProtocol.EVENT_READY:
+            self._ready = True
+            readyDeferreds = self._readyDeferreds
+            self._readyDeferreds = []
+            for d in readyDeferreds:
+                d.callback(True)
 
-            self._lastPluginStateCommandDeferred = None
+        else:
+            logger.error(
+                "Subprocess %s sent an unknown event %s",
+                self._subprocessGroupName,
+                event,
+            )
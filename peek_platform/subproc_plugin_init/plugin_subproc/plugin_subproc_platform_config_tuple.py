@@ -10,3 +10,13 @@ class PluginSubprocPlatformConfigTuple(Tuple):
 
     serviceName: str = TupleField()
     subprocessGroup: str = TupleField()
+
+    # Each subprocess group can have several worker processes
+    workerIndex: int = TupleField()
+
+    # Zero disables the shared memory transport
+    sharedMemoryThreshold: int = TupleField()
+
+    # See PluginSubprocCodec.configure
+    codecInlineThreshold: int = TupleField()
+    codecThreadPoolSize: int = TupleField()
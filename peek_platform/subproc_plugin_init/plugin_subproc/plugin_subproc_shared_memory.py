@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+from itertools import count
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Segment names must be unique across every pool in the process
+_segmentNumbers = count(1)
+
+
+class PluginSubprocSharedMemoryPool:
+    """Plugin Subprocess Shared Memory Pool
+
+    This class places large payloads in shared memory segments, so only a
+    small descriptor is written to the pipe.
+
+    A segment is in use from when it's written until the receiver sends back
+    an acknowledgement, it's then returned to the pool for the next payload.
+    Segment sizes are rounded up to a power of two so they can be reused for
+    payloads of a similar size.
+
+    """
+
+    # Keep at most this many unused segments mapped
+    MAX_FREE_SEGMENTS = 4
+
+    def __init__(self, threshold: int):
+        """Constructor
+
+        :param threshold: Payloads larger than this many bytes are placed in
+            shared memory. Zero disables the pool.
+
+        """
+        self._threshold = threshold
+
+        self._freeSegments: list[SharedMemory] = []
+        self._inUseSegmentsByName: dict[str, SharedMemory] = {}
+
+    @property
+    def inUseCount(self) -> int:
+        return len(self._inUseSegmentsByName)
+
+    def write(self, payload: bytes) -> Optional[bytes]:
+        """Write
+
+        :param payload: The encoded payload to send.
+
+        :return: The descriptor to send in place of the payload, or None if
+            the payload should be sent through the pipe.
+
+        """
+        if not self._threshold or len(payload) <= self._threshold:
+            return None
+
+        try:
+            segment = self._takeSegment(len(payload))
+
+        except OSError as e:
+            # For example, /dev/shm is full, the pipe still works.
+            logger.warning(
+                "Failed to allocate %s bytes of shared memory, "
+                "sending through the pipe instead: %s",
+                len(payload),
+                e,
+            )
+            return None
+
+        segment.buf[: len(payload)] = payload
+        self._inUseSegmentsByName[segment.name] = segment
+
+        return json.dumps(dict(name=segment.name, size=len(payload))).encode()
+
+    def release(self, name: str) -> None:
+        """Release
+
+        Call this when the receiver acknowledges it has read the segment.
+
+        """
+        segment = self._inUseSegmentsByName.pop(name, None)
+        if not segment:
+            logger.error("Released unknown shared memory segment %s", name)
+            return
+
+        if len(self._freeSegments) < self.MAX_FREE_SEGMENTS:
+            self._freeSegments.append(segment)
+        else:
+            self._destroySegment(segment)
+
+    def close(self) -> None:
+        for segment in self._freeSegments:
+            self._destroySegment(segment)
+
+        for segment in self._inUseSegmentsByName.values():
+            self._destroySegment(segment)
+
+        self._freeSegments = []
+        self._inUseSegmentsByName = {}
+
+    def _takeSegment(self, size: int) -> SharedMemory:
+        # Use the smallest free segment that fits
+        fits = [s for s in self._freeSegments if size <= s.size]
+        if fits:
+            segment = min(fits, key=lambda s: s.size)
+            self._freeSegments.remove(segment)
+            return segment
+
+        # Segment names are limited to 31 characters on macOS
+        name = _segmentNamePrefix() + str(next(_segmentNumbers))
+        return SharedMemory(
+            name=name, create=True, size=1 << (size - 1).bit_length()
+        )
+
+    def _destroySegment(self, segment: SharedMemory) -> None:
+        try:
+            segment.close()
+            segment.unlink()
+
+        except (BufferError, OSError) as e:
+            logger.warning(
+                "Failed to remove shared memory segment %s: %s",
+                segment.name,
+                e,
+            )
+
+
+def _segmentNamePrefix() -> str:
+    return "peek%s_" % os.getpid()
+
+
+def _untrackSegment(segment: SharedMemory) -> None:
+    """Untrack Segment
+
+    Stop this processes resource tracker unlinking a segment when this
+    process exits. Opening a segment registers it with the resource tracker
+    on POSIX, there is no public way to stop this before Python 3.13's
+    `track=False`. The tracker registers the name with a leading "/".
+
+    """
+    if os.name == "nt":
+        return
+
+    resource_tracker.unregister("/" + segment.name, "shared_memory")
+
+
+def readSharedMemoryPayload(descriptor: bytes) -> (bytes, str):
+    """Read Shared Memory Payload
+
+    Copy a payload out of the shared memory segment the sender wrote it to.
+    This can be called from a thread.
+
+    :param descriptor: The descriptor returned from
+        `PluginSubprocSharedMemoryPool.write`
+
+    :return: A tuple of (payload, segmentName), send the segment name back
+        in an acknowledgement.
+
+    """
+    descriptor = json.loads(descriptor)
+    name = descriptor["name"]
+
+    segment = SharedMemory(name=name)
+
+    # The sender owns the segment, don't let this processes resource
+    # tracker unlink it when this process exits.
+    if not name.startswith(_segmentNamePrefix()):
+        _untrackSegment(segment)
+
+    try:
+        return bytes(segment.buf[: descriptor["size"]]), name
+
+    finally:
+        segment.close()
@@ -1,49 +1,19 @@
-import json
 import logging
-import os
-import sys
+from itertools import count
 
-from sqlalchemy.util import b64encode
-from twisted.internet import reactor
 from twisted.internet.defer import Deferred
-from twisted.internet.defer import inlineCallbacks
-from vortex.DeferUtil import deferToThreadWrapWithLogger
+from twisted.internet.defer import gatherResults
 from vortex.PayloadEndpoint import PayloadEndpoint
 from vortex.PayloadEnvelope import PayloadEnvelope
-from vortex.Tuple import Tuple
 
-from peek_platform.subproc_plugin_init.plugin_subproc import (
-    plugin_subproc_child_main,
-)
-from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
-    LOGGING_FROM_CHILD_FD,
-)
-from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
-    PLUGIN_STATE_FROM_CHILD_FD,
-)
-from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
-    PLUGIN_STATE_TO_CHILD_FD,
-)
-from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
-    VORTEX_MSG_FROM_CHILD_FD,
-)
-from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
-    VORTEX_MSG_TO_CHILD_FD,
-)
-from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
-    VORTEX_UUID_FROM_CHILD_FD,
-)
-from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
-    VORTEX_UUID_TO_CHILD_FD,
-)
-from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_parent_protocol import (
-    PluginSubprocParentProtocol,
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_codec import (
+    pluginSubprocCodec,
 )
 from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_platform_config_tuple import (
     PluginSubprocPlatformConfigTuple,
 )
-from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_vortex_payload_envelope_tuple import (
-    PluginSubprocVortexPayloadEnvelopeTuple,
+from peek_platform.subproc_plugin_init.plugin_subproc_parent_worker import (
+    PluginSubprocParentWorker,
 )
 from peek_plugin_base.PeekPlatformCommonHookABC import PeekPlatformCommonHookABC
 
@@ -57,6 +27,19 @@ class _NoKeycheckPayloadEndpoint(PayloadEndpoint):
 
 
 class PluginSubprocParentMain:
+    """Plugin Subprocess Parent Main
+
+    This class runs a subprocess group. The group has one or more worker
+    subprocesses, configured by subprocess.group.<name>.workerCount.
+
+    Every worker loads and starts every plugin in the group, and the payload
+    envelopes for the plugins are dispatched across the workers.
+
+    """
+
+    DISPATCH_BY_VORTEX_UUID = "vortexUuid"
+    DISPATCH_ROUND_ROBIN = "roundRobin"
+
     def __init__(self, subprocessGroup: str):
 
         from peek_platform import PeekPlatformConfig
@@ -64,42 +47,52 @@ class PluginSubprocParentMain:
         self._serviceName = PeekPlatformConfig.componentName
         self._subprocessGroup = subprocessGroup
 
-        self._processProtocol = PluginSubprocParentProtocol(
-            self._subprocessGroup
+        config = PeekPlatformConfig.config
+        pluginSubprocCodec.configure(
+            inlineThreshold=config.subprocessCodecInlineThreshold,
+            threadPoolSize=config.subprocessCodecThreadPoolSize,
         )
 
-        platformConfigTupleEncoded = b64encode(
-            json.dumps(
+        workerCount = max(1, config.subprocessGroupWorkerCount(subprocessGroup))
+        self._dispatch = config.subprocessGroupDispatch(subprocessGroup)
+        if self._dispatch not in (
+            self.DISPATCH_BY_VORTEX_UUID,
+            self.DISPATCH_ROUND_ROBIN,
+        ):
+            logger.warning(
+                "Subprocess group %s dispatch %s is not valid,"
+                " defaulting to %s",
+                subprocessGroup,
+                self._dispatch,
+                self.DISPATCH_BY_VORTEX_UUID,
+            )
+            self._dispatch = self.DISPATCH_BY_VORTEX_UUID
+
+        self._roundRobinIndexes = count()
+
+        self._workers = [
+            PluginSubprocParentWorker(
                 PluginSubprocPlatformConfigTuple(
                     serviceName=self._serviceName,
                     subprocessGroup=self._subprocessGroup,
-                ).toJsonDict()
-            ).encode()
+                    workerIndex=workerIndex,
+                    sharedMemoryThreshold=(
+                        config.subprocessSharedMemoryThreshold
+                    ),
+                    codecInlineThreshold=config.subprocessCodecInlineThreshold,
+                    codecThreadPoolSize=config.subprocessCodecThreadPoolSize,
+                ),
+                warmSpare=config.subprocessWarmSpare,
+            )
+            for workerIndex in range(workerCount)
+        ]
+
+        logger.debug(
+            "Spawned subprocess group %s with %s workers",
+            self._subprocessGroup,
+            workerCount,
         )
 
-        # Start the subprocess
-        self._processTransport = reactor.spawnProcess(
-            self._processProtocol,
-            sys.executable,
-            args=[
-                sys.executable,
-                plugin_subproc_child_main.__file__,
-                platformConfigTupleEncoded,
-            ],
-            env=os.environ,
-            path=os.path.dirname(plugin_subproc_child_main.__file__),
-            childFDs={
-                VORTEX_MSG_TO_CHILD_FD: "w",
-                VORTEX_MSG_FROM_CHILD_FD: "r",
-                LOGGING_FROM_CHILD_FD: "r",
-                VORTEX_UUID_TO_CHILD_FD: "w",
-                VORTEX_UUID_FROM_CHILD_FD: "r",
-                PLUGIN_STATE_TO_CHILD_FD: "w",
-                PLUGIN_STATE_FROM_CHILD_FD: "r",
-            },
-        )
-        logger.debug("Spawned subprocess group %s", self._subprocessGroup)
-
     def __call__(
         self,
         pluginName: str,
@@ -121,7 +114,6 @@ class PluginSubprocParentMain:
             pluginName, pluginRootDir, platform, self
         )
 
-    @inlineCallbacks
     def sendPayloadEnvelopeToChild(
         self,
         payloadEnvelope: PayloadEnvelope,
@@ -129,27 +121,86 @@ class PluginSubprocParentMain:
         vortexName: str,
         **kwargs
     ):
-        tuple_ = PluginSubprocVortexPayloadEnvelopeTuple(
-            payloadEnvelope=payloadEnvelope,
-            vortexUuid=vortexUuid,
-            vortexName=vortexName,
+        return self._workerForVortexUuid(vortexUuid).sendPayloadEnvelopeToChild(
+            payloadEnvelope, vortexUuid, vortexName
         )
-        encodedTuple = yield self._encodeTuple(tuple_)
-        self._processTransport.write(encodedTuple)
-        self._processTransport.write(b".")
 
-    @deferToThreadWrapWithLogger(logger)
-    def _encodeTuple(self, tuple_: Tuple) -> bytes:
-        return b64encode(json.dumps(tuple_.toJsonDict()).encode()).encode()
+    def _workerForVortexUuid(
+        self, vortexUuid: str
+    ) -> PluginSubprocParentWorker:
+        if len(self._workers) == 1:
+            return self._workers[0]
+
+        if self._dispatch == self.DISPATCH_ROUND_ROBIN:
+            # Skip workers that have died, until they are restarted
+            workers = [w for w in self._workers if w.isRunning] or self._workers
+            return workers[next(self._roundRobinIndexes) % len(workers)]
+
+        # Messages from one vortex go to one worker, so they stay in order.
+        # Hash over every worker, so when one dies the other vortexes keep
+        # their worker, the dead worker buffers its payloads until it's
+        # respawned.
+        worker = self._workers[hash(vortexUuid) % len(self._workers)]
+        if not worker.isFailed:
+            return worker
+
+        # A failed worker isn't respawned, move its vortexes to the others
+        workers = [w for w in self._workers if not w.isFailed] or self._workers
+        return workers[hash(vortexUuid) % len(workers)]
+
+    @property
+    def workers(self) -> list[PluginSubprocParentWorker]:
+        return list(self._workers)
+
+    @property
+    def flowControlStats(self) -> dict:
+        return {w.name: w.flowControlStats for w in self._workers}
+
+    @property
+    def workerStats(self) -> dict:
+        return {w.name: w.stats for w in self._workers}
+
+    @property
+    def processStats(self) -> dict:
+        """Process Stats
+
+        :return: The CPU and memory use of each worker subprocess, and the
+            total for the group.
+
+        """
+        statsByWorkerName = {w.name: w.processStats for w in self._workers}
+        stats = list(statsByWorkerName.values())
+
+        return dict(
+            workers=statsByWorkerName,
+            cpuPercent=sum(s.get("cpuPercent", 0) for s in stats),
+            rssBytes=sum(s.get("rssBytes", 0) for s in stats),
+        )
+
+    def shutdown(self) -> None:
+        """Shutdown
+
+        Stop the worker subprocesses, this is called when the last plugin in
+        the group is unloaded.
+
+        """
+        for worker in self._workers:
+            worker.shutdown()
 
     def sendPluginLoad(self, pluginName: str) -> Deferred:
-        return self._processProtocol.sendPluginLoad(pluginName)
+        return self._sendToAllWorkers("sendPluginLoad", pluginName)
 
     def sendPluginStart(self, pluginName: str) -> Deferred:
-        return self._processProtocol.sendPluginStart(pluginName)
+        return self._sendToAllWorkers("sendPluginStart", pluginName)
 
     def sendPluginStop(self, pluginName: str) -> Deferred:
-        return self._processProtocol.sendPluginStop(pluginName)
+        return self._sendToAllWorkers("sendPluginStop", pluginName)
 
     def sendPluginUnload(self, pluginName: str) -> Deferred:
-        return self._processProtocol.sendPluginUnload(pluginName)
+        return self._sendToAllWorkers("sendPluginUnload", pluginName)
+
+    def _sendToAllWorkers(self, methodName: str, pluginName: str) -> Deferred:
+        return gatherResults(
+            [getattr(w, methodName)(pluginName) for w in self._workers],
+            consumeErrors=True,
+        )
@@ -81,46 +81,82 @@ class PluginSubprocParentMainDelegate(PluginCommonEntryHookABC):
         self._serviceName = PeekPlatformConfig.componentName
 
         self._pluginEndpoint = None
+        self._started = False
 
     @inlineCallbacks
     def load(self) -> None:
-
-        yield self._subprocessGroupMain.sendPluginLoad(self._pluginName)
-        logger.debug("Loaded Standalone Plugin %s", self._pluginName)
-
-    @inlineCallbacks
-    def start(self) -> None:
         from peek_platform import PeekPlatformConfig
 
-        yield self._subprocessGroupMain.sendPluginStart(self._pluginName)
+        yield self._subprocessGroupMain.sendPluginLoad(self._pluginName)
 
+        # Create the endpoint while loading, so the plugin loader records it,
+        # and drains and refuses its payloads like any other plugin endpoint.
         self._pluginEndpoint = _NoKeycheckPayloadEndpoint(
             dict(plugin=self._pluginName),
-            self._subprocessGroupMain.sendPayloadEnvelopeToChild,
+            self._sendPayloadEnvelopeToChild,
             ignoreFromVortex=(peekServerName, PeekPlatformConfig.componentName),
         )
 
+        logger.debug("Loaded Standalone Plugin %s", self._pluginName)
+
+    @inlineCallbacks
+    def start(self) -> None:
+        yield self._subprocessGroupMain.sendPluginStart(self._pluginName)
+        self._started = True
         logger.debug("Started Standalone Plugin %s", self._pluginName)
 
     @inlineCallbacks
     def stop(self) -> None:
-        yield None
+        self._started = False
+        yield self._subprocessGroupMain.sendPluginStop(self._pluginName)
+        logger.debug("Stopped Standalone Plugin %s", self._pluginName)
 
+    @inlineCallbacks
+    def unload(self) -> None:
         if self._pluginEndpoint:
             yield self._pluginEndpoint.shutdown()
             self._pluginEndpoint = None
 
-        # yield self._subprocessGroupMain.sendPluginStop(self._pluginName)
-        # logger.debug("Stopped Standalone Plugin %s", self._pluginName)
-        logger.debug(
-            "Standalone Plugin %s doesn't support stopping", self._pluginName
+        yield self._subprocessGroupMain.sendPluginUnload(self._pluginName)
+        logger.debug("Unloaded Standalone Plugin %s", self._pluginName)
+
+    def _sendPayloadEnvelopeToChild(
+        self,
+        payloadEnvelope: PayloadEnvelope,
+        vortexUuid: str,
+        vortexName: str,
+        **kwargs
+    ):
+        # The plugin only has its endpoints in the subprocess while started
+        if not self._started:
+            self._respondNotStarted(payloadEnvelope, kwargs.get("sendResponse"))
+            return None
+
+        return self._subprocessGroupMain.sendPayloadEnvelopeToChild(
+            payloadEnvelope, vortexUuid, vortexName, **kwargs
         )
 
-    @inlineCallbacks
-    def unload(self) -> None:
-        yield None
-        # yield self._subprocessGroupMain.sendPluginUnload(self._pluginName)
-        # logger.debug("Unloaded Standalone Plugin %s", self._pluginName)
-        logger.debug(
-            "Standalone Plugin %s doesn't support unloading", self._pluginName
+    def _respondNotStarted(
+        self, payloadEnvelope: PayloadEnvelope, sendResponse
+    ) -> None:
+        logger.warning(
+            "Standalone Plugin %s is not started, refused payload %s",
+            self._pluginName,
+            payloadEnvelope.filt,
         )
+
+        if not sendResponse:
+            return
+
+        # Respond with an error, like PayloadIO does when an endpoint fails
+        try:
+            sendResponse(
+                PayloadEnvelope(
+                    filt=payloadEnvelope.filt,
+                    result="Plugin %s is not started, try again"
+                    % self._pluginName,
+                ).toVortexMsg()
+            )
+
+        except Exception as e:
+            logger.exception(e)
@@ -0,0 +1,578 @@
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+
+import psutil
+from sqlalchemy.util import b64encode
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import succeed
+from twisted.python.failure import Failure
+from vortex.PayloadEnvelope import PayloadEnvelope
+from vortex.Tuple import Tuple
+
+from peek_platform.subproc_plugin_init.plugin_subproc import (
+    plugin_subproc_child_main,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_codec import (
+    pluginSubprocCodec,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    LOGGING_FROM_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    PLUGIN_STATE_FROM_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    PLUGIN_STATE_TO_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    VORTEX_MSG_FROM_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    VORTEX_MSG_TO_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    VORTEX_UUID_FROM_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_constants import (
+    VORTEX_UUID_TO_CHILD_FD,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_parent_protocol import (
+    PluginSubprocParentProtocol,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_platform_config_tuple import (
+    PluginSubprocPlatformConfigTuple,
+)
+from peek_platform.subproc_plugin_init.plugin_subproc.plugin_subproc_vortex_payload_envelope_tuple import (
+    PluginSubprocVortexPayloadEnvelopeTuple,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class PluginSubprocParentWorker:
+    """Plugin Subprocess Parent Worker
+
+    This class runs one subprocess for a subprocess group. Each worker has
+    its own pipes, and loads and starts every plugin in the group.
+
+    The worker supervises its subprocess. If the subprocess exits, it's
+    respawned with an exponential backoff and the plugins are loaded and
+    started again. Payload envelopes received in the meantime are buffered,
+    up to a limit, then rejected.
+
+    The worker gives up, and is failed, if a plugin fails to load or start,
+    or if the respawned subprocess keeps dying before its plugins are loaded.
+    A failed worker rejects its payload envelopes until it's restarted.
+
+    With a warm spare, the worker keeps a second subprocess that has already
+    imported the platform, setup the config and imported the plugin
+    packages. When the subprocess exits, the spare replaces it, so only the
+    plugins need to be loaded and started.
+
+    """
+
+    # The delay before the first respawn, this doubles for each failure
+    RESPAWN_BACKOFF_INITIAL = 0.5
+    RESPAWN_BACKOFF_MAX = 30.0
+
+    # A subprocess that ran this long is healthy, reset the backoff
+    RESPAWN_BACKOFF_RESET_SECONDS = 60.0
+
+    # Reject payload envelopes beyond this while the subprocess is down
+    MAX_BUFFERED_PAYLOADS = 1000
+
+    # Give up after this many respawns in a row die before loading plugins
+    MAX_FAILED_RESPAWNS = 5
+
+    # Wait this long before replacing a spare that exited
+    SPARE_RESPAWN_DELAY = 5.0
+
+    def __init__(
+        self,
+        platformConfigTuple: PluginSubprocPlatformConfigTuple,
+        warmSpare: bool = False,
+    ):
+        self._platformConfigTuple = platformConfigTuple
+        self._name = "%s:%s" % (
+            platformConfigTuple.subprocessGroup,
+            platformConfigTuple.workerIndex,
+        )
+
+        # The plugins to load and start again if this worker is restarted
+        self._loadedPluginNames = []
+        self._startedPluginNames = []
+
+        self._processProtocol = None
+        self._processTransport = None
+        self._psutilProcess = None
+
+        self._warmSpare = warmSpare
+        self._spareProtocol = None
+        self._spareTransport = None
+        self._spareRespawnCall = None
+
+        # Supervisor state
+        self._available = False
+        self._shuttingDown = False
+        self._respawnCall = None
+        self._spawnedTime = None
+        self._downSinceTime = None
+        self._consecutiveFailures = 0
+        self._failedRespawnCount = 0
+        self._failed = False
+        self._bufferedPayloads = deque()
+
+        # Supervisor stats
+        self._restartCount = 0
+        self._warmRestartCount = 0
+        self._downtimeSeconds = 0.0
+        self._rejectedPayloadCount = 0
+
+        self._shutdownTriggerId = reactor.addSystemEventTrigger(
+            "before", "shutdown", self._shutdownFromReactor
+        )
+
+        self._processProtocol, self._processTransport = self._spawnProcess()
+        self._spawnedTime = time.monotonic()
+        self._available = True
+
+        if self._warmSpare:
+            self._spawnSpare()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def isRunning(self) -> bool:
+        """Is Running
+
+        :return: True if the subprocess is running and has loaded and
+            started its plugins.
+
+        """
+        return self._available and self._processProtocol.isRunning
+
+    @property
+    def isFailed(self) -> bool:
+        """Is Failed
+
+        :return: True if the worker gave up respawning its subprocess.
+
+        """
+        return self._failed
+
+    @property
+    def flowControlStats(self) -> dict:
+        return self._processProtocol.flowControlStats
+
+    @property
+    def stats(self) -> dict:
+        downtimeSeconds = self._downtimeSeconds
+        if self._downSinceTime is not None:
+            downtimeSeconds += time.monotonic() - self._downSinceTime
+
+        return dict(
+            isRunning=self.isRunning,
+            isFailed=self._failed,
+            restartCount=self._restartCount,
+            warmRestartCount=self._warmRestartCount,
+            downtimeSeconds=downtimeSeconds,
+            bufferedPayloadCount=len(self._bufferedPayloads),
+            rejectedPayloadCount=self._rejectedPayloadCount,
+        )
+
+    @property
+    def processStats(self) -> dict:
+        """Process Stats
+
+        :return: The CPU and memory use of the subprocess.
+
+        """
+        pid = getattr(self._processTransport, "pid", None)
+        if not pid or not self._processProtocol.isRunning:
+            return dict(pid=None)
+
+        try:
+            # cpu_percent is measured since the previous call for the process
+            if not self._psutilProcess or self._psutilProcess.pid != pid:
+                self._psutilProcess = psutil.Process(pid)
+                self._psutilProcess.cpu_percent()
+
+            process = self._psutilProcess
+            with process.oneshot():
+                cpuTimes = process.cpu_times()
+                return dict(
+                    pid=pid,
+                    cpuPercent=process.cpu_percent(),
+                    cpuUserSeconds=cpuTimes.user,
+                    cpuSystemSeconds=cpuTimes.system,
+                    rssBytes=process.memory_info().rss,
+                    threadCount=process.num_threads(),
+                )
+
+        except psutil.Error:
+            return dict(pid=pid)
+
+    def _spawnProcess(self):
+        processProtocol = PluginSubprocParentProtocol(
+            self._name,
+            sharedMemoryThreshold=(
+                self._platformConfigTuple.sharedMemoryThreshold
+            ),
+            processEndedCallback=(
+                lambda reason: self._processEnded(processProtocol, reason)
+            ),
+        )
+
+        platformConfigTupleEncoded = b64encode(
+            json.dumps(self._platformConfigTuple.toJsonDict()).encode()
+        )
+
+        # Start the subprocess
+        processTransport = reactor.spawnProcess(
+            processProtocol,
+            sys.executable,
+            args=[
+                sys.executable,
+                plugin_subproc_child_main.__file__,
+                platformConfigTupleEncoded,
+            ],
+            env=os.environ,
+            path=os.path.dirname(plugin_subproc_child_main.__file__),
+            childFDs={
+                VORTEX_MSG_TO_CHILD_FD: "w",
+                VORTEX_MSG_FROM_CHILD_FD: "r",
+                LOGGING_FROM_CHILD_FD: "r",
+                VORTEX_UUID_TO_CHILD_FD: "w",
+                VORTEX_UUID_FROM_CHILD_FD: "r",
+                PLUGIN_STATE_TO_CHILD_FD: "w",
+                PLUGIN_STATE_FROM_CHILD_FD: "r",
+            },
+        )
+        logger.debug("Spawned subprocess worker %s", self._name)
+        return processProtocol, processTransport
+
+    @inlineCallbacks
+    def _spawnSpare(self):
+        self._spareRespawnCall = None
+        self._spareProtocol, self._spareTransport = self._spawnProcess()
+        spareProtocol = self._spareProtocol
+
+        try:
+            yield spareProtocol.whenReady()
+
+            # Importing the packages is most of the plugin load time.
+            # Plugins loaded from now on are imported by sendPluginLoad
+            for pluginName in list(self._loadedPluginNames):
+                yield spareProtocol.sendPluginImport(pluginName)
+
+        except Exception as e:
+            if self._shuttingDown:
+                return
+
+            logger.warning(
+                "Spare subprocess for worker %s failed to warm up: %s",
+                self._name,
+                e,
+            )
+
+    @inlineCallbacks
+    def _importPluginInSpare(self, pluginName: str):
+        spareProtocol = self._spareProtocol
+        if not (spareProtocol and spareProtocol.isReady):
+            return
+
+        try:
+            yield spareProtocol.sendPluginImport(pluginName)
+
+        except Exception as e:
+            if self._shuttingDown:
+                return
+
+            logger.warning(
+                "Spare subprocess for worker %s failed to import %s: %s",
+                self._name,
+                pluginName,
+                e,
+            )
+
+    def restart(self):
+        """Restart
+
+        Kill this worker's subprocess, the supervisor will respawn it.
+        This also restarts a failed worker.
+
+        """
+        self._failed = False
+        self._failedRespawnCount = 0
+
+        if self._processProtocol.isRunning:
+            self._processTransport.signalProcess("KILL")
+
+        elif not self._respawnCall:
+            self._respawnCall = reactor.callLater(0, self._respawn)
+
+    def _shutdownFromReactor(self):
+        # The reactor has fired the trigger, there is nothing to remove
+        self._shutdownTriggerId = None
+        self.shutdown()
+
+    def shutdown(self):
+        """Shutdown
+
+        Stop supervising and stop the subprocess, this is called when the
+        reactor shuts down.
+
+        """
+        self._shuttingDown = True
+        self._available = False
+
+        if self._shutdownTriggerId:
+            reactor.removeSystemEventTrigger(self._shutdownTriggerId)
+            self._shutdownTriggerId = None
+
+        for call in (self._respawnCall, self._spareRespawnCall):
+            if call and call.active():
+                call.cancel()
+
+        if self._processProtocol.isRunning:
+            self._processTransport.signalProcess("TERM")
+
+        if self._spareProtocol and self._spareProtocol.isRunning:
+            self._spareTransport.signalProcess("TERM")
+
+    def _processEnded(
+        self, processProtocol: PluginSubprocParentProtocol, reason: Failure
+    ):
+        if self._shuttingDown or self._failed:
+            return
+
+        if processProtocol is self._spareProtocol:
+            logger.error(
+                "Spare subprocess for worker %s ended: %s",
+                self._name,
+                reason.getErrorMessage(),
+            )
+            self._spareProtocol, self._spareTransport = None, None
+            self._spareRespawnCall = reactor.callLater(
+                self.SPARE_RESPAWN_DELAY, self._spawnSpare
+            )
+            return
+
+        if processProtocol is not self._processProtocol:
+            return
+
+        now = time.monotonic()
+        if self.RESPAWN_BACKOFF_RESET_SECONDS <= now - self._spawnedTime:
+            self._consecutiveFailures = 0
+
+        delay = min(
+            self.RESPAWN_BACKOFF_MAX,
+            self.RESPAWN_BACKOFF_INITIAL * 2**self._consecutiveFailures,
+        )
+
+        # The first respawn with a warm spare is immediate
+        spareIsReady = self._spareProtocol and self._spareProtocol.isReady
+        if spareIsReady and not self._consecutiveFailures:
+            delay = 0
+
+        self._consecutiveFailures += 1
+
+        if self._downSinceTime is None:
+            self._downSinceTime = now
+        self._available = False
+
+        logger.error(
+            "Subprocess worker %s ended, respawning in %.1fs: %s",
+            self._name,
+            delay,
+            reason.getErrorMessage(),
+        )
+
+        self._respawnCall = reactor.callLater(delay, self._respawn)
+
+    @inlineCallbacks
+    def _respawn(self):
+        self._respawnCall = None
+
+        if self._spareProtocol and self._spareProtocol.isReady:
+            self._processProtocol = self._spareProtocol
+            self._processTransport = self._spareTransport
+            self._spareProtocol, self._spareTransport = None, None
+            self._warmRestartCount += 1
+
+        else:
+            if self._spareProtocol:
+                # It's not ready yet, don't wait for it
+                self._spareTransport.signalProcess("KILL")
+                self._spareProtocol, self._spareTransport = None, None
+
+            self._processProtocol, self._processTransport = self._spawnProcess()
+
+        self._spawnedTime = time.monotonic()
+
+        if self._warmSpare and not self._spareRespawnCall:
+            self._spawnSpare()
+
+        try:
+            for pluginName in self._loadedPluginNames:
+                yield self._processProtocol.sendPluginLoad(pluginName)
+
+            for pluginName in self._startedPluginNames:
+                yield self._processProtocol.sendPluginStart(pluginName)
+
+        except Exception as e:
+            logger.error(
+                "Subprocess worker %s failed to restart its plugins: %s",
+                self._name,
+                e,
+            )
+
+            # A plugin that failed to load or start will fail again
+            if self._processProtocol.isRunning:
+                self._fail()
+                return
+
+            # Otherwise the subprocess died, _processEnded will try again
+            self._failedRespawnCount += 1
+            if self.MAX_FAILED_RESPAWNS <= self._failedRespawnCount:
+                self._fail()
+            return
+
+        self._available = True
+        self._failedRespawnCount = 0
+        self._restartCount += 1
+        self._downtimeSeconds += time.monotonic() - self._downSinceTime
+        self._downSinceTime = None
+
+        logger.info(
+            "Respawned subprocess worker %s, sending %s buffered payloads",
+            self._name,
+            len(self._bufferedPayloads),
+        )
+
+        # Send the buffered payloads, the flow control keeps them in order
+        bufferedPayloads = self._bufferedPayloads
+        self._bufferedPayloads = deque()
+        for args in bufferedPayloads:
+            self.sendPayloadEnvelopeToChild(*args)
+
+    def _fail(self):
+        """Fail
+
+        Give up respawning the subprocess, and reject the buffered payloads.
+        The subprocess is left running, so its logs can be investigated.
+
+        """
+        self._failed = True
+        self._available = False
+
+        if self._respawnCall and self._respawnCall.active():
+            self._respawnCall.cancel()
+        self._respawnCall = None
+
+        logger.error(
+            "Subprocess worker %s has failed, rejecting %s buffered payloads,"
+            " restart the worker once the problem is fixed",
+            self._name,
+            len(self._bufferedPayloads),
+        )
+
+        bufferedPayloads = self._bufferedPayloads
+        self._bufferedPayloads = deque()
+        for payloadEnvelope, vortexUuid, vortexName in bufferedPayloads:
+            self._rejectPayload(payloadEnvelope)
+
+    def _rejectPayload(self, payloadEnvelope: PayloadEnvelope):
+        self._rejectedPayloadCount += 1
+        logger.warning(
+            "Subprocess worker %s is %s, rejecting payload %s",
+            self._name,
+            "failed" if self._failed else "down",
+            payloadEnvelope.filt,
+        )
+
+    def sendPayloadEnvelopeToChild(
+        self,
+        payloadEnvelope: PayloadEnvelope,
+        vortexUuid: str,
+        vortexName: str,
+    ) -> Deferred:
+        if not self.isRunning:
+            if self._failed or self.MAX_BUFFERED_PAYLOADS <= len(
+                self._bufferedPayloads
+            ):
+                self._rejectPayload(payloadEnvelope)
+                return succeed(None)
+
+            self._bufferedPayloads.append(
+                (payloadEnvelope, vortexUuid, vortexName)
+            )
+            return succeed(None)
+
+        return self._sendPayloadEnvelopeToChild(
+            payloadEnvelope, vortexUuid, vortexName
+        )
+
+    @inlineCallbacks
+    def _sendPayloadEnvelopeToChild(
+        self,
+        payloadEnvelope: PayloadEnvelope,
+        vortexUuid: str,
+        vortexName: str,
+    ):
+        tuple_ = PluginSubprocVortexPayloadEnvelopeTuple(
+            payloadEnvelope=payloadEnvelope,
+            vortexUuid=vortexUuid,
+            vortexName=vortexName,
+        )
+        yield self._processProtocol.waitUntilVortexMsgWritable()
+
+        # Large tuples encode in a thread, the protocol writes them in order
+        yield self._processProtocol.writeVortexMsgToChild(
+            self._encodeTuple(tuple_)
+        )
+
+    def _encodeTuple(
+        self, tuple_: PluginSubprocVortexPayloadEnvelopeTuple
+    ) -> Deferred:
+        sizeHint = len(tuple_.payloadEnvelope.encodedPayload or "")
+        return pluginSubprocCodec.run(
+            sizeHint, self._encodeTupleBlocking, tuple_
+        )
+
+    def _encodeTupleBlocking(self, tuple_: Tuple) -> bytes:
+        return json.dumps(tuple_.toJsonDict()).encode()
+
+    @inlineCallbacks
+    def sendPluginLoad(self, pluginName: str):
+        yield self._processProtocol.sendPluginLoad(pluginName)
+        self._loadedPluginNames.append(pluginName)
+
+        # A spare that's already warm won't import this plugin otherwise
+        self._importPluginInSpare(pluginName)
+
+    @inlineCallbacks
+    def sendPluginStart(self, pluginName: str):
+        yield self._processProtocol.sendPluginStart(pluginName)
+        self._startedPluginNames.append(pluginName)
+
+    @inlineCallbacks
+    def sendPluginStop(self, pluginName: str):
+        if pluginName in self._startedPluginNames:
+            self._startedPluginNames.remove(pluginName)
+        yield self._processProtocol.sendPluginStop(pluginName)
+
+    @inlineCallbacks
+    def sendPluginUnload(self, pluginName: str):
+        if pluginName in self._loadedPluginNames:
+            self._loadedPluginNames.remove(pluginName)
+        yield self._processProtocol.sendPluginUnload(pluginName)
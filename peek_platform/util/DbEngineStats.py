@@ -0,0 +1,363 @@
+import logging
+import sys
+import threading
+import time
+import weakref
+from collections import defaultdict
+from typing import Callable
+from typing import Dict
+from typing import Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+
+logger = logging.getLogger(__name__)
+
+UNATTRIBUTED = "unattributed"
+
+
+class _LatencyHistogram:
+    # The upper bound of each bucket, in seconds
+    BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0, float("inf"))
+
+    def __init__(self):
+        self.count = 0
+        self.totalSeconds = 0.0
+        self.maxSeconds = 0.0
+        self.bucketCounts = [0] * len(self.BUCKETS)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.totalSeconds += seconds
+        self.maxSeconds = max(self.maxSeconds, seconds)
+
+        for index, upperBound in enumerate(self.BUCKETS):
+            if seconds <= upperBound:
+                self.bucketCounts[index] += 1
+                break
+
+    def toDict(self) -> dict:
+        return dict(
+            count=self.count,
+            totalSeconds=self.totalSeconds,
+            maxSeconds=self.maxSeconds,
+            buckets={
+                "<=%ss" % upperBound: count
+                for upperBound, count in zip(self.BUCKETS, self.bucketCounts)
+            },
+        )
+
+
+class _PoolStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.checkoutCount = 0
+        self.timeoutCount = 0
+        self.maxCheckedOut = 0
+        self.maxOverflow = 0
+        self.checkoutWait = _LatencyHistogram()
+        self.connectIsTimed = False
+
+
+class DbEngineStats:
+    """DB Engine Stats
+
+    This class records how the SQLAlchemy connection pools and queries of
+    this service behave, so the pool settings in dbEngineArgs can be sized
+    from measurements.
+
+    The pool and cursor events are listened to for every engine, including
+    the engines that plugins create, these record :
+        * The connections checked out and the overflow in use, per pool
+        * The latency of each statement, in a histogram per statement
+        * The slow queries, logged, and counted per plugin
+
+    The time spent waiting for a connection, and the pool_timeout errors, are
+    recorded from the second checkout of each pool, the first checkout wraps
+    the pools `connect`. Engines created with `createDbEngine` or passed to
+    `instrumentEngine` are timed from their first checkout, and their pools
+    are named by the engine URL.
+
+    From the manhole, use `dbEngineStats.stats` or `dbEngineStats.logSummary()`.
+
+    """
+
+    # Limit the memory used by the statement histograms
+    MAX_STATEMENTS = 500
+    OTHER_STATEMENTS = "other statements"
+
+    # The statements in the summary, the ones with the highest total time
+    SUMMARY_STATEMENT_COUNT = 20
+
+    def __init__(self):
+        self._installed = False
+        self._slowQueryThresholdSeconds = 1.0
+        self._pluginNameForModule = lambda moduleName: None
+
+        self._lock = threading.Lock()
+        self._statsByPool = weakref.WeakKeyDictionary()
+        self._histogramByStatement = defaultdict(_LatencyHistogram)
+        self._slowQueryCountByPluginName = defaultdict(int)
+
+    def install(
+        self,
+        slowQueryThresholdSeconds: float,
+        pluginNameForModule: Optional[Callable[[str], Optional[str]]] = None,
+    ) -> None:
+        """Install
+
+        :param slowQueryThresholdSeconds: Queries that take longer than this
+            are logged.
+        :param pluginNameForModule: Returns the name of the plugin that owns
+            a module name, or None.
+
+        """
+        self._slowQueryThresholdSeconds = slowQueryThresholdSeconds
+        if pluginNameForModule:
+            self._pluginNameForModule = pluginNameForModule
+
+        if self._installed:
+            return
+        self._installed = True
+
+        event.listen(Pool, "checkout", self._poolCheckout)
+        event.listen(Engine, "before_cursor_execute", self._beforeExecute)
+        event.listen(Engine, "after_cursor_execute", self._afterExecute)
+
+    def uninstall(self) -> None:
+        """Uninstall
+
+        Remove the pool and cursor listeners that `install` added.
+
+        """
+        if not self._installed:
+            return
+        self._installed = False
+
+        event.remove(Pool, "checkout", self._poolCheckout)
+        event.remove(Engine, "before_cursor_execute", self._beforeExecute)
+        event.remove(Engine, "after_cursor_execute", self._afterExecute)
+
+    def setSlowQueryThresholdSeconds(self, seconds: float) -> None:
+        self._slowQueryThresholdSeconds = seconds
+
+    def instrumentEngine(self, engine: Engine) -> Engine:
+        """Instrument Engine
+
+        Record the time spent waiting for a connection from the engines pool,
+        from the first checkout.
+
+        """
+        self._instrumentEnginePool(engine)
+        event.listen(engine, "engine_disposed", self._instrumentEnginePool)
+        return engine
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            statementItems = sorted(
+                self._histogramByStatement.items(),
+                key=lambda item: item[1].totalSeconds,
+                reverse=True,
+            )
+
+            return dict(
+                pools=[
+                    self._poolStatsDict(pool, poolStats)
+                    for pool, poolStats in list(self._statsByPool.items())
+                ],
+                statements={
+                    statement: histogram.toDict()
+                    for statement, histogram in statementItems[
+                        : self.SUMMARY_STATEMENT_COUNT
+                    ]
+                },
+                slowQueryCountByPluginName=dict(
+                    self._slowQueryCountByPluginName
+                ),
+            )
+
+    def logSummary(self) -> None:
+        stats = self.stats
+
+        for poolStats in stats["pools"]:
+            logger.info(
+                "DB pool %s: size=%s checkedOut=%s (max %s) overflow=%s"
+                " (max %s) checkouts=%s timeouts=%s maxWait=%.3fs",
+                poolStats["name"],
+                poolStats["size"],
+                poolStats["checkedOut"],
+                poolStats["maxCheckedOut"],
+                poolStats["overflow"],
+                poolStats["maxOverflow"],
+                poolStats["checkoutCount"],
+                poolStats["timeoutCount"],
+                poolStats["checkoutWait"]["maxSeconds"],
+            )
+
+        for statement, histogram in stats["statements"].items():
+            logger.info(
+                "DB statement count=%s total=%.2fs max=%.3fs : %s",
+                histogram["count"],
+                histogram["totalSeconds"],
+                histogram["maxSeconds"],
+                statement,
+            )
+
+        for pluginName, count in stats["slowQueryCountByPluginName"].items():
+            logger.info("DB slow queries for %s: %s", pluginName, count)
+
+    def _poolStats(self, pool: Pool, name: Optional[str] = None) -> _PoolStats:
+        poolStats = self._statsByPool.get(pool)
+        if not poolStats:
+            poolStats = _PoolStats(
+                name or "%s 0x%x" % (type(pool).__name__, id(pool))
+            )
+            self._statsByPool[pool] = poolStats
+
+        elif name:
+            poolStats.name = name
+
+        return poolStats
+
+    def _poolStatsDict(self, pool: Pool, poolStats: _PoolStats) -> dict:
+        def poolValue(methodName: str) -> Optional[int]:
+            # Only some pool classes, EG QueuePool, have these
+            method = getattr(pool, methodName, None)
+            return method() if method else None
+
+        return dict(
+            name=poolStats.name,
+            size=poolValue("size"),
+            checkedOut=poolValue("checkedout"),
+            overflow=poolValue("overflow"),
+            maxCheckedOut=poolStats.maxCheckedOut,
+            maxOverflow=poolStats.maxOverflow,
+            checkoutCount=poolStats.checkoutCount,
+            timeoutCount=poolStats.timeoutCount,
+            checkoutWait=poolStats.checkoutWait.toDict(),
+        )
+
+    def _instrumentEnginePool(self, engine: Engine) -> None:
+        with self._lock:
+            poolStats = self._poolStats(engine.pool, repr(engine.url))
+
+        self._timePoolConnect(engine.pool, poolStats)
+
+    def _timePoolConnect(self, pool: Pool, poolStats: _PoolStats) -> None:
+        with self._lock:
+            if poolStats.connectIsTimed:
+                return
+            poolStats.connectIsTimed = True
+
+        connect = pool.connect
+
+        def timedConnect(*args, **kwargs):
+            startTime = time.monotonic()
+            try:
+                return connect(*args, **kwargs)
+
+            except exc.TimeoutError:
+                with self._lock:
+                    poolStats.timeoutCount += 1
+
+                logger.warning(
+                    "Timed out waiting for a connection from DB pool %s,"
+                    " %s are checked out",
+                    poolStats.name,
+                    self._poolStatsDict(pool, poolStats)["checkedOut"],
+                )
+                raise
+
+            finally:
+                with self._lock:
+                    poolStats.checkoutWait.add(time.monotonic() - startTime)
+
+        pool.connect = timedConnect
+
+    def _poolCheckout(self, dbapiConnection, connectionRecord, connectionProxy):
+        pool = getattr(connectionProxy, "_pool", None)
+        if pool is None:
+            return
+
+        checkedOut = getattr(pool, "checkedout", lambda: 0)()
+        overflow = getattr(pool, "overflow", lambda: 0)()
+
+        with self._lock:
+            poolStats = self._poolStats(pool)
+            poolStats.checkoutCount += 1
+            poolStats.maxCheckedOut = max(poolStats.maxCheckedOut, checkedOut)
+            poolStats.maxOverflow = max(poolStats.maxOverflow, overflow)
+
+        # Time the next checkouts of the pools the plugins create
+        if not poolStats.connectIsTimed:
+            self._timePoolConnect(pool, poolStats)
+
+    def _beforeExecute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        if context is not None:
+            context._peekQueryStartTime = time.monotonic()
+
+    def _afterExecute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        startTime = getattr(context, "_peekQueryStartTime", None)
+        if startTime is None:
+            return
+
+        seconds = time.monotonic() - startTime
+
+        with self._lock:
+            if (
+                statement not in self._histogramByStatement
+                and len(self._histogramByStatement) >= self.MAX_STATEMENTS
+            ):
+                statement = self.OTHER_STATEMENTS
+
+            self._histogramByStatement[statement].add(seconds)
+
+        if seconds < self._slowQueryThresholdSeconds:
+            return
+
+        pluginName = self._pluginNameForStack() or UNATTRIBUTED
+        with self._lock:
+            self._slowQueryCountByPluginName[pluginName] += 1
+
+        logger.warning(
+            "Slow DB query took %.0fms, attributed to %s : %s",
+            seconds * 1000,
+            pluginName,
+            statement[:500],
+        )
+
+    def _pluginNameForStack(self) -> Optional[str]:
+        # The innermost plugin frame is the code that ran the query
+        frame = sys._getframe()
+        while frame is not None:
+            moduleName = frame.f_globals.get("__name__", "")
+            pluginName = self._pluginNameForModule(moduleName)
+            if pluginName:
+                return pluginName
+            frame = frame.f_back
+
+        return None
+
+
+dbEngineStats = DbEngineStats()
+
+
+def createDbEngine(dbConnectString: str, dbEngineArgs: Dict) -> Engine:
+    """Create DB Engine
+
+    Create an SQLAlchemy engine, EG from the config's dbConnectString and
+    dbEngineArgs, with the time spent waiting for pool connections recorded.
+
+    """
+    return dbEngineStats.instrumentEngine(
+        create_engine(dbConnectString, **dbEngineArgs)
+    )
@@ -0,0 +1,84 @@
+import os
+
+from sqlalchemy import create_engine
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from twisted.trial import unittest
+
+from peek_platform.util.DbEngineStats import DbEngineStats
+
+
+class DbEngineStatsTest(unittest.TestCase):
+    def testStats(self):
+        thisModuleName = __name__
+
+        dbEngineStats = DbEngineStats()
+        dbEngineStats.install(
+            0,
+            lambda moduleName: (
+                "pluginTest" if moduleName == thisModuleName else None
+            ),
+        )
+        self.addCleanup(dbEngineStats.uninstall)
+
+        dbDir = self.mktemp()
+        os.makedirs(dbDir)
+        engine = dbEngineStats.instrumentEngine(
+            create_engine(
+                "sqlite:///%s" % os.path.join(dbDir, "test.sqlite"),
+                poolclass=QueuePool,
+                pool_size=2,
+            )
+        )
+        self.addCleanup(engine.dispose)
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 1"))
+
+        stats = dbEngineStats.stats
+        self.assertEqual(stats["statements"]["SELECT 1"]["count"], 2)
+        self.assertEqual(stats["slowQueryCountByPluginName"]["pluginTest"], 2)
+
+        poolStats = stats["pools"][0]
+        self.assertEqual(poolStats["size"], 2)
+        self.assertEqual(poolStats["checkedOut"], 0)
+        self.assertEqual(poolStats["checkoutCount"], 1)
+        self.assertEqual(poolStats["checkoutWait"]["count"], 1)
+
+    def testPoolsAreTimedFromTheirSecondCheckout(self):
+        dbEngineStats = DbEngineStats()
+        dbEngineStats.install(0)
+        self.addCleanup(dbEngineStats.uninstall)
+
+        # EG, an engine that a plugin creates
+        dbDir = self.mktemp()
+        os.makedirs(dbDir)
+        engine = create_engine(
+            "sqlite:///%s" % os.path.join(dbDir, "test.sqlite"),
+            poolclass=QueuePool,
+        )
+        self.addCleanup(engine.dispose)
+
+        for _ in range(3):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+        poolStats = dbEngineStats.stats["pools"][0]
+        self.assertEqual(poolStats["checkoutCount"], 3)
+        self.assertEqual(poolStats["checkoutWait"]["count"], 2)
+
+    def testUninstall(self):
+        dbEngineStats = DbEngineStats()
+        dbEngineStats.install(0)
+        dbEngineStats.uninstall()
+
+        engine = create_engine("sqlite://")
+        self.addCleanup(engine.dispose)
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        stats = dbEngineStats.stats
+        self.assertEqual(stats["pools"], [])
+        self.assertEqual(stats["statements"], {})
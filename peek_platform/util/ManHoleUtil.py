@@ -11,6 +11,11 @@ from twisted.cred.portal import Portal
 from twisted.cred.checkers import InMemoryUsernamePasswordDatabaseDontUse
 from twisted.internet import reactor
 
+# Imported for use from the manhole
+from peek_platform.util.DbEngineStats import dbEngineStats
+from peek_platform.util.ReactorLatencyWatchdog import reactorLatencyWatchdog
+from peek_platform.util.RuntimeTunables import runtimeTunables
+
 logger = logging.getLogger(__name__)
 
 
@@ -0,0 +1,244 @@
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import defaultdict
+from typing import Callable
+from typing import Optional
+
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+from vortex.DeferUtil import vortexLogFailure
+
+
+logger = logging.getLogger(__name__)
+
+UNATTRIBUTED = "unattributed"
+
+
+class _StallHistogram:
+    # The upper bound of each bucket, in seconds
+    BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, float("inf"))
+
+    def __init__(self):
+        self.count = 0
+        self.totalSeconds = 0.0
+        self.maxSeconds = 0.0
+        self.bucketCounts = [0] * len(self.BUCKETS)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.totalSeconds += seconds
+        self.maxSeconds = max(self.maxSeconds, seconds)
+
+        for index, upperBound in enumerate(self.BUCKETS):
+            if seconds <= upperBound:
+                self.bucketCounts[index] += 1
+                break
+
+    def toDict(self) -> dict:
+        return dict(
+            count=self.count,
+            totalSeconds=self.totalSeconds,
+            maxSeconds=self.maxSeconds,
+            buckets={
+                "<=%ss" % upperBound: count
+                for upperBound, count in zip(self.BUCKETS, self.bucketCounts)
+            },
+        )
+
+
+class ReactorLatencyWatchdog:
+    """Reactor Latency Watchdog
+
+    This class measures how late the reactor runs a frequent LoopingCall. When
+    the reactor is blocked for longer than the threshold, a watchdog thread
+    captures the reactor thread's stack, and the stall is attributed to the
+    plugin whose code is deepest in the stack.
+
+    The stalls are logged as they end, kept in a histogram per plugin, and a
+    summary is logged periodically. From the manhole, use
+    `reactorLatencyWatchdog.stats` or `reactorLatencyWatchdog.logSummary()`.
+
+    """
+
+    SUMMARY_LOG_SECONDS = 600
+
+    # The frames logged for each stall, innermost last
+    LOGGED_FRAME_COUNT = 8
+
+    def __init__(self):
+        self._intervalSeconds = None
+        self._thresholdSeconds = None
+        self._pluginNameForModule = lambda moduleName: None
+
+        self._loopingCall = None
+        self._thread = None
+        self._running = False
+        self._reactorThreadId = None
+
+        self._lock = threading.Lock()
+        self._lastTickTime = None
+        self._capturedStack = None
+        self._capturedPluginName = None
+
+        self._histogramByPluginName = defaultdict(_StallHistogram)
+        self._lastSummaryTime = None
+        self._maxLagSeconds = 0.0
+
+    def start(
+        self,
+        intervalSeconds: float,
+        thresholdSeconds: float,
+        pluginNameForModule: Optional[Callable[[str], Optional[str]]] = None,
+    ) -> None:
+        """Start
+
+        :param intervalSeconds: How often to measure the reactor lag.
+        :param thresholdSeconds: Lag longer than this is recorded as a stall.
+        :param pluginNameForModule: Returns the name of the plugin that owns
+            a module name, or None.
+
+        """
+        if self._running:
+            return
+
+        self._intervalSeconds = intervalSeconds
+        self._thresholdSeconds = thresholdSeconds
+        if pluginNameForModule:
+            self._pluginNameForModule = pluginNameForModule
+
+        self._running = True
+        self._reactorThreadId = threading.get_ident()
+        self._lastTickTime = time.monotonic()
+        self._lastSummaryTime = self._lastTickTime
+
+        self._loopingCall = LoopingCall(self._tick)
+        d = self._loopingCall.start(intervalSeconds, now=False)
+        d.addErrback(vortexLogFailure, logger, consumeError=True)
+
+        self._thread = threading.Thread(
+            target=self._watchThreadMain,
+            name="reactor latency watchdog",
+            daemon=True,
+        )
+        self._thread.start()
+
+        reactor.addSystemEventTrigger("before", "shutdown", self.stop)
+
+        logger.debug(
+            "Reactor latency watchdog started, interval %sms, threshold %sms",
+            int(intervalSeconds * 1000),
+            int(thresholdSeconds * 1000),
+        )
+
+    def stop(self) -> None:
+        self._running = False
+        if self._loopingCall and self._loopingCall.running:
+            self._loopingCall.stop()
+
+    def setThresholdSeconds(self, thresholdSeconds: float) -> None:
+        self._thresholdSeconds = thresholdSeconds
+
+    @property
+    def stats(self) -> dict:
+        return dict(
+            maxLagSeconds=self._maxLagSeconds,
+            stallsByPluginName={
+                pluginName: histogram.toDict()
+                for pluginName, histogram in sorted(
+                    self._histogramByPluginName.items(),
+                    key=lambda item: item[1].totalSeconds,
+                    reverse=True,
+                )
+            },
+        )
+
+    def logSummary(self) -> None:
+        for pluginName, stats in self.stats["stallsByPluginName"].items():
+            logger.info(
+                "Reactor stalls for %s: count=%s total=%.2fs max=%.2fs %s",
+                pluginName,
+                stats["count"],
+                stats["totalSeconds"],
+                stats["maxSeconds"],
+                " ".join("%s:%s" % item for item in stats["buckets"].items()),
+            )
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+
+        with self._lock:
+            lagSeconds = now - self._lastTickTime - self._intervalSeconds
+            self._lastTickTime = now
+            capturedStack = self._capturedStack
+            capturedPluginName = self._capturedPluginName
+            self._capturedStack = None
+            self._capturedPluginName = None
+
+        self._maxLagSeconds = max(self._maxLagSeconds, lagSeconds)
+
+        if self._thresholdSeconds <= lagSeconds:
+            self._recordStall(lagSeconds, capturedPluginName, capturedStack)
+
+        if self.SUMMARY_LOG_SECONDS <= now - self._lastSummaryTime:
+            self._lastSummaryTime = now
+            self.logSummary()
+
+    def _recordStall(self, lagSeconds, pluginName, stack) -> None:
+        pluginName = pluginName or UNATTRIBUTED
+        self._histogramByPluginName[pluginName].add(lagSeconds)
+
+        logger.warning(
+            "The reactor was blocked for %.0fms, attributed to %s\n%s",
+            lagSeconds * 1000,
+            pluginName,
+            (
+                "".join(
+                    traceback.format_list(stack[-self.LOGGED_FRAME_COUNT :])
+                )
+                if stack
+                else "No stack was captured"
+            ),
+        )
+
+    def _watchThreadMain(self) -> None:
+        while self._running:
+            time.sleep(self._intervalSeconds)
+
+            with self._lock:
+                blockedSeconds = time.monotonic() - self._lastTickTime
+                alreadyCaptured = self._capturedStack is not None
+
+            if alreadyCaptured:
+                continue
+
+            if blockedSeconds < self._intervalSeconds + self._thresholdSeconds:
+                continue
+
+            frame = sys._current_frames().get(self._reactorThreadId)
+            if frame is None:
+                continue
+
+            stack = traceback.extract_stack(frame)
+            pluginName = self._pluginNameForFrame(frame)
+            del frame
+
+            with self._lock:
+                self._capturedStack = stack
+                self._capturedPluginName = pluginName
+
+    def _pluginNameForFrame(self, frame) -> Optional[str]:
+        # The innermost plugin frame is the most likely culprit
+        while frame is not None:
+            moduleName = frame.f_globals.get("__name__", "")
+            pluginName = self._pluginNameForModule(moduleName)
+            if pluginName:
+                return pluginName
+            frame = frame.f_back
+
+        return None
+
+
+reactorLatencyWatchdog = ReactorLatencyWatchdog()
@@ -0,0 +1,46 @@
+import sys
+
+from twisted.trial import unittest
+
+from peek_platform.util.ReactorLatencyWatchdog import ReactorLatencyWatchdog
+from peek_platform.util.ReactorLatencyWatchdog import UNATTRIBUTED
+from peek_platform.util.ReactorLatencyWatchdog import _StallHistogram
+
+
+class ReactorLatencyWatchdogTest(unittest.TestCase):
+    def testHistogramBuckets(self):
+        histogram = _StallHistogram()
+        histogram.add(0.3)
+        histogram.add(0.3)
+        histogram.add(7.0)
+
+        stats = histogram.toDict()
+        self.assertEqual(stats["count"], 3)
+        self.assertAlmostEqual(stats["maxSeconds"], 7.0)
+        self.assertEqual(stats["buckets"]["<=0.5s"], 2)
+        self.assertEqual(stats["buckets"]["<=infs"], 1)
+
+    def testPluginNameForFrame(self):
+        watchdog = ReactorLatencyWatchdog()
+        thisModuleName = __name__
+
+        watchdog._pluginNameForModule = lambda moduleName: (
+            "pluginTest" if moduleName == thisModuleName else None
+        )
+        self.assertEqual(
+            watchdog._pluginNameForFrame(sys._getframe()), "pluginTest"
+        )
+
+        watchdog._pluginNameForModule = lambda moduleName: None
+        self.assertIsNone(watchdog._pluginNameForFrame(sys._getframe()))
+
+    def testRecordStall(self):
+        watchdog = ReactorLatencyWatchdog()
+        watchdog._recordStall(0.4, "pluginTest", None)
+        watchdog._recordStall(1.5, None, None)
+
+        stallsByPluginName = watchdog.stats["stallsByPluginName"]
+        self.assertEqual(
+            list(stallsByPluginName), [UNATTRIBUTED, "pluginTest"]
+        )
+        self.assertEqual(stallsByPluginName["pluginTest"]["count"], 1)
@@ -0,0 +1,120 @@
+import logging
+from typing import Callable
+from typing import Optional
+
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+from vortex.DeferUtil import vortexLogFailure
+
+
+logger = logging.getLogger(__name__)
+
+APPLIED = "applied"
+RESTART_REQUIRED = "restart required"
+
+
+class RuntimeTunables:
+    """Runtime Tunables
+
+    This class checks config.json for changes while the service is running.
+    The settings that can be changed live are applied, the others are
+    logged as needing a restart of the service.
+
+    A tunable is the name of a config property, registered with the callable
+    that applies its new value, or None if it needs a restart.
+
+    From the manhole, use `runtimeTunables.check()` to apply changes now.
+
+    """
+
+    def __init__(self):
+        self._config = None
+        self._applyByName = {}
+        self._valuesByName = {}
+        self._generation = None
+        self._loopingCall = None
+
+    def register(self, name: str, apply: Optional[Callable]) -> None:
+        self._applyByName[name] = apply
+
+        if self._config and hasattr(self._config, name):
+            self._valuesByName[name] = getattr(self._config, name)
+
+    def start(self, config, checkSeconds: float) -> None:
+        """Start
+
+        :param config: The services config, see PeekFileConfigABC.
+        :param checkSeconds: How often to check config.json for changes.
+
+        """
+        self._config = config
+        self._generation = config._snapshotGeneration()
+        self._valuesByName = {
+            name: getattr(config, name)
+            for name in self._applyByName
+            if hasattr(config, name)
+        }
+
+        self._loopingCall = LoopingCall(self.check)
+        d = self._loopingCall.start(checkSeconds, now=False)
+        d.addErrback(vortexLogFailure, logger, consumeError=True)
+
+        reactor.addSystemEventTrigger("before", "shutdown", self.stop)
+
+    def stop(self) -> None:
+        if self._loopingCall and self._loopingCall.running:
+            self._loopingCall.stop()
+
+    def check(self) -> dict:
+        """Check
+
+        Apply the tunables that have changed in config.json.
+
+        :return: A dict of the changed tunable names, and if they were
+            applied or need a restart.
+
+        """
+        generation = self._config._snapshotGeneration()
+        if generation == self._generation:
+            return {}
+
+        self._generation = generation
+
+        resultsByName = {}
+        for name, oldValue in list(self._valuesByName.items()):
+            try:
+                value = getattr(self._config, name)
+
+            except Exception as e:
+                logger.error("Failed to read the new value of %s : %s", name, e)
+                continue
+
+            if value == oldValue:
+                continue
+
+            self._valuesByName[name] = value
+
+            apply = self._applyByName[name]
+            if not apply:
+                logger.warning(
+                    "%s changed from %s to %s, restart the service to apply it",
+                    name,
+                    oldValue,
+                    value,
+                )
+                resultsByName[name] = RESTART_REQUIRED
+                continue
+
+            try:
+                apply(value)
+                logger.info("%s changed from %s to %s", name, oldValue, value)
+                resultsByName[name] = APPLIED
+
+            except Exception as e:
+                logger.error("Failed to apply %s = %s", name, value)
+                logger.exception(e)
+
+        return resultsByName
+
+
+runtimeTunables = RuntimeTunables()
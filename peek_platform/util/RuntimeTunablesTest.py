@@ -0,0 +1,44 @@
+from twisted.trial import unittest
+
+from peek_platform.util.RuntimeTunables import APPLIED
+from peek_platform.util.RuntimeTunables import RESTART_REQUIRED
+from peek_platform.util.RuntimeTunables import RuntimeTunables
+
+
+class _Config:
+    def __init__(self):
+        self.generation = 0
+        self.threadPoolSize = 500
+        self.manholePort = 2201
+
+    def _snapshotGeneration(self):
+        return self.generation
+
+
+class RuntimeTunablesTest(unittest.TestCase):
+    def testCheck(self):
+        config = _Config()
+        applied = []
+
+        tunables = RuntimeTunables()
+        tunables.register("threadPoolSize", applied.append)
+        tunables.register("manholePort", None)
+        tunables.register("notInThisService", applied.append)
+        tunables.start(config, 60)
+        self.addCleanup(tunables.stop)
+
+        # Nothing is read until the config changes
+        config.threadPoolSize = 600
+        self.assertEqual(tunables.check(), {})
+
+        config.manholePort = 2202
+        config.generation += 1
+        self.assertEqual(
+            tunables.check(),
+            dict(threadPoolSize=APPLIED, manholePort=RESTART_REQUIRED),
+        )
+        self.assertEqual(applied, [600])
+
+        # Unchanged values aren't applied again
+        config.generation += 1
+        self.assertEqual(tunables.check(), {})